@@ -6,17 +6,59 @@ Fecha: Noviembre 2025
 API REST con Flask para sistema de recomendación usando KNN desde cero.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import numpy as np
-import pandas as pd
 from knn_engine import (
     calcular_similitud_coseno,
+    calcular_normas,
+    construir_matriz_dispersa,
+    Vecindario,
     encontrar_k_vecinos,
-    clasificar_usuario,
-    recomendar_canciones
+    calcular_vecindario,
+    clasificar_vecindario,
+    recomendar_desde_vecindario,
+    encontrar_k_vecinos_lote,
+    recomendar_canciones_lote,
+    construir_indice_lsh,
+    marcar_pendientes_lsh,
+    consolidar_indice_lsh,
+    encontrar_k_vecinos_aproximado,
+    construir_vecinos_canciones,
+    recomendar_item_item,
+    marcar_pendientes_latentes,
+    consolidar_factores,
+    encontrar_k_vecinos_latente,
+    densificar,
+    mascara_no_evaluadas,
+    vecindario_usuario,
+    usuarios_afectados_grafo,
+    marcar_pendientes_grafo,
+    recomendaciones_grafo,
+    calcular_agregados_usuarios
 )
+from dataset_loader import cargar_csv
+from dataset_store import (
+    binario_vigente,
+    calcular_checksum,
+    cargar_dataset_binario
+)
+from factores_latentes import obtener_factores
+from grafo_vecinos import cargar_grafo, grafo_vigente
+from busqueda_particionada import BusquedaParticionada
+from microlotes import AgrupadorConsultas
+from metricas import Cronometro, Registro, TIPO_CONTENIDO
+from formato_peticiones import leer_candidato, leer_cuerpo, responder
+from respuestas_preparadas import RespuestasPreparadas, preparar, servir
+from result_cache import CacheResultados, clave_evaluaciones
+from ingesta import CandadoLecturaEscritura, DiarioIngesta, MatrizCreciente
+from estadisticas import contar_ratings, histograma_ratings, resumen_ratings
+from collections import namedtuple
+import functools
+import hmac
 import os
+import threading
+import time
 
 # Configuración de la aplicación
 app = Flask(__name__)
@@ -25,89 +67,660 @@ app = Flask(__name__)
 CORS(app, resources={
     r"/*": {
         "origins": "*",
-        "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type"]
+        "methods": ["GET", "POST", "PATCH", "OPTIONS"],
+        "allow_headers": ["Content-Type", "X-Admin-Token"]
     }
 })
 
 # Variable global para número de vecinos por defecto
 K_VECINOS = 10
 
+# Procesamiento por lotes: candidatos por producto de matrices y máximo por petición
+TAMANO_BLOQUE_LOTE = int(os.getenv('TAMANO_BLOQUE_LOTE', 256))
+MAX_CANDIDATOS_LOTE = int(os.getenv('MAX_CANDIDATOS_LOTE', 10000))
+# Búsqueda de /recomendar/batch repartida entre procesos (ver
+# busqueda_particionada.py): particiones de usuarios (0 o 1 = desactivada) y
+# candidatos mínimos del lote para repartirlo
+PARTICIONES = int(os.getenv('PARTICIONES', 0))
+PARTICIONES_MIN_CANDIDATOS = int(os.getenv('PARTICIONES_MIN_CANDIDATOS', 32))
+
+# Microlotes (ver microlotes.py): con workers con hilos, las búsquedas
+# exactas de /clasificar y /recomendar que llegan dentro de la ventana se
+# resuelven con un solo producto de matrices (ventana 0 = desactivado)
+MICROLOTES_VENTANA_MS = float(os.getenv('MICROLOTES_VENTANA_MS', 0))
+MICROLOTES_MAX = int(os.getenv('MICROLOTES_MAX', 64))
+
+# Almacenamiento de la matriz de ratings: 'densa' (float64),
+# 'compacta' (uint8 / float32) o 'dispersa' (CSR)
+BACKEND_MATRIZ = os.getenv('BACKEND_MATRIZ', 'densa').lower()
+
+# Búsqueda aproximada de vecinos con índice LSH (ver knn_engine.py).
+# BUSQUEDA_DEFECTO se usa cuando la petición no indica "busqueda".
+INDICE_LSH = os.getenv('INDICE_LSH', '0') == '1'
+LSH_TABLAS = int(os.getenv('LSH_TABLAS', 32))
+LSH_BITS = int(os.getenv('LSH_BITS', 10))
+LSH_SONDAS = int(os.getenv('LSH_SONDAS', 4))
+BUSQUEDA_DEFECTO = os.getenv('BUSQUEDA_DEFECTO', 'exacta').lower()
+# Búsqueda en el espacio de factores latentes (SVD truncada, "busqueda":
+# "latente"). Los factores se guardan en FACTORES_PATH (ver factores_latentes.py).
+FACTORES_LATENTES = os.getenv('FACTORES_LATENTES', '0') == '1'
+RANGO_LATENTE = int(os.getenv('RANGO_LATENTE', 64))
+# Usuarios modificados que se acumulan antes de recalcular sus firmas LSH y
+# sus coordenadas latentes
+LSH_MAX_PENDIENTES = int(os.getenv('LSH_MAX_PENDIENTES', 1024))
+
+# Filtrado item-item (modo "item" de /recomendar): vecinas precalculadas
+# por canción (0 = no construir la tabla)
+ITEM_VECINOS = int(os.getenv('ITEM_VECINOS', 50))
+
+# Caché LRU de resultados de /clasificar y /recomendar (capacidad 0 = desactivada)
+cache_resultados = CacheResultados(
+    capacidad=int(os.getenv('CACHE_CAPACIDAD', 1024)),
+    ttl_segundos=float(os.getenv('CACHE_TTL_SEGUNDOS', 300))
+)
+
+# Cuerpos de /canciones, /stats y /config serializados una vez por
+# instantánea, con ETag y variante gzip (ver respuestas_preparadas.py).
+# CACHE_HTTP_SEGUNDOS es el max-age de Cache-Control de /canciones y /stats
+# para nginx y navegadores; /config se sirve con no-cache.
+respuestas_preparadas = RespuestasPreparadas()
+CACHE_HTTP_SEGUNDOS = int(os.getenv('CACHE_HTTP_SEGUNDOS', 30))
+
+# Métricas de /metrics (ver metricas.py): duración de las peticiones, de
+# cada etapa de los endpoints de recomendación y de la búsqueda de vecinos.
+# Con varios workers, METRICAS_DIR es un directorio compartido donde cada
+# uno publica las suyas cada METRICAS_INTERVALO segundos y /metrics las
+# combina; sin él, /metrics solo refleja al worker que responde.
+METRICAS_DIR = os.getenv('METRICAS_DIR', '')
+METRICAS_INTERVALO = float(os.getenv('METRICAS_INTERVALO', 5))
+registro_metricas = Registro(METRICAS_DIR or None, METRICAS_INTERVALO)
+metrica_peticiones = registro_metricas.histograma(
+    'knn_peticion_segundos', 'Duración de las peticiones por endpoint, método, código y k',
+    ('endpoint', 'metodo', 'codigo', 'k')
+)
+metrica_etapas = registro_metricas.histograma(
+    'knn_etapa_segundos', 'Duración de cada etapa de los endpoints de recomendación',
+    ('endpoint', 'etapa')
+)
+metrica_busqueda = registro_metricas.histograma(
+    'knn_busqueda_vecinos_segundos', 'Duración de la búsqueda de vecinos de un candidato',
+    ('busqueda',)
+)
+
 
 # ============================================================================
 # CARGA DEL DATASET
 # ============================================================================
+#
+# Todo lo que se sirve (matriz, normas, canciones, índices) vive en una
+# Instantanea. Los endpoints toman la instantánea vigente al empezar y la
+# usan hasta terminar; una recarga construye otra en segundo plano y la
+# publica reasignando una sola referencia (ver /admin/reload).
+
+dataset_path = os.getenv('DATASET_PATH', 'dataset_ratings.csv')
+
+# Dataset precompilado (ver dataset_store.py): se usa si está al día con el CSV
+dataset_binario_path = os.getenv('DATASET_BINARIO',
+                                 os.path.splitext(dataset_path)[0] + '.bin')
+
+# Factores latentes guardados, junto al dataset
+FACTORES_PATH = os.getenv('FACTORES_PATH', os.path.splitext(dataset_path)[0] + '.factores')
+
+# Grafo de vecinos y recomendaciones precalculadas (ver grafo_vecinos.py):
+# se usa si existe y está al día con el CSV
+GRAFO_PATH = os.getenv('GRAFO_PATH', os.path.splitext(dataset_path)[0] + '.grafo')
+
+# Operaciones de ingesta registradas por cualquier worker, junto al dataset
+INGESTA_DIARIO = os.getenv('INGESTA_DIARIO',
+                           os.path.splitext(dataset_path)[0] + '.ingesta.jsonl')
+
+# Recarga: archivo que /admin/reload toca para avisar a los demás workers,
+# y recarga automática cuando cambia el CSV
+RECARGA_MARCA = os.getenv('RECARGA_MARCA', os.path.splitext(dataset_path)[0] + '.recarga')
+RECARGA_AUTOMATICA = os.getenv('RECARGA_AUTOMATICA', '0') == '1'
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+# Normas en float32 para el almacenamiento compacto, float64 en los demás
+tipo_normas = np.float32 if BACKEND_MATRIZ == 'compacta' else np.float64
+
+if BACKEND_MATRIZ not in ('densa', 'compacta', 'dispersa'):
+    print(f"❌ ERROR: BACKEND_MATRIZ desconocido: {BACKEND_MATRIZ} "
+          f"(use 'densa', 'compacta' o 'dispersa')")
+    exit(1)
+
+# Dataset listo para servir. La recarga construye una instantánea nueva y
+# la publica reasignando la referencia. La ingesta también publica una
+# instantánea nueva (revision + 1), pero comparte con las anteriores de la
+# misma carga los buffers de MatrizCreciente (matriz, normas, agregados),
+# que modifica en su lugar con el candado de escritura. Por eso la matriz,
+# las normas, los agregados y lo derivado de ellos solo se leen con el
+# candado de lectura (lectura_consistente); sin candado solo se usan
+# version, revision y nombres_canciones, que la ingesta no modifica.
+#   - version: número de carga (1 al arrancar, +1 por cada recarga)
+#   - revision: operaciones de ingesta aplicadas sobre esta carga
+#   - matriz, normas: matriz de ratings (según BACKEND_MATRIZ) y sus normas
+#   - nombres_canciones: list
+#   - indice_canciones: dict nombre → posición
+#   - metadatos_usuarios: dict campo → np.array
+#   - metadatos_dataset: cabecera del dataset binario (None si vino del CSV)
+#   - indice_lsh: IndiceLSH o None
+#   - vecinos_canciones: VecinosCanciones para el modo item-item, o None
+#   - factores: FactoresLatentes para la búsqueda latente, o None
+#   - grafo: GrafoVecinos para /usuarios/<id>/recomendaciones, o None
+#   - histograma: celdas con cada rating 0-5, para /stats (ver estadisticas.py)
+#   - agregados: AgregadosUsuarios para clasificar un vecindario en O(k)
+#   - creciente: MatrizCreciente que recibe la ingesta (None con CSR)
+#   - diario: DiarioIngesta con la posición leída por esta carga
+#   - origen: archivo desde el que se cargó
+#   - mtime_csv: fecha de modificación del CSV al cargarlo
+#   - cargada: fecha de la carga (time.time())
+#   - duracion_carga: segundos que tardó la carga
+Instantanea = namedtuple('Instantanea', [
+    'version', 'revision', 'matriz', 'normas', 'nombres_canciones', 'indice_canciones',
+    'metadatos_usuarios', 'metadatos_dataset', 'indice_lsh', 'vecinos_canciones',
+    'factores', 'grafo', 'histograma', 'agregados', 'creciente', 'diario', 'origen', 'mtime_csv', 'cargada', 'duracion_carga'
+])
+
+
+def _mtime(ruta):
+    """Fecha de modificación de un archivo en nanosegundos (0 si no existe)."""
+    try:
+        return os.stat(ruta).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def cargar_instantanea(version):
+    """
+    Carga el dataset y construye todo lo que se necesita para servirlo.
+    
+    PROCESO:
+    1. Abrir el dataset binario si está al día con el CSV; si no, leer el CSV
+    2. Calcular las normas de los usuarios y el histograma de ratings
+    3. Abrir (o calcular y guardar) los factores latentes del dataset y
+       abrir el grafo de vecinos precalculado
+    4. Aplicar el diario de ingesta (o apartarlo si es de otro dataset)
+    5. Convertir al almacenamiento de BACKEND_MATRIZ y construir el índice
+       LSH y la tabla de vecinas por canción
+    
+    Args:
+        version (int): Número de carga de la nueva instantánea
+    
+    Returns:
+        Instantanea
+    
+    Raises:
+        FileNotFoundError: Si no existe el CSV ni un binario utilizable
+        ValueError: Si el dataset o el diario no son válidos
+    """
+    inicio = time.perf_counter()
+    mtime_csv = _mtime(dataset_path)
+    metadatos_dataset = None
+    
+    if binario_vigente(dataset_binario_path, dataset_path):
+        dataset_binario = cargar_dataset_binario(dataset_binario_path)
+        print(f"✓ Dataset binario mapeado en memoria: {dataset_binario_path}")
+        
+        # Matriz uint8 y normas float64 compartidas entre workers (memmap).
+        # El backend denso trabaja en float64, igual que al leer el CSV: cada
+        # worker convierte su propia copia y solo se ahorra el parseo
+        matriz = dataset_binario.matriz
+        if BACKEND_MATRIZ == 'densa':
+            # np.array y no astype: astype conserva la subclase np.memmap
+            matriz = np.array(matriz, dtype=np.float64)
+        normas = np.asarray(dataset_binario.normas, dtype=tipo_normas)
+        nombres_canciones = dataset_binario.nombres_canciones
+        metadatos_usuarios = dataset_binario.metadatos_usuarios
+        metadatos_dataset = dataset_binario.metadatos
+        origen = dataset_binario_path
+    
+    else:
+        if os.path.exists(dataset_binario_path):
+            print(f"⚠️  {dataset_binario_path} no corresponde al CSV actual, se ignora")
+            print(f"   Recompilar con: python dataset_store.py {dataset_path} {dataset_binario_path}")
+        
+        # Verificar que el archivo existe
+        if not os.path.exists(dataset_path):
+            raise FileNotFoundError(
+                f"No se encuentra el archivo {dataset_path} "
+                f"(ubicación esperada: {os.path.abspath(dataset_path)})"
+            )
+        
+        # Cargar y limpiar dataset (una sola pasada, ver dataset_loader.py)
+        dataset = cargar_csv(dataset_path)
+        print(f"✓ Dataset cargado exitosamente")
+        print(f"  Metadatos de usuario separados: {list(dataset.metadatos)}")
+        if dataset.canciones_eliminadas:
+            print(f"  Canciones sin evaluaciones eliminadas: {len(dataset.canciones_eliminadas)}")
+        print(f"  Dimensiones finales: {dataset.matriz.shape}")
+        
+        # Ratings enteros 0-5 en uint8; el backend denso trabaja en float64
+        matriz = dataset.matriz
+        if BACKEND_MATRIZ == 'densa':
+            matriz = matriz.astype(float)
+        nombres_canciones = dataset.nombres_canciones
+        metadatos_usuarios = dataset.metadatos
+        origen = dataset_path
+        del dataset
+        
+        # Normas de cada usuario (se calculan una sola vez y se reutilizan)
+        normas = calcular_normas(matriz, dtype=tipo_normas)
+    
+    print(f"\n📊 Dataset preparado:")
+    print(f"   • Usuarios: {matriz.shape[0]:,}")
+    print(f"   • Canciones: {matriz.shape[1]:,}")
+    print(f"   • Densidad: {(np.count_nonzero(matriz)/matriz.size*100):.2f}%")
+    print(f"   • Primeras canciones: {nombres_canciones[:3]}")
+    print(f"   • Últimas canciones: {nombres_canciones[-3:]}")
+    
+    # Evaluadas, suma y suma de cuadrados por usuario (la ingesta los
+    # mantiene al día junto con las normas)
+    agregados = calcular_agregados_usuarios(matriz)
+    
+    # Checksum del CSV: identifica el dataset en el diario de ingesta y
+    # valida los archivos derivados (el del binario si se cargó de él)
+    checksum_csv = (metadatos_dataset['checksum_csv'] if metadatos_dataset is not None
+                    else calcular_checksum(dataset_path))
+    
+    datos = Instantanea(
+        version=version,
+        revision=0,
+        matriz=matriz,
+        normas=normas,
+        nombres_canciones=nombres_canciones,
+        # Posición de cada canción, para recibir ratings por nombre
+        indice_canciones={nombre: i for i, nombre in enumerate(nombres_canciones)},
+        metadatos_usuarios=metadatos_usuarios,
+        metadatos_dataset=metadatos_dataset,
+        indice_lsh=None,
+        vecinos_canciones=None,
+        factores=None,
+        grafo=None,
+        histograma=histograma_ratings(matriz),
+        agregados=agregados,
+        creciente=MatrizCreciente(matriz, normas, agregados),
+        diario=DiarioIngesta(INGESTA_DIARIO, checksum_csv, matriz.shape[0]),
+        origen=origen,
+        mtime_csv=mtime_csv,
+        cargada=None,
+        duracion_carga=None
+    )
+    
+    # Factores del dataset sin la ingesta: se guardan en disco y los demás
+    # workers los abren con memmap. La ingesta los actualiza como pendientes.
+    if FACTORES_LATENTES or BUSQUEDA_DEFECTO == 'latente':
+        factores, factorizados = obtener_factores(FACTORES_PATH, matriz, checksum_csv,
+                                                  rango=RANGO_LATENTE)
+        datos = datos._replace(factores=factores)
+        print(f"   • Factores latentes: rango {factores.canciones.shape[1]} "
+              f"({'calculados y guardados en' if factorizados else 'leídos de'} {FACTORES_PATH})")
+    
+    # Grafo precalculado fuera de línea. Incluye las primeras
+    # grafo.revision operaciones del diario; las siguientes marcan sus
+    # filas afectadas como pendientes.
+    if os.path.exists(GRAFO_PATH):
+        if grafo_vigente(GRAFO_PATH, checksum_csv):
+            datos = datos._replace(grafo=cargar_grafo(GRAFO_PATH))
+        else:
+            print(f"⚠️  {GRAFO_PATH} no corresponde al CSV actual, se ignora")
+            print(f"   Recalcular con: python grafo_vecinos.py {dataset_path} {GRAFO_PATH}")
+    
+    # Ingesta registrada hasta ahora (ver ingesta.py). Un diario de otro
+    # dataset se aparta: sus ids de usuario no valen sobre este CSV
+    rotado = datos.diario.rotar_si_ajeno()
+    if rotado:
+        print(f"⚠️  {INGESTA_DIARIO} era de otro dataset, se movió a {rotado}")
+    datos = _sincronizar_diario(datos)
+    if datos.revision:
+        print(f"   • Ingesta: {datos.revision} operaciones aplicadas desde {INGESTA_DIARIO} "
+              f"({datos.matriz.shape[0]:,} usuarios)")
+    
+    grafo = datos.grafo
+    if grafo is not None and (grafo.revision > datos.revision
+                              or grafo.vecinos.shape[0] > datos.matriz.shape[0]):
+        # El diario se reinició después de calcular el grafo
+        print(f"⚠️  {GRAFO_PATH} incluye {grafo.revision} operaciones de ingesta y el diario "
+              f"tiene {datos.revision}, se ignora")
+        datos = datos._replace(grafo=None)
+    elif grafo is not None:
+        print(f"   • Grafo de vecinos: k={grafo.vecinos.shape[1]}, "
+              f"{grafo.canciones.shape[1]} recomendaciones por usuario, "
+              f"{len(grafo.pendientes):,} usuarios pendientes")
+    
+    # Backend disperso: el formato CSR no admite ingesta en caliente, así
+    # que el diario solo se aplica al cargar
+    if BACKEND_MATRIZ == 'dispersa':
+        matriz = construir_matriz_dispersa(datos.matriz)
+        datos = datos._replace(matriz=matriz, normas=matriz.normas, creciente=None)
+        print(f"   • Almacenamiento: disperso CSR ({matriz.datos.size:,} evaluaciones)")
+    elif BACKEND_MATRIZ == 'compacta':
+        print(f"   • Almacenamiento: compacto uint8 ({datos.matriz.nbytes / 1e6:.1f} MB)")
+    
+    # Índice LSH para la búsqueda aproximada
+    if INDICE_LSH or BUSQUEDA_DEFECTO == 'aproximada':
+        datos = datos._replace(indice_lsh=construir_indice_lsh(
+            datos.matriz, n_tablas=LSH_TABLAS, n_bits=LSH_BITS
+        ))
+        print(f"   • Índice LSH: {LSH_TABLAS} tablas × {LSH_BITS} bits, {LSH_SONDAS} sondas")
+    
+    # Canciones similares para el modo item-item
+    if ITEM_VECINOS > 0:
+        vecinos_canciones = construir_vecinos_canciones(datos.matriz, m_vecinos=ITEM_VECINOS)
+        datos = datos._replace(vecinos_canciones=vecinos_canciones)
+        print(f"   • Item-item: {vecinos_canciones.indices.shape[1]} vecinas por canción "
+              f"({(vecinos_canciones.indices.nbytes + vecinos_canciones.similitudes.nbytes) / 1e3:.0f} KB)")
+    
+    return datos._replace(cargada=time.time(), duracion_carga=time.perf_counter() - inicio)
+
+
+# ----------------------------------------------------------------------------
+# Ingesta incremental (ver ingesta.py)
+# ----------------------------------------------------------------------------
+
+def _aplicar_operacion(datos, operacion):
+    """
+    Aplica una operación de ingesta a la matriz de una instantánea.
+    
+    Se llama con el candado de escritura tomado (o durante la carga), para
+    las operaciones propias y para las registradas por otros workers.
+    
+    Returns:
+        tuple: (instantánea actualizada, np.array con los usuarios afectados)
+    
+    Raises:
+        ValueError: Si el usuario no existe (no se modifica nada)
+    """
+    creciente = datos.creciente
+    
+    if operacion['tipo'] == 'agregar':
+        evaluaciones = np.array(operacion['evaluaciones'], dtype=creciente.matriz.dtype)
+        usuarios = creciente.agregar(evaluaciones)
+        histograma = datos.histograma + contar_ratings(evaluaciones)
+    elif operacion['tipo'] == 'actualizar':
+        usuario = int(operacion['usuario'])
+        if not 0 <= usuario < creciente.n_usuarios:
+            raise ValueError(f'Usuario {usuario} no encontrado')
+        canciones = np.array(operacion['canciones'], dtype=np.intp)
+        valores = np.array(operacion['valores'])
+        anteriores = contar_ratings(creciente.matriz[usuario, canciones])
+        creciente.actualizar(usuario, canciones, valores)
+        histograma = datos.histograma + contar_ratings(valores) - anteriores
+        usuarios = np.array([usuario])
+    else:
+        raise ValueError(f"Operación desconocida: {operacion['tipo']}")
+    
+    indice_lsh = datos.indice_lsh
+    if indice_lsh is not None:
+        indice_lsh = marcar_pendientes_lsh(indice_lsh, usuarios)
+        if len(indice_lsh.pendientes) > LSH_MAX_PENDIENTES:
+            indice_lsh = consolidar_indice_lsh(indice_lsh, creciente.matriz)
+    
+    factores = datos.factores
+    if factores is not None:
+        factores = marcar_pendientes_latentes(factores, usuarios)
+        if len(factores.pendientes) > LSH_MAX_PENDIENTES:
+            factores = consolidar_factores(factores, creciente.matriz)
+    
+    # Filas del grafo que dejan de estar al día (las operaciones anteriores
+    # a su revisión ya están incluidas en él)
+    grafo = datos.grafo
+    if grafo is not None and datos.revision >= grafo.revision:
+        grafo = marcar_pendientes_grafo(grafo, usuarios_afectados_grafo(
+            grafo, creciente.matriz, usuarios, creciente.normas
+        ))
+    
+    datos = datos._replace(matriz=creciente.matriz, normas=creciente.normas,
+                           indice_lsh=indice_lsh, factores=factores, grafo=grafo,
+                           histograma=histograma, agregados=creciente.agregados,
+                           revision=datos.revision + 1)
+    
+    return datos, usuarios
+
+
+def _sincronizar_diario(datos, operacion=None):
+    """
+    Aplica a la instantánea las operaciones nuevas del diario y, si se
+    indica, registra y aplica una operación propia.
+    
+    Returns:
+        Instantanea si operacion es None; si no,
+        tuple: (instantánea, usuarios afectados por la operación)
+    """
+    resultado = [datos]
+    
+    def aplicar(operacion_diario):
+        resultado[0], usuarios = _aplicar_operacion(resultado[0], operacion_diario)
+        return usuarios
+    
+    if operacion is None:
+        datos.diario.sincronizar(aplicar)
+        return resultado[0]
+    
+    usuarios = datos.diario.registrar(operacion, aplicar)
+    return resultado[0], usuarios
+
 
 print("="*70)
 print("INICIANDO BACKEND - SISTEMA DE RECOMENDACIÓN MUSICAL")
 print("="*70)
 print("\n🔄 Cargando dataset...")
 
-dataset_path = 'dataset_ratings.csv'
+# El pool se crea antes de cargar el dataset para que sus procesos no
+# hereden una copia de la memoria del worker. CSR no se reparte.
+busqueda_particionada = None
+if PARTICIONES > 1:
+    if BACKEND_MATRIZ == 'dispersa':
+        print(f"⚠️  PARTICIONES={PARTICIONES} se ignora con el backend disperso")
+    else:
+        busqueda_particionada = BusquedaParticionada(PARTICIONES)
+        print(f"✓ Búsqueda por lotes particionada en {PARTICIONES} procesos")
 
-# Verificar que el archivo existe
-if not os.path.exists(dataset_path):
-    print(f"❌ ERROR: No se encuentra el archivo {dataset_path}")
-    print(f"   Ubicación esperada: {os.path.abspath(dataset_path)}")
-    print(f"   Archivos en el directorio: {os.listdir('.')}")
-    exit(1)
+# El hilo de los microlotes se inicia después de crear el pool (fork)
+agrupador_consultas = None
+if MICROLOTES_VENTANA_MS > 0:
+    agrupador_consultas = AgrupadorConsultas(MICROLOTES_VENTANA_MS / 1000, MICROLOTES_MAX)
+    print(f"✓ Microlotes: ventana de {MICROLOTES_VENTANA_MS:g} ms, hasta {MICROLOTES_MAX} consultas")
 
-# Cargar dataset
 try:
-    df_ratings = pd.read_csv(dataset_path)
-    print(f"✓ Dataset cargado exitosamente")
-    print(f"  Dimensiones originales: {df_ratings.shape}")
-    
-    # Limpiar datos
-    print("🔧 Limpiando datos...")
-    df_ratings = df_ratings.apply(pd.to_numeric, errors='coerce')
-    df_ratings = df_ratings.fillna(0)
-    df_ratings = df_ratings.astype(int)
-    df_ratings = df_ratings.clip(lower=0, upper=5)
-    
-    print(f"  Dimensiones finales: {df_ratings.shape}")
-    
+    instantanea = cargar_instantanea(version=1)
 except Exception as e:
     print(f"❌ ERROR al cargar dataset: {e}")
     import traceback
     traceback.print_exc()
     exit(1)
 
-# Convertir a matriz NumPy y extraer nombres
-matriz_ratings = df_ratings.values.astype(float)
-nombres_canciones = df_ratings.columns.tolist()
+# Candado de la matriz: las peticiones leen, la ingesta y la recarga escriben
+candado_datos = CandadoLecturaEscritura()
+
+# Estado de la última recarga de este worker
+candado_recarga = threading.Lock()
+marca_recarga = _mtime(RECARGA_MARCA)
+estado_recarga = {'en_curso': False, 'ultima': None}
 
-print(f"\n📊 Dataset preparado:")
-print(f"   • Usuarios: {matriz_ratings.shape[0]:,}")
-print(f"   • Canciones: {matriz_ratings.shape[1]:,}")
-print(f"   • Densidad: {(np.sum(matriz_ratings>0)/matriz_ratings.size*100):.2f}%")
-print(f"   • Primeras canciones: {nombres_canciones[:3]}")
-print(f"   • Últimas canciones: {nombres_canciones[-3:]}")
 print(f"\n✅ Backend listo para recibir peticiones\n")
 
-df_ratings = df_ratings.clip(lower=0, upper=5)
 
-# AGREGAR INMEDIATAMENTE DESPUÉS:
-print("🧹 Eliminando columnas no musicales...")
+# ============================================================================
+# RECARGA EN CALIENTE
+# ============================================================================
 
-# Eliminar columnas que no son canciones (UserID, Edad, Género, etc.)
-columnas_a_eliminar = ['UserID', 'Edad', 'Género', 'edad', 'genero', 'userid', 'ID', 'id']
-columnas_existentes = [col for col in columnas_a_eliminar if col in df_ratings.columns]
+def recargar_dataset():
+    """
+    Construye una instantánea nueva y la publica.
+    
+    La carga completa ocurre sin candados: mientras tanto las peticiones
+    siguen usando la instantánea anterior. Solo la publicación toma el
+    candado de escritura, para aplicar la ingesta registrada durante la
+    carga y reasignar la referencia.
+    
+    Returns:
+        dict: Resultado de la recarga (versión, duración, error)
+    """
+    global instantanea
+    
+    if not candado_recarga.acquire(blocking=False):
+        return {'estado': 'en_curso'}
+    
+    try:
+        estado_recarga['en_curso'] = True
+        inicio = time.time()
+        
+        try:
+            nueva = cargar_instantanea(version=instantanea.version + 1)
+        except Exception as e:
+            resultado = {
+                'estado': 'error',
+                'error': str(e),
+                'inicio': inicio,
+                'duracion_segundos': round(time.time() - inicio, 3),
+                'version': instantanea.version
+            }
+            print(f"❌ ERROR al recargar el dataset: {e}")
+        else:
+            with candado_datos.escritura():
+                if nueva.creciente is not None:
+                    nueva = _sincronizar_diario(nueva)
+                instantanea = nueva
+            
+            resultado = {
+                'estado': 'ok',
+                'inicio': inicio,
+                'duracion_segundos': round(time.time() - inicio, 3),
+                'version': nueva.version
+            }
+            print(f"✅ Dataset recargado (versión {nueva.version}) "
+                  f"en {resultado['duracion_segundos']}s")
+        
+        estado_recarga['ultima'] = resultado
+        return resultado
+    
+    finally:
+        estado_recarga['en_curso'] = False
+        candado_recarga.release()
+
+
+def _recargar_en_segundo_plano():
+    """Inicia recargar_dataset en un hilo, si no hay otra recarga en curso."""
+    if not estado_recarga['en_curso']:
+        threading.Thread(target=recargar_dataset, name='recarga-dataset', daemon=True).start()
+
+
+def _verificar_recarga():
+    """
+    Inicia una recarga si otro worker la pidió (cambió RECARGA_MARCA) o,
+    con RECARGA_AUTOMATICA, si cambió el CSV.
+    """
+    global marca_recarga
+    
+    marca = _mtime(RECARGA_MARCA)
+    if marca != marca_recarga:
+        marca_recarga = marca
+        _recargar_en_segundo_plano()
+    elif RECARGA_AUTOMATICA and _mtime(dataset_path) != instantanea.mtime_csv:
+        _recargar_en_segundo_plano()
+
+
+# ============================================================================
+# MÉTRICAS (GET /metrics)
+# ============================================================================
+#
+# Cada petición se mide de principio a fin (before_request/after_request)
+# con su endpoint, método, código y k; /clasificar y /recomendar además
+# marcan cada etapa con un Cronometro. La caché, el dataset y los
+# microlotes se leen al exponer.
+
+def _etiqueta_k():
+    """k de la petición para la etiqueta de la métrica ('' si no usa k)."""
+    k = g.pop('k_vecinos', None)
+    if k is None:
+        return ''
+    # Acotar la cardinalidad: los k fuera de 1..100 comparten etiqueta
+    return str(k) if 1 <= k <= 100 else 'otro'
+
+
+@app.before_request
+def _iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+
+
+@app.after_request
+def _registrar_medicion(respuesta):
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'desconocido'
+        metrica_peticiones.observar(time.perf_counter() - inicio, endpoint, request.method,
+                                    str(respuesta.status_code), _etiqueta_k())
+    return respuesta
+
+
+def _contadores_cache():
+    estadisticas = cache_resultados.estadisticas()
+    return {(campo,): estadisticas[campo]
+            for campo in ('aciertos', 'fallos', 'expulsiones', 'expiraciones', 'invalidaciones')}
+
+
+def _contadores_microlotes():
+    if agrupador_consultas is None:
+        return {}
+    estadisticas = agrupador_consultas.estadisticas()
+    return {('consultas',): estadisticas['consultas'], ('lotes',): estadisticas['lotes']}
+
+
+registro_metricas.calibre('knn_cache_eventos_total', 'Eventos de la caché de resultados',
+                          _contadores_cache, ('evento',), tipo='counter')
+registro_metricas.calibre('knn_cache_entradas', 'Entradas en la caché de resultados',
+                          lambda: cache_resultados.estadisticas()['entradas'])
+registro_metricas.calibre('knn_microlotes_total', 'Consultas y lotes atendidos en microlotes',
+                          _contadores_microlotes, ('tipo',), tipo='counter')
+registro_metricas.calibre('knn_dataset_usuarios', 'Usuarios en la instantánea vigente',
+                          lambda: instantanea.matriz.shape[0], agregacion='max')
+registro_metricas.calibre('knn_dataset_version', 'Número de carga de la instantánea vigente',
+                          lambda: instantanea.version, agregacion='max')
+registro_metricas.calibre('knn_dataset_revision', 'Operaciones de ingesta aplicadas sobre la carga',
+                          lambda: instantanea.revision, agregacion='max')
+
+if METRICAS_DIR:
+    registro_metricas.iniciar_publicacion()
+    print(f"✓ Métricas combinadas entre workers en {METRICAS_DIR}")
 
-if columnas_existentes:
-    print(f"   Eliminando: {columnas_existentes}")
-    df_ratings = df_ratings.drop(columns=columnas_existentes)
-    print(f"   Nuevas dimensiones: {df_ratings.shape}")
 
-# También eliminar cualquier columna que no tenga valores válidos
-columnas_vacias = df_ratings.columns[df_ratings.sum() == 0].tolist()
-if columnas_vacias:
-    print(f"   Eliminando columnas vacías: {len(columnas_vacias)}")
-    df_ratings = df_ratings.drop(columns=columnas_vacias)
 # ============================================================================
 # ENDPOINTS DE LA API
 # ============================================================================
 
+def _sincronizar_ingesta():
+    """Aplica las operaciones de ingesta que registraron otros workers."""
+    global instantanea
+    
+    datos = instantanea
+    if datos.creciente is not None and datos.diario.hay_pendientes():
+        with candado_datos.escritura():
+            # La instantánea pudo cambiar mientras se esperaba el candado
+            if instantanea.creciente is not None:
+                instantanea = _sincronizar_diario(instantanea)
+
+
+def lectura_consistente(vista):
+    """
+    Decorador para endpoints que leen el dataset: revisa si hay que
+    recargar, sincroniza la ingesta y atiende la petición con el candado
+    de lectura, de modo que la matriz, las normas y el índice no cambian a
+    mitad de la petición.
+    
+    Es la única protección frente a la ingesta, que modifica en su lugar
+    los buffers compartidos por las instantáneas de una misma carga: todo
+    endpoint que lea la matriz, las normas o los agregados debe usarlo.
+    """
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        _verificar_recarga()
+        _sincronizar_ingesta()
+        with candado_datos.lectura():
+            return vista(*args, **kwargs)
+    
+    return envoltura
+
+
 @app.route('/', methods=['GET'])
 def home():
     """
@@ -128,38 +741,71 @@ def home():
             'GET /health': 'Health check del servicio',
             'GET /stats': 'Estadísticas del dataset',
             'GET /canciones': 'Lista de canciones disponibles',
+            'GET /cache': 'Estadísticas de la caché de resultados',
+            'GET /microlotes': 'Tamaño de los microlotes y espera en la cola',
+            'GET /metrics': 'Métricas en formato de Prometheus',
             'GET /config': 'Configuración actual',
             'POST /config': 'Actualizar configuración',
             'POST /clasificar': 'Clasificar un nuevo usuario',
-            'POST /recomendar': 'Recomendar canciones (endpoint principal)'
+            'POST /recomendar': 'Recomendar canciones (endpoint principal)',
+            'POST /recomendar/batch': 'Recomendar canciones a muchos usuarios en una sola petición',
+            'POST /usuarios': 'Agregar usuarios con sus ratings',
+            'PATCH /usuarios/<id>/ratings': 'Modificar ratings de un usuario',
+            'GET /usuarios/<id>/recomendaciones': 'Recomendaciones precalculadas de un usuario del dataset',
+            'POST /admin/reload': 'Recargar el dataset sin reiniciar el servicio'
         }
     })
 
 
 @app.route('/health', methods=['GET'])
+@lectura_consistente
 def health():
     """
     Health check para monitoreo del servicio
     
     Returns:
-        JSON indicando estado del servicio
+        JSON indicando estado del servicio, la instantánea servida y la
+        última recarga
     """
+    datos = instantanea
+    
     return jsonify({
         'status': 'ok',
         'service': 'music-recommender-api',
-        'dataset_loaded': matriz_ratings is not None,
+        'dataset_loaded': datos.matriz is not None,
+        'dataset_binario': datos.metadatos_dataset is not None,
+        'snapshot': {
+            'version': datos.version,
+            'revision': datos.revision,
+            'origen': datos.origen,
+            'cargado': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(datos.cargada)),
+            'duracion_carga_segundos': round(datos.duracion_carga, 3)
+        },
+        'recarga': {
+            'en_curso': estado_recarga['en_curso'],
+            'ultima': estado_recarga['ultima']
+        },
+        'ingesta': {
+            'disponible': datos.creciente is not None,
+            'operaciones_aplicadas': datos.revision
+        },
         'dataset_shape': {
-            'usuarios': int(matriz_ratings.shape[0]),
-            'canciones': int(matriz_ratings.shape[1])
+            'usuarios': int(datos.matriz.shape[0]),
+            'canciones': int(datos.matriz.shape[1])
         }
     }), 200
 
 
 @app.route('/stats', methods=['GET'])
+@lectura_consistente
 def get_stats():
     """
     Retorna estadísticas generales del dataset
     
+    Se calculan a partir del histograma de ratings de la instantánea, que
+    se mantiene al día con la ingesta: no se recorre la matriz. El JSON se
+    prepara una vez por instantánea y se sirve con ETag (304 si no cambió).
+    
     Returns:
         JSON con métricas del dataset:
         - Total de usuarios y canciones
@@ -168,31 +814,14 @@ def get_stats():
         - Distribución de ratings (1-5 estrellas)
     """
     try:
-        # Calcular métricas
-        evaluaciones_totales = int(np.sum(matriz_ratings > 0))
-        total_posible = int(matriz_ratings.size)
-        densidad = (evaluaciones_totales / total_posible) * 100
+        datos = instantanea
+        n_usuarios, n_canciones = datos.matriz.shape
         
-        # Extraer solo ratings válidos
-        ratings_validos = matriz_ratings[matriz_ratings > 0]
-        
-        return jsonify({
-            'total_usuarios': int(matriz_ratings.shape[0]),
-            'total_canciones': int(matriz_ratings.shape[1]),
-            'evaluaciones_totales': evaluaciones_totales,
-            'evaluaciones_posibles': total_posible,
-            'densidad_porcentaje': round(float(densidad), 2),
-            'rating_promedio_global': round(float(np.mean(ratings_validos)), 2),
-            'rating_mediana_global': round(float(np.median(ratings_validos)), 2),
-            'rating_desviacion_global': round(float(np.std(ratings_validos)), 2),
-            'distribucion_ratings': {
-                '1_estrella': int(np.sum(matriz_ratings == 1)),
-                '2_estrellas': int(np.sum(matriz_ratings == 2)),
-                '3_estrellas': int(np.sum(matriz_ratings == 3)),
-                '4_estrellas': int(np.sum(matriz_ratings == 4)),
-                '5_estrellas': int(np.sum(matriz_ratings == 5))
-            }
-        }), 200
+        preparado = respuestas_preparadas.obtener(
+            'stats', (datos.version, datos.revision),
+            lambda: resumen_ratings(datos.histograma, n_usuarios, n_canciones)
+        )
+        return servir(preparado, request, CACHE_HTTP_SEGUNDOS)
     
     except Exception as e:
         return jsonify({'error': f'Error al obtener estadísticas: {str(e)}'}), 500
@@ -207,30 +836,90 @@ def get_canciones():
         - limit: Número máximo de canciones a retornar
         - offset: Offset para paginación
     
+    La lista completa (sin parámetros) se prepara una vez por versión del
+    dataset; las páginas se serializan en cada petición. Todas llevan ETag.
+    
     Returns:
         JSON con array de nombres de canciones
     """
     try:
+        datos = instantanea
+        
         # Parámetros de paginación
-        limit = request.args.get('limit', type=int, default=len(nombres_canciones))
+        limit = request.args.get('limit', type=int, default=len(datos.nombres_canciones))
         offset = request.args.get('offset', type=int, default=0)
         
-        # Aplicar paginación
-        canciones_paginadas = nombres_canciones[offset:offset+limit]
+        def contenido():
+            # Aplicar paginación
+            canciones_paginadas = datos.nombres_canciones[offset:offset+limit]
+            
+            return {
+                'total': len(datos.nombres_canciones),
+                'offset': offset,
+                'limit': limit,
+                'count': len(canciones_paginadas),
+                'canciones': canciones_paginadas
+            }
         
-        return jsonify({
-            'total': len(nombres_canciones),
-            'offset': offset,
-            'limit': limit,
-            'count': len(canciones_paginadas),
-            'canciones': canciones_paginadas
-        }), 200
+        # Los nombres solo cambian al recargar (la ingesta no agrega canciones)
+        if request.args:
+            preparado = preparar(contenido())
+        else:
+            preparado = respuestas_preparadas.obtener('canciones', datos.version, contenido)
+        
+        return servir(preparado, request, CACHE_HTTP_SEGUNDOS)
     
     except Exception as e:
         return jsonify({'error': f'Error al obtener canciones: {str(e)}'}), 500
 
 
+@app.route('/cache', methods=['GET'])
+def get_cache():
+    """
+    Estadísticas de la caché de resultados de este worker
+    
+    Returns:
+        JSON con capacidad, entradas, aciertos, fallos, expulsiones,
+        expiraciones e invalidaciones
+    """
+    cache_resultados.verificar_version((instantanea.version, instantanea.revision))
+    
+    return jsonify(cache_resultados.estadisticas()), 200
+
+
+@app.route('/microlotes', methods=['GET'])
+def get_microlotes():
+    """
+    Estadísticas de los microlotes de este worker
+    
+    Returns:
+        JSON con la distribución del tamaño de los lotes y los percentiles
+        de la espera en la cola (ms)
+    """
+    if agrupador_consultas is None:
+        return jsonify({'activo': False}), 200
+    
+    return jsonify({'activo': True, **agrupador_consultas.estadisticas()}), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Métricas en el formato de texto de Prometheus
+    
+    Incluye la duración de las peticiones (por endpoint, método, código y
+    k), de cada etapa de /clasificar, /recomendar y /recomendar/batch, y de
+    la búsqueda de vecinos, más los contadores de la caché y los microlotes.
+    Con METRICAS_DIR son las de todos los workers combinadas; sin él, las
+    de este worker (solo válidas con --workers 1).
+    """
+    cache_resultados.verificar_version((instantanea.version, instantanea.revision))
+    
+    return Response(registro_metricas.exponer(), content_type=TIPO_CONTENIDO)
+
+
 @app.route('/config', methods=['GET', 'POST'])
+@lectura_consistente
 def config():
     """
     Obtiene o actualiza la configuración del sistema
@@ -274,77 +963,196 @@ def config():
         except Exception as e:
             return jsonify({'error': f'Error al actualizar configuración: {str(e)}'}), 500
     
-    # GET - Retornar configuración actual
-    return jsonify({
+    # GET - Retornar configuración actual (preparada por instantánea y k).
+    # POST la cambia en cualquier momento: no-cache, la ETag da los 304
+    datos = instantanea
+    preparado = respuestas_preparadas.obtener(
+        'config', (datos.version, datos.revision, K_VECINOS), lambda: _configuracion(datos)
+    )
+    return servir(preparado, request, None)
+
+
+def _configuracion(datos):
+    """Contenido de GET /config para una instantánea."""
+    return {
         'k_vecinos': K_VECINOS,
+        'busqueda': {
+            'por_defecto': BUSQUEDA_DEFECTO,
+            'indice_lsh': datos.indice_lsh is not None,
+            'lsh_tablas': LSH_TABLAS,
+            'lsh_bits': LSH_BITS,
+            'lsh_sondas': LSH_SONDAS,
+            'factores_latentes': datos.factores is not None,
+            'rango_latente': RANGO_LATENTE
+        },
+        'item_item': {
+            'disponible': datos.vecinos_canciones is not None,
+            'vecinas_por_cancion': ITEM_VECINOS
+        },
+        'grafo_vecinos': {
+            'disponible': datos.grafo is not None,
+            'k': int(datos.grafo.vecinos.shape[1]) if datos.grafo is not None else None,
+            'recomendaciones_por_usuario': (int(datos.grafo.canciones.shape[1])
+                                            if datos.grafo is not None else None),
+            'usuarios_pendientes': len(datos.grafo.pendientes) if datos.grafo is not None else None
+        },
+        'lote': {
+            'tamano_bloque': TAMANO_BLOQUE_LOTE,
+            'max_candidatos': MAX_CANDIDATOS_LOTE,
+            'particiones': PARTICIONES if busqueda_particionada is not None else 1,
+            'particiones_min_candidatos': PARTICIONES_MIN_CANDIDATOS
+        },
         'dataset': {
-            'total_usuarios': int(matriz_ratings.shape[0]),
-            'total_canciones': int(matriz_ratings.shape[1])
+            'total_usuarios': int(datos.matriz.shape[0]),
+            'total_canciones': int(datos.matriz.shape[1])
         }
-    }), 200
+    }
+
+
+def _parametros_busqueda(data, datos):
+    """
+    Lee el modo de búsqueda de vecinos de una petición.
+    
+    Returns:
+        tuple: (busqueda, sondas, error). error es None si los parámetros
+               son válidos.
+    """
+    busqueda = str(data.get('busqueda', BUSQUEDA_DEFECTO)).lower()
+    sondas = int(data.get('sondas', LSH_SONDAS))
+    
+    if busqueda not in ('exacta', 'aproximada', 'latente'):
+        return busqueda, sondas, 'busqueda debe ser "exacta", "aproximada" o "latente"'
+    
+    if busqueda == 'aproximada' and datos.indice_lsh is None:
+        return busqueda, sondas, 'La búsqueda aproximada requiere INDICE_LSH=1'
+    
+    if busqueda == 'latente' and datos.factores is None:
+        return busqueda, sondas, 'La búsqueda latente requiere FACTORES_LATENTES=1'
+    
+    if sondas < 0:
+        return busqueda, sondas, 'sondas debe ser mayor o igual que 0'
+    
+    return busqueda, sondas, None
+
+
+def _buscar_vecindario(datos, evaluaciones, k, busqueda, sondas, con_evaluaciones=True):
+    """
+    Vecindario del candidato con la búsqueda exacta, la aproximada (LSH) o la latente.
+    
+    Solo la búsqueda exacta sin microlotes usa un CandidatoDisperso tal
+    cual; las demás reciben el vector denso equivalente. Con
+    con_evaluaciones=False no se extraen las filas de los vecinos
+    (evaluaciones es None): basta para clasificar con los agregados.
+    """
+    inicio = time.perf_counter()
+    
+    if busqueda == 'aproximada':
+        vecinos = encontrar_k_vecinos_aproximado(densificar(evaluaciones), datos.matriz,
+                                                 datos.indice_lsh, k=k, normas=datos.normas,
+                                                 sondas=sondas)
+    
+    elif busqueda == 'latente':
+        vecinos = encontrar_k_vecinos_latente(densificar(evaluaciones), datos.matriz,
+                                              datos.factores, k=k, normas=datos.normas)
+    
+    elif agrupador_consultas is not None:
+        # Búsqueda exacta junto con las peticiones que llegan a la vez
+        vecinos = agrupador_consultas.encontrar_k_vecinos(
+            (datos.version, datos.revision), densificar(evaluaciones), datos.matriz,
+            k=k, normas=datos.normas
+        )
+    
+    else:
+        vecinos = encontrar_k_vecinos(evaluaciones, datos.matriz, k=k, normas=datos.normas)
+    
+    if con_evaluaciones:
+        vecindario = calcular_vecindario(evaluaciones, datos.matriz, k=k, normas=datos.normas,
+                                         vecinos=vecinos)
+    else:
+        vecindario = Vecindario(vecinos[0], vecinos[1], None)
+    
+    metrica_busqueda.observar(time.perf_counter() - inicio, busqueda)
+    return vecindario
 
 
 @app.route('/clasificar', methods=['POST'])
+@lectura_consistente
 def clasificar():
     """
     Clasifica un nuevo usuario en una categoría
     
-    Body (JSON):
+    Body (JSON o msgpack, ver formato_peticiones.py):
     {
-        "evaluaciones": [0, 5, 3, 0, 4, ...],
-        "k_vecinos": 10  // Opcional
+        "evaluaciones": [0, 5, 3, 0, 4, ...],   // o {"La Piragua": 5, ...}
+        "k_vecinos": 10,          // Opcional
+        "busqueda": "exacta"      // Opcional: "exacta", "aproximada" o "latente"
     }
     
     Returns:
-        JSON con clasificación y métricas del vecindario
+        JSON (o msgpack) con clasificación y métricas del vecindario
     """
     try:
-        # Validar Content-Type
-        if not request.is_json:
-            return jsonify({'error': 'Content-Type debe ser application/json'}), 400
+        cronometro = Cronometro(metrica_etapas, '/clasificar')
+        datos = instantanea
         
-        data = request.json
+        # Decodificar el body (JSON o msgpack)
+        data, error = leer_cuerpo(request)
+        if error:
+            return jsonify({'error': error}), 400
+        cronometro.marcar('parseo_json')
         
-        # Validar campo evaluaciones
-        if 'evaluaciones' not in data:
-            return jsonify({'error': 'Falta el campo "evaluaciones" en el body'}), 400
+        # Evaluaciones densas o dispersas, ya validadas
+        evaluaciones, error = leer_candidato(data, datos.indice_canciones,
+                                             len(datos.nombres_canciones))
+        if error:
+            return jsonify({'error': error}), 400
+        cronometro.marcar('conversion')
         
-        # Convertir a array
-        evaluaciones = np.array(data['evaluaciones'], dtype=float)
-        
-        # Validar dimensiones
-        if len(evaluaciones) != len(nombres_canciones):
-            return jsonify({
-                'error': f'Se esperan {len(nombres_canciones)} evaluaciones, '
-                        f'se recibieron {len(evaluaciones)}'
-            }), 400
-        
-        # Validar rango de valores
-        if np.any((evaluaciones < 0) | (evaluaciones > 5)):
-            return jsonify({
-                'error': 'Las evaluaciones deben estar entre 0 y 5'
-            }), 400
+        n_no_evaluadas = int(np.count_nonzero(mascara_no_evaluadas(evaluaciones)))
         
         # Obtener K vecinos
         k = int(data.get('k_vecinos', K_VECINOS))
+        g.k_vecinos = k
         
         # Validar K
-        if k < 1 or k > matriz_ratings.shape[0]:
+        if k < 1 or k > datos.matriz.shape[0]:
             return jsonify({
-                'error': f'k_vecinos debe estar entre 1 y {matriz_ratings.shape[0]}'
+                'error': f'k_vecinos debe estar entre 1 y {datos.matriz.shape[0]}'
             }), 400
         
-        # Ejecutar clasificación
-        resultado = clasificar_usuario(evaluaciones, matriz_ratings, k=k)
+        # Modo de búsqueda de vecinos
+        busqueda, sondas, error = _parametros_busqueda(data, datos)
+        if error:
+            return jsonify({'error': error}), 400
         
-        return jsonify({
+        cronometro.marcar('validacion')
+        
+        # Ejecutar clasificación (o reutilizar un resultado en caché)
+        cache_resultados.verificar_version((datos.version, datos.revision))
+        clave = clave_evaluaciones(evaluaciones, 'clasificar', k, busqueda, sondas)
+        resultado = cache_resultados.obtener(clave)
+        cronometro.marcar('cache')
+        
+        if resultado is None:
+            # Solo índices y similitudes: las estadísticas salen de los agregados
+            vecindario = _buscar_vecindario(datos, evaluaciones, k, busqueda, sondas,
+                                            con_evaluaciones=False)
+            cronometro.marcar('busqueda_vecinos')
+            resultado = clasificar_vecindario(vecindario, datos.agregados)
+            cronometro.marcar('clasificacion')
+            cache_resultados.guardar(clave, resultado)
+        
+        respuesta = responder({
             'exito': True,
             'clasificacion': resultado,
             'parametros': {
                 'k_vecinos_usado': k,
-                'canciones_evaluadas': int(np.sum(evaluaciones > 0))
+                'busqueda': busqueda,
+                'canciones_evaluadas': len(datos.nombres_canciones) - n_no_evaluadas
             }
-        }), 200
+        }, request)
+        cronometro.marcar('serializacion')
+        return respuesta, 200
     
     except ValueError as e:
         return jsonify({'error': f'Error en los datos: {str(e)}'}), 400
@@ -353,89 +1161,443 @@ def clasificar():
 
 
 @app.route('/recomendar', methods=['POST'])
+@lectura_consistente
 def recomendar():
     """
     Recomienda canciones personalizadas (ENDPOINT PRINCIPAL)
     
-    Body (JSON):
+    Body (JSON o msgpack, ver formato_peticiones.py):
     {
-        "evaluaciones": [0, 5, 3, 0, 4, ...],
+        "evaluaciones": [0, 5, 3, 0, 4, ...],   // o {"La Piragua": 5, ...}
         "n_recomendaciones": 10,
-        "k_vecinos": 10  // Opcional
+        "k_vecinos": 10,          // Opcional
+        "busqueda": "exacta",     // Opcional: "exacta", "aproximada" o "latente"
+        "sondas": 4,              // Opcional: cubetas extra por tabla LSH
+        "modo": "usuario"         // Opcional: "usuario" o "item"
     }
     
+    En modo "item" las recomendaciones salen de la tabla de canciones
+    similares (sin recorrer los usuarios); k_vecinos y busqueda no se usan
+    y la clasificación es null (usar /clasificar).
+    
     Returns:
-        JSON con clasificación del usuario y lista de recomendaciones
+        JSON (o msgpack) con clasificación del usuario y lista de recomendaciones
     """
     try:
-        # Validar Content-Type
-        if not request.is_json:
-            return jsonify({'error': 'Content-Type debe ser application/json'}), 400
+        cronometro = Cronometro(metrica_etapas, '/recomendar')
+        datos = instantanea
         
-        data = request.json
+        # Decodificar el body (JSON o msgpack)
+        data, error = leer_cuerpo(request)
+        if error:
+            return jsonify({'error': error}), 400
+        cronometro.marcar('parseo_json')
+        
+        # Evaluaciones densas o dispersas, ya validadas
+        evaluaciones, error = leer_candidato(data, datos.indice_canciones,
+                                             len(datos.nombres_canciones))
+        if error:
+            return jsonify({'error': error}), 400
+        cronometro.marcar('conversion')
+        
+        # Verificar que haya canciones sin evaluar
+        n_no_evaluadas = int(np.count_nonzero(mascara_no_evaluadas(evaluaciones)))
+        if n_no_evaluadas == 0:
+            return jsonify({
+                'error': 'El usuario ya evaluó todas las canciones. No hay recomendaciones disponibles.'
+            }), 400
+        
+        # Obtener parámetros
+        n_recomendaciones = int(data.get('n_recomendaciones', 10))
+        k = int(data.get('k_vecinos', K_VECINOS))
+        g.k_vecinos = k
+        
+        # Validar parámetros
+        if n_recomendaciones <= 0:
+            return jsonify({'error': 'n_recomendaciones debe ser mayor que 0'}), 400
+        
+        if k < 1 or k > datos.matriz.shape[0]:
+            return jsonify({
+                'error': f'k_vecinos debe estar entre 1 y {datos.matriz.shape[0]}'
+            }), 400
+        
+        # Filtrado basado en usuario (por defecto) o en ítems
+        modo = str(data.get('modo', 'usuario')).lower()
+        if modo not in ('usuario', 'item'):
+            return jsonify({'error': 'modo debe ser "usuario" o "item"'}), 400
+        
+        if modo == 'item' and datos.vecinos_canciones is None:
+            return jsonify({'error': 'El modo item requiere ITEM_VECINOS mayor que 0'}), 400
+        
+        # Modo de búsqueda de vecinos
+        busqueda, sondas, error = _parametros_busqueda(data, datos)
+        if error:
+            return jsonify({'error': error}), 400
+        cronometro.marcar('validacion')
+        
+        # Reutilizar el resultado si ya se calculó para las mismas evaluaciones
+        cache_resultados.verificar_version((datos.version, datos.revision))
+        clave = clave_evaluaciones(evaluaciones, 'recomendar', k, n_recomendaciones,
+                                   busqueda, sondas, modo)
+        resultado = cache_resultados.obtener(clave)
+        cronometro.marcar('cache')
+        
+        if resultado is None and modo == 'item':
+            recomendaciones = recomendar_item_item(
+                evaluaciones,
+                datos.vecinos_canciones,
+                datos.nombres_canciones,
+                n_recomendaciones=n_recomendaciones
+            )
+            cronometro.marcar('puntuacion')
+            
+            resultado = (None, recomendaciones)
+            cache_resultados.guardar(clave, resultado)
+        
+        elif resultado is None:
+            # Buscar vecinos una sola vez para clasificar y recomendar
+            vecindario = _buscar_vecindario(datos, evaluaciones, k, busqueda, sondas)
+            cronometro.marcar('busqueda_vecinos')
+            
+            # Clasificar usuario
+            clasificacion = clasificar_vecindario(vecindario, datos.agregados)
+            cronometro.marcar('clasificacion')
+            
+            # Generar recomendaciones
+            recomendaciones = recomendar_desde_vecindario(
+                evaluaciones,
+                vecindario,
+                datos.nombres_canciones,
+                n_recomendaciones=n_recomendaciones
+            )
+            cronometro.marcar('puntuacion')
+            
+            resultado = (clasificacion, recomendaciones)
+            cache_resultados.guardar(clave, resultado)
+        
+        clasificacion, recomendaciones = resultado
+        
+        respuesta = responder({
+            'exito': True,
+            'clasificacion': clasificacion,
+            'recomendaciones': recomendaciones,
+            'total_recomendaciones': len(recomendaciones),
+            'parametros': {
+                'k_vecinos_usado': k,
+                'n_recomendaciones_solicitadas': n_recomendaciones,
+                'modo': modo,
+                'busqueda': busqueda,
+                'canciones_evaluadas': len(datos.nombres_canciones) - n_no_evaluadas,
+                'canciones_disponibles_recomendar': n_no_evaluadas
+            }
+        }, request)
+        cronometro.marcar('serializacion')
+        return respuesta, 200
+    
+    except ValueError as e:
+        return jsonify({'error': f'Error en los datos: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+
+def _archivo_matriz(datos):
+    """
+    (ruta, offset, checksum) de la matriz si es el np.memmap del dataset
+    binario sin ingesta aplicada; None si vive solo en memoria.
+    """
+    if datos.metadatos_dataset is None or datos.revision or not isinstance(datos.matriz, np.memmap):
+        return None
+    
+    return (datos.origen, datos.metadatos_dataset['secciones']['matriz']['offset'],
+            datos.metadatos_dataset['checksum_csv'])
+
+
+@app.route('/recomendar/batch', methods=['POST'])
+@lectura_consistente
+def recomendar_batch():
+    """
+    Clasifica y recomienda canciones a muchos usuarios en una sola petición
+    
+    Todas las similitudes se calculan con productos de matrices por bloques,
+    en lugar de un recorrido completo del dataset por cada usuario.
+    
+    Body (JSON o msgpack):
+    {
+        "evaluaciones": [[0, 5, 3, ...], [4, 0, 0, ...], ...],
+        "n_recomendaciones": 10,
+        "k_vecinos": 10,        // Opcional
+        "tamano_bloque": 256    // Opcional
+    }
+    
+    Returns:
+        JSON (o msgpack) con clasificación y recomendaciones por cada
+        usuario, en el mismo orden en que se enviaron
+    """
+    try:
+        cronometro = Cronometro(metrica_etapas, '/recomendar/batch')
+        datos = instantanea
+        
+        # Decodificar el body (JSON o msgpack)
+        data, error = leer_cuerpo(request)
+        if error:
+            return jsonify({'error': error}), 400
+        cronometro.marcar('parseo_json')
         
         # Validar campo evaluaciones
         if 'evaluaciones' not in data:
             return jsonify({'error': 'Falta el campo "evaluaciones" en el body'}), 400
         
-        # Convertir a array
-        evaluaciones = np.array(data['evaluaciones'], dtype=float)
+        # Convertir a matriz
+        candidatos = np.array(data['evaluaciones'], dtype=float)
+        cronometro.marcar('conversion')
         
         # Validar dimensiones
-        if len(evaluaciones) != len(nombres_canciones):
+        if candidatos.ndim != 2 or candidatos.shape[1] != len(datos.nombres_canciones):
             return jsonify({
-                'error': f'Se esperan {len(nombres_canciones)} evaluaciones, '
-                        f'se recibieron {len(evaluaciones)}'
+                'error': f'Se espera una lista de vectores de {len(datos.nombres_canciones)} evaluaciones'
+            }), 400
+        
+        if candidatos.shape[0] == 0 or candidatos.shape[0] > MAX_CANDIDATOS_LOTE:
+            return jsonify({
+                'error': f'Se esperan entre 1 y {MAX_CANDIDATOS_LOTE} usuarios por petición'
             }), 400
         
         # Validar rango
-        if np.any((evaluaciones < 0) | (evaluaciones > 5)):
+        if np.any((candidatos < 0) | (candidatos > 5)):
             return jsonify({
                 'error': 'Las evaluaciones deben estar entre 0 y 5'
             }), 400
         
-        # Verificar que haya canciones sin evaluar
-        if np.sum(evaluaciones == 0) == 0:
+        # Verificar que cada usuario tenga canciones sin evaluar
+        sin_pendientes = np.flatnonzero(np.sum(candidatos == 0, axis=1) == 0)
+        if len(sin_pendientes) > 0:
             return jsonify({
-                'error': 'El usuario ya evaluó todas las canciones. No hay recomendaciones disponibles.'
+                'error': f'El usuario en la posición {int(sin_pendientes[0])} ya evaluó '
+                         f'todas las canciones. No hay recomendaciones disponibles.'
             }), 400
         
         # Obtener parámetros
         n_recomendaciones = int(data.get('n_recomendaciones', 10))
         k = int(data.get('k_vecinos', K_VECINOS))
+        g.k_vecinos = k
+        tamano_bloque = int(data.get('tamano_bloque', TAMANO_BLOQUE_LOTE))
         
         # Validar parámetros
         if n_recomendaciones <= 0:
             return jsonify({'error': 'n_recomendaciones debe ser mayor que 0'}), 400
         
-        if k < 1 or k > matriz_ratings.shape[0]:
+        if k < 1 or k > datos.matriz.shape[0]:
             return jsonify({
-                'error': f'k_vecinos debe estar entre 1 y {matriz_ratings.shape[0]}'
+                'error': f'k_vecinos debe estar entre 1 y {datos.matriz.shape[0]}'
             }), 400
         
-        # Clasificar usuario
-        clasificacion = clasificar_usuario(evaluaciones, matriz_ratings, k=k)
+        if tamano_bloque < 1:
+            return jsonify({'error': 'tamano_bloque debe ser mayor que 0'}), 400
         
-        # Generar recomendaciones
-        recomendaciones = recomendar_canciones(
-            evaluaciones,
-            matriz_ratings,
-            nombres_canciones,
+        cronometro.marcar('validacion')
+        
+        # Vecinos de todos los candidatos; los lotes grandes, en paralelo por particiones
+        if busqueda_particionada is not None and len(candidatos) >= PARTICIONES_MIN_CANDIDATOS:
+            vecinos = busqueda_particionada.encontrar_k_vecinos_lote(
+                (datos.version, datos.revision), candidatos, datos.matriz, k,
+                normas=datos.normas, tamano_bloque=tamano_bloque,
+                archivo=_archivo_matriz(datos)
+            )
+        else:
+            vecinos = encontrar_k_vecinos_lote(candidatos, datos.matriz, k,
+                                               normas=datos.normas, tamano_bloque=tamano_bloque)
+        cronometro.marcar('busqueda_vecinos')
+        
+        # Clasificar y recomendar a todos los candidatos
+        resultados = recomendar_canciones_lote(
+            candidatos,
+            datos.matriz,
+            datos.nombres_canciones,
             k_vecinos=k,
-            n_recomendaciones=n_recomendaciones
+            n_recomendaciones=n_recomendaciones,
+            normas=datos.normas,
+            tamano_bloque=tamano_bloque,
+            vecinos=vecinos,
+            agregados=datos.agregados
         )
         
-        return jsonify({
+        for resultado in resultados:
+            resultado['total_recomendaciones'] = len(resultado['recomendaciones'])
+        cronometro.marcar('puntuacion')
+        
+        respuesta = responder({
             'exito': True,
-            'clasificacion': clasificacion,
-            'recomendaciones': recomendaciones,
-            'total_recomendaciones': len(recomendaciones),
+            'resultados': resultados,
+            'total_usuarios': len(resultados),
             'parametros': {
                 'k_vecinos_usado': k,
                 'n_recomendaciones_solicitadas': n_recomendaciones,
-                'canciones_evaluadas': int(np.sum(evaluaciones > 0)),
-                'canciones_disponibles_recomendar': int(np.sum(evaluaciones == 0))
+                'tamano_bloque': tamano_bloque
             }
+        }, request)
+        cronometro.marcar('serializacion')
+        return respuesta, 200
+    
+    except ValueError as e:
+        return jsonify({'error': f'Error en los datos: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+
+def _validar_ratings_enteros(valores):
+    """Mensaje de error si los valores no son enteros entre 0 y 5, o None."""
+    if np.any((valores < 0) | (valores > 5)) or np.any(valores != np.round(valores)):
+        return 'Los ratings deben ser enteros entre 0 y 5'
+    return None
+
+
+@app.route('/usuarios', methods=['POST'])
+def agregar_usuarios():
+    """
+    Agrega usuarios al dataset sin reiniciar el servicio
+    
+    Body (JSON):
+    {
+        "evaluaciones": [0, 5, 3, 0, 4, ...]          // un usuario
+    }
+    o
+    {
+        "evaluaciones": [[0, 5, 3, ...], [4, 0, ...]]  // varios usuarios
+    }
+    
+    Returns:
+        JSON con los índices asignados a los nuevos usuarios (los mismos
+        que aparecen en indices_vecinos)
+    """
+    global instantanea
+    
+    try:
+        # Validar Content-Type
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type debe ser application/json'}), 400
+        
+        if instantanea.creciente is None:
+            return jsonify({
+                'error': f'La ingesta no está disponible con BACKEND_MATRIZ={BACKEND_MATRIZ}'
+            }), 400
+        
+        datos = instantanea
+        data = request.json
+        
+        # Validar campo evaluaciones
+        if 'evaluaciones' not in data:
+            return jsonify({'error': 'Falta el campo "evaluaciones" en el body'}), 400
+        
+        # Convertir a matriz (un vector es un solo usuario)
+        evaluaciones = np.array(data['evaluaciones'], dtype=float)
+        if evaluaciones.ndim == 1:
+            evaluaciones = evaluaciones[None, :]
+        
+        # Validar dimensiones
+        if evaluaciones.ndim != 2 or evaluaciones.shape[1] != len(datos.nombres_canciones):
+            return jsonify({
+                'error': f'Se esperan vectores de {len(datos.nombres_canciones)} evaluaciones'
+            }), 400
+        
+        if evaluaciones.shape[0] == 0 or evaluaciones.shape[0] > MAX_CANDIDATOS_LOTE:
+            return jsonify({
+                'error': f'Se esperan entre 1 y {MAX_CANDIDATOS_LOTE} usuarios por petición'
+            }), 400
+        
+        # Validar rango
+        error = _validar_ratings_enteros(evaluaciones)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        operacion = {'tipo': 'agregar', 'evaluaciones': evaluaciones.astype(int).tolist()}
+        
+        with candado_datos.escritura():
+            instantanea, usuarios = _sincronizar_diario(instantanea, operacion)
+            total_usuarios = instantanea.matriz.shape[0]
+        
+        return jsonify({
+            'exito': True,
+            'usuarios': usuarios.tolist(),
+            'total_usuarios': int(total_usuarios)
+        }), 201
+    
+    except ValueError as e:
+        return jsonify({'error': f'Error en los datos: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+
+@app.route('/usuarios/<int:usuario_id>/ratings', methods=['PATCH'])
+def actualizar_ratings(usuario_id):
+    """
+    Modifica ratings de un usuario existente
+    
+    Solo se tocan las celdas indicadas; 0 elimina la evaluación.
+    
+    Body (JSON):
+    {
+        "ratings": {"La Piragua": 5, "La Gota Fría": 0}
+    }
+    
+    Returns:
+        JSON con el número de ratings modificados y las canciones que el
+        usuario tiene evaluadas
+    """
+    global instantanea
+    
+    try:
+        # Validar Content-Type
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type debe ser application/json'}), 400
+        
+        if instantanea.creciente is None:
+            return jsonify({
+                'error': f'La ingesta no está disponible con BACKEND_MATRIZ={BACKEND_MATRIZ}'
+            }), 400
+        
+        data = request.json
+        ratings = data.get('ratings')
+        
+        # Validar campo ratings
+        if not isinstance(ratings, dict) or not ratings:
+            return jsonify({
+                'error': 'El campo "ratings" debe ser un objeto {canción: rating} no vacío'
+            }), 400
+        
+        indice_canciones = instantanea.indice_canciones
+        desconocidas = [nombre for nombre in ratings if nombre not in indice_canciones]
+        if desconocidas:
+            return jsonify({'error': f'Canciones no encontradas: {desconocidas[:10]}'}), 400
+        
+        canciones = [indice_canciones[nombre] for nombre in ratings]
+        valores = np.array(list(ratings.values()), dtype=float)
+        
+        # Validar rango
+        error = _validar_ratings_enteros(valores)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        operacion = {
+            'tipo': 'actualizar',
+            'usuario': usuario_id,
+            'canciones': canciones,
+            'valores': valores.astype(int).tolist()
+        }
+        
+        with candado_datos.escritura():
+            # Otro worker pudo haber creado al usuario: aplicar su registro antes
+            instantanea = _sincronizar_diario(instantanea)
+            if usuario_id >= instantanea.matriz.shape[0]:
+                return jsonify({'error': f'Usuario {usuario_id} no encontrado'}), 404
+            
+            instantanea, _ = _sincronizar_diario(instantanea, operacion)
+            canciones_evaluadas = int(np.count_nonzero(instantanea.matriz[usuario_id]))
+        
+        return jsonify({
+            'exito': True,
+            'usuario': usuario_id,
+            'ratings_actualizados': len(canciones),
+            'canciones_evaluadas': canciones_evaluadas
         }), 200
     
     except ValueError as e:
@@ -444,6 +1606,136 @@ def recomendar():
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
 
+@app.route('/usuarios/<int:usuario_id>/recomendaciones', methods=['GET'])
+@lectura_consistente
+def recomendaciones_usuario(usuario_id):
+    """
+    Recomienda canciones a un usuario que ya está en el dataset
+    
+    Query params:
+        n: Cantidad de recomendaciones (default 10)
+    
+    Con el grafo de vecinos cargado (ver grafo_vecinos.py) y la fila del
+    usuario al día, las recomendaciones se leen de la tabla en O(N). Si no
+    hay grafo, la ingesta afectó al usuario después de calcularlo o n es
+    mayor que las N guardadas, se calculan en el momento con los mismos k
+    vecinos (K_VECINOS sin grafo).
+    
+    Returns:
+        JSON con las recomendaciones y su origen ("grafo" o "calculado")
+    """
+    try:
+        cronometro = Cronometro(metrica_etapas, '/usuarios/<id>/recomendaciones')
+        datos = instantanea
+        
+        n_recomendaciones = request.args.get('n', 10, type=int)
+        if n_recomendaciones <= 0:
+            return jsonify({'error': 'n debe ser mayor que 0'}), 400
+        
+        if usuario_id >= datos.matriz.shape[0]:
+            return jsonify({'error': f'Usuario {usuario_id} no encontrado'}), 404
+        
+        grafo = datos.grafo
+        k = grafo.vecinos.shape[1] if grafo is not None else K_VECINOS
+        cronometro.marcar('validacion')
+        
+        if (grafo is not None and usuario_id < grafo.canciones.shape[0]
+                and n_recomendaciones <= grafo.canciones.shape[1]
+                and not np.any(grafo.pendientes == usuario_id)):
+            recomendaciones = recomendaciones_grafo(grafo, usuario_id, datos.nombres_canciones,
+                                                    n_recomendaciones)
+            origen = 'grafo'
+        
+        else:
+            evaluaciones, vecindario = vecindario_usuario(usuario_id, datos.matriz, k, datos.normas)
+            cronometro.marcar('busqueda_vecinos')
+            
+            recomendaciones = recomendar_desde_vecindario(
+                evaluaciones,
+                vecindario,
+                datos.nombres_canciones,
+                n_recomendaciones=n_recomendaciones
+            )
+            origen = 'calculado'
+        cronometro.marcar('puntuacion')
+        
+        return jsonify({
+            'exito': True,
+            'usuario': usuario_id,
+            'recomendaciones': recomendaciones,
+            'total_recomendaciones': len(recomendaciones),
+            'origen': origen,
+            'parametros': {
+                'k_vecinos_usado': k,
+                'n_recomendaciones_solicitadas': n_recomendaciones
+            }
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    Recarga el dataset (CSV o binario) sin reiniciar el servicio
+    
+    La instantánea nueva se construye en segundo plano; las peticiones
+    siguen atendiéndose con la anterior hasta que la nueva se publica. Los
+    demás workers se enteran por RECARGA_MARCA y recargan en su siguiente
+    petición.
+    
+    Headers:
+        X-Admin-Token: igual a ADMIN_TOKEN (sin ADMIN_TOKEN el endpoint
+                       responde 403)
+    
+    Body (JSON, opcional):
+    {
+        "esperar": true    // Responder cuando termine la recarga de este worker
+    }
+    
+    Returns:
+        202 con la versión vigente, o 200 con el resultado si esperar=true;
+        403 si ADMIN_TOKEN no está configurado o el token no coincide
+    """
+    global marca_recarga
+    
+    # Sin ADMIN_TOKEN el endpoint queda deshabilitado: cada llamada hace
+    # que todos los workers recarguen el dataset completo
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Recarga deshabilitada: configure ADMIN_TOKEN'}), 403
+    
+    token = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({'error': 'Token de administración inválido'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    esperar = data.get('esperar', False)
+    if not isinstance(esperar, bool):
+        return jsonify({'error': 'El campo "esperar" debe ser booleano'}), 400
+    
+    # Avisar a los demás workers
+    try:
+        with open(RECARGA_MARCA, 'w') as marca:
+            marca.write(f'{time.time()}\n')
+        marca_recarga = _mtime(RECARGA_MARCA)
+    except OSError as e:
+        print(f"⚠️  No se pudo escribir {RECARGA_MARCA}: {e}")
+    
+    if esperar:
+        resultado = recargar_dataset()
+        if resultado['estado'] == 'en_curso':
+            return jsonify(resultado), 409
+        return jsonify(resultado), 200 if resultado['estado'] == 'ok' else 500
+    
+    _recargar_en_segundo_plano()
+    
+    return jsonify({
+        'estado': 'iniciada',
+        'version_actual': instantanea.version
+    }), 202
+
+
 # ============================================================================
 # MANEJO DE ERRORES
 # ============================================================================
@@ -459,10 +1751,18 @@ def not_found(error):
             'GET /health',
             'GET /stats',
             'GET /canciones',
+            'GET /cache',
+            'GET /microlotes',
+            'GET /metrics',
             'GET /config',
             'POST /config',
             'POST /clasificar',
-            'POST /recomendar'
+            'POST /recomendar',
+            'POST /recomendar/batch',
+            'POST /usuarios',
+            'PATCH /usuarios/<id>/ratings',
+            'GET /usuarios/<id>/recomendaciones',
+            'POST /admin/reload'
         ]
     }), 404
 
@@ -0,0 +1,178 @@
+"""
+VERIFICACIÓN - CLASIFICACIÓN CON AGREGADOS POR USUARIO
+
+Compara clasificar_vecindario con agregados (O(k), ver
+knn_engine.estadisticas_vecindario) contra el recorrido de las
+evaluaciones de los k vecinos, para cada almacenamiento y varios k:
+    - categoría, índices y similitudes: deben ser idénticos
+    - promedio y canciones evaluadas: diferencia máxima (esperado 0 o
+      redondeo de la última cifra)
+    - desviación: diferencia máxima entre √(N·Q − S²)/N y np.std
+    - ms: tiempo medio de clasificar_vecindario con el vecindario ya
+          calculado, con y sin agregados
+
+Después aplica operaciones de ingesta aleatorias (agregar usuarios y
+modificar ratings, con 0 para eliminar) sobre MatrizCreciente y compara
+los agregados mantenidos por diferencias con calcular_agregados_usuarios
+sobre la matriz resultante, y vuelve a comparar la clasificación.
+
+Termina con código 1 si alguna comparación falla.
+
+Uso:
+    python benchmarks/agregados.py
+    python benchmarks/agregados.py --usuarios 50000 --canciones 500 --k 1 5 10 50 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from almacenamiento import candidatos_aleatorios, matriz_sintetica
+from dataset_loader import cargar_csv
+from ingesta import MatrizCreciente
+from knn_engine import (
+    calcular_agregados_usuarios,
+    calcular_normas,
+    calcular_vecindario,
+    clasificar_vecindario,
+    construir_matriz_compacta,
+    construir_matriz_dispersa
+)
+
+# Diferencia máxima admitida en promedio, desviación y canciones evaluadas
+TOLERANCIA = 1e-9
+
+
+def comparar_clasificaciones(matriz, normas, agregados, candidatos, k):
+    """
+    Clasifica cada candidato por los dos caminos.
+    
+    Returns:
+        tuple: (fracción de clasificaciones idénticas en categoría, índices
+                y similitudes, diferencia máxima de promedio, de desviación
+                y de canciones evaluadas, ms sin agregados, ms con agregados)
+    """
+    identicas = 0
+    diferencias = np.zeros(3)
+    tiempos = np.zeros(2)
+    campos = ('promedio_rating_vecindario', 'desviacion_rating_vecindario',
+              'canciones_evaluadas_vecindario')
+    
+    for candidato in candidatos:
+        vecindario = calcular_vecindario(candidato, matriz, k, normas)
+        
+        inicio = time.perf_counter()
+        recorrido = clasificar_vecindario(vecindario)
+        medio = time.perf_counter()
+        con_agregados = clasificar_vecindario(vecindario._replace(evaluaciones=None), agregados)
+        tiempos += (medio - inicio, time.perf_counter() - medio)
+        
+        if all(recorrido[campo] == con_agregados[campo]
+               for campo in ('categoria', 'indices_vecinos', 'similitudes')):
+            identicas += 1
+        diferencias = np.maximum(diferencias, [abs(recorrido[campo] - con_agregados[campo])
+                                               for campo in campos])
+    
+    return (identicas / len(candidatos), *diferencias, *(tiempos * 1000 / len(candidatos)))
+
+
+def aplicar_ingesta(creciente, n_operaciones, semilla=2):
+    """Operaciones aleatorias de agregar usuarios y modificar ratings."""
+    rng = np.random.default_rng(semilla)
+    n_canciones = creciente.matriz.shape[1]
+    
+    for _ in range(n_operaciones):
+        if rng.random() < 0.3:
+            nuevos = rng.integers(0, 6, size=(rng.integers(1, 4), n_canciones))
+            nuevos[rng.random(nuevos.shape) < 0.7] = 0
+            creciente.agregar(nuevos.astype(creciente.matriz.dtype))
+        else:
+            canciones = rng.choice(n_canciones, size=rng.integers(1, 20), replace=False)
+            creciente.actualizar(int(rng.integers(creciente.n_usuarios)), canciones,
+                                 rng.integers(0, 6, size=len(canciones)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'dataset_ratings.csv'))
+    parser.add_argument('--usuarios', type=int, default=0,
+                        help='Usar una matriz sintética con este número de usuarios')
+    parser.add_argument('--canciones', type=int, default=200)
+    parser.add_argument('--densidad', type=float, default=0.1)
+    parser.add_argument('--candidatos', type=int, default=100)
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 5, 10, 50])
+    parser.add_argument('--operaciones', type=int, default=500,
+                        help='Operaciones de ingesta aleatorias')
+    args = parser.parse_args()
+    
+    if args.usuarios > 0:
+        base = matriz_sintetica(args.usuarios, args.canciones, args.densidad)
+        origen = f'sintético {args.usuarios}×{args.canciones}, densidad {args.densidad}'
+    else:
+        base = cargar_csv(args.dataset).matriz.astype(float)
+        origen = os.path.basename(args.dataset)
+    
+    candidatos = candidatos_aleatorios(args.candidatos, base.shape[1])
+    
+    compacta, normas_compacta = construir_matriz_compacta(base)
+    dispersa = construir_matriz_dispersa(base)
+    almacenamientos = [
+        ('densa', base, calcular_normas(base)),
+        ('compacta', compacta, normas_compacta),
+        ('dispersa', dispersa, dispersa.normas)
+    ]
+    
+    print(f"Dataset: {origen} → {base.shape[0]:,} usuarios × {base.shape[1]:,} canciones")
+    print(f"{args.candidatos} candidatos por fila\n")
+    
+    encabezado = (f"{'almacenamiento':<22}{'k':>4}{'idénticas':>11}{'Δ promedio':>12}"
+                  f"{'Δ desviación':>14}{'Δ evaluadas':>13}{'ms recorrido':>14}{'ms agregados':>14}")
+    fallos = 0
+    
+    def imprimir_filas(nombre, matriz, normas, agregados):
+        nonlocal fallos
+        for k in args.k:
+            fila = comparar_clasificaciones(matriz, normas, agregados, candidatos, k)
+            identicas, diferencias = fila[0], fila[1:4]
+            if identicas < 1 or max(diferencias) > TOLERANCIA:
+                fallos += 1
+            print(f"{nombre:<22}{k:>4}{identicas:>10.0%}{diferencias[0]:>12.1e}"
+                  f"{diferencias[1]:>14.1e}{diferencias[2]:>13.1e}{fila[4]:>14.3f}{fila[5]:>14.3f}")
+    
+    print(encabezado)
+    for nombre, matriz, normas in almacenamientos:
+        imprimir_filas(nombre, matriz, normas, calcular_agregados_usuarios(matriz))
+    
+    # La ingesta solo existe para los almacenamientos densos (ver app.py)
+    print(f"\nDespués de {args.operaciones} operaciones de ingesta:\n")
+    print(encabezado)
+    for nombre, matriz, normas in almacenamientos[:2]:
+        creciente = MatrizCreciente(matriz, normas.copy(), calcular_agregados_usuarios(matriz))
+        aplicar_ingesta(creciente, args.operaciones)
+        
+        recalculados = calcular_agregados_usuarios(creciente.matriz)
+        iguales = all(np.array_equal(mantenido, recalculado)
+                      for mantenido, recalculado in zip(creciente.agregados, recalculados))
+        if not iguales:
+            fallos += 1
+            print(f"{nombre:<22}agregados mantenidos ≠ recalculados")
+        
+        imprimir_filas(f'{nombre} + ingesta', creciente.matriz, creciente.normas,
+                       creciente.agregados)
+    
+    if fallos:
+        print(f"\n❌ {fallos} comparaciones fallaron")
+        raise SystemExit(1)
+    
+    print("\n✓ Clasificación con agregados idéntica al recorrido de las evaluaciones")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+BENCHMARK - ALMACENAMIENTO DE LA MATRIZ DE RATINGS
+
+Compara memoria y latencia de encontrar_k_vecinos con los tres
+almacenamientos de la matriz:
+    - densa:    float64 (formato original)
+    - compacta: uint8 con normas y productos en float32
+    - dispersa: CSR con ratings int8
+
+También verifica la equivalencia numérica con calcular_similitud_coseno
+(la implementación de referencia, par a par).
+
+Uso:
+    python benchmarks/almacenamiento.py
+    python benchmarks/almacenamiento.py --usuarios 100000 --canciones 2000 --densidad 0.3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dataset_loader import cargar_csv
+from knn_engine import (
+    calcular_similitud_coseno,
+    calcular_normas,
+    construir_matriz_compacta,
+    construir_matriz_dispersa,
+    encontrar_k_vecinos
+)
+
+
+def matriz_sintetica(n_usuarios, n_canciones, densidad, semilla=0):
+    """Matriz de ratings aleatorios 1-5 con la densidad indicada."""
+    rng = np.random.default_rng(semilla)
+    matriz = rng.integers(1, 6, size=(n_usuarios, n_canciones)).astype(float)
+    matriz[rng.random((n_usuarios, n_canciones)) >= densidad] = 0
+    return matriz
+
+
+def candidatos_aleatorios(n, n_canciones, evaluadas=10, semilla=1):
+    """Candidatos con `evaluadas` canciones calificadas, como en el frontend."""
+    rng = np.random.default_rng(semilla)
+    candidatos = np.zeros((n, n_canciones))
+    for fila in candidatos:
+        columnas = rng.choice(n_canciones, min(evaluadas, n_canciones), replace=False)
+        fila[columnas] = rng.integers(1, 6, len(columnas))
+    return candidatos
+
+
+def bytes_almacenamiento(matriz, normas):
+    """Memoria residente de la matriz y sus normas."""
+    if hasattr(matriz, 'datos'):
+        total = matriz.indptr.nbytes + matriz.indices.nbytes + matriz.datos.nbytes
+    else:
+        total = matriz.nbytes
+    return total + normas.nbytes
+
+
+def medir_latencias(matriz, normas, candidatos, k):
+    """Latencia por consulta de encontrar_k_vecinos, en milisegundos."""
+    latencias = []
+    for candidato in candidatos:
+        inicio = time.perf_counter()
+        encontrar_k_vecinos(candidato, matriz, k, normas)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return np.array(latencias)
+
+
+def verificar_equivalencia(matriz, normas, matriz_referencia, candidatos, k):
+    """
+    Compara con calcular_similitud_coseno aplicado usuario por usuario.
+    
+    Returns:
+        tuple: (máxima diferencia absoluta de similitud,
+                fracción de consultas con los mismos vecinos)
+    """
+    diferencia_maxima = 0.0
+    coincidencias = 0
+    
+    for candidato in candidatos:
+        referencia = np.array([
+            calcular_similitud_coseno(candidato, fila) for fila in matriz_referencia
+        ])
+        indices, similitudes = encontrar_k_vecinos(candidato, matriz, k, normas)
+        
+        diferencia_maxima = max(
+            diferencia_maxima,
+            float(np.max(np.abs(similitudes - referencia[indices])))
+        )
+        
+        # Mismo conjunto de vecinos, salvo empates en el k-ésimo valor
+        umbral = np.sort(referencia)[::-1][min(k, len(referencia)) - 1]
+        obligatorios = set(np.flatnonzero(referencia > umbral + 1e-6))
+        permitidos = set(np.flatnonzero(referencia >= umbral - 1e-6))
+        if obligatorios <= set(indices.tolist()) <= permitidos:
+            coincidencias += 1
+    
+    return diferencia_maxima, coincidencias / len(candidatos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'dataset_ratings.csv'))
+    parser.add_argument('--usuarios', type=int, default=0,
+                        help='Usar una matriz sintética con este número de usuarios')
+    parser.add_argument('--canciones', type=int, default=200)
+    parser.add_argument('--densidad', type=float, default=0.3)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--verificar', type=int, default=20,
+                        help='Consultas comparadas contra calcular_similitud_coseno')
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+    
+    if args.usuarios > 0:
+        matriz = matriz_sintetica(args.usuarios, args.canciones, args.densidad)
+        origen = f'sintético {args.usuarios}×{args.canciones} densidad {args.densidad}'
+    else:
+        matriz = cargar_csv(args.dataset).matriz.astype(float)
+        origen = os.path.basename(args.dataset)
+    
+    candidatos = candidatos_aleatorios(args.consultas, matriz.shape[1])
+    
+    compacta, normas_compacta = construir_matriz_compacta(matriz)
+    dispersa = construir_matriz_dispersa(matriz)
+    almacenamientos = [
+        ('densa', matriz, calcular_normas(matriz)),
+        ('compacta', compacta, normas_compacta),
+        ('dispersa', dispersa, dispersa.normas),
+    ]
+    
+    print(f"Dataset: {origen} → {matriz.shape[0]:,} usuarios × {matriz.shape[1]:,} canciones")
+    print(f"Consultas: {args.consultas} (k={args.k}), verificación: {args.verificar}\n")
+    print(f"{'almacenamiento':<15}{'memoria MB':>12}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'max |Δsim|':>14}{'vecinos ok':>12}")
+    
+    for nombre, datos, normas in almacenamientos:
+        memoria = bytes_almacenamiento(datos, normas) / 1e6
+        
+        # Calentamiento
+        medir_latencias(datos, normas, candidatos[:5], args.k)
+        latencias = medir_latencias(datos, normas, candidatos, args.k)
+        
+        diferencia, coincidencias = verificar_equivalencia(
+            datos, normas, matriz, candidatos[:args.verificar], args.k
+        )
+        
+        print(f"{nombre:<15}{memoria:>12.2f}{np.percentile(latencias, 50):>10.3f}"
+              f"{np.percentile(latencias, 99):>10.3f}{diferencia:>14.2e}{coincidencias:>12.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+BARRIDO DE K_VECINOS - RMSE, PRECISIÓN@N Y LATENCIA PARA CADA K
+
+Ayuda a elegir K_VECINOS (POST /config admite de 1 a 100). Separa usuarios
+de prueba de la matriz, oculta el 20% de sus ratings y, para cada k entre
+--k-min y --k-max, reporta:
+    - RMSE: error cuadrático medio del score predicho sobre los ratings
+            ocultos que tienen predicción (algún vecino evaluó la canción)
+    - cobertura: fracción de ratings ocultos con predicción
+    - precisión@N: fracción de las N recomendaciones que son canciones
+                   ocultas con rating >= 4
+    - p50: latencia de calcular_vecindario + recomendar_desde_vecindario
+           con ese k, sobre una muestra de consultas
+
+UNA SOLA PASADA DE SIMILITUDES:
+Los K = k_max vecinos de cada consulta se buscan una vez, ya ordenados
+(encontrar_k_vecinos_lote). Los vecinos con k < K son los k primeros, así
+que las sumas de puntuar_canciones para todos los k salen de sumas
+acumuladas sobre el eje de los vecinos (R: ratings de los vecinos en las
+canciones no evaluadas, s: similitudes):
+    
+    ponderada[k, c]  = Σ_{i<k} R[i, c] · s[i]    = cumsum(R · s)[k-1, c]
+    similitudes[k, c] = Σ_{i<k} [R[i, c] > 0] · s[i]
+    score[k, c]      = ponderada[k, c] / similitudes[k, c]
+
+Las consultas se reparten entre procesos (fork, sin copiar la matriz); con
+--procesos > 1 conviene OPENBLAS_NUM_THREADS=1. Una muestra de las
+recomendaciones se compara con recomendar_desde_vecindario.
+
+Uso:
+    python benchmarks/barrido_k.py
+    python benchmarks/barrido_k.py --consultas 2000 --k-max 100 --procesos 4 --csv barrido.csv
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dataset_loader import cargar_csv
+from item_item import separar_prueba
+from knn_engine import (
+    calcular_normas,
+    calcular_vecindario,
+    encontrar_k_vecinos_lote,
+    recomendar_desde_vecindario
+)
+from recall_lsh import matriz_sintetica_agrupada
+
+
+# Datos que heredan los procesos del barrido (fork): entrenamiento,
+# consultas, ocultos, normas, k_max y n
+_CONTEXTO = {}
+
+
+def scores_por_k(consulta, vecinos, similitudes, matriz):
+    """
+    Scores de las canciones no evaluadas para k = 1..len(vecinos).
+    
+    Mismas reglas que puntuar_canciones: promedio simple si las
+    similitudes suman 0 y 0 si ningún vecino evaluó la canción.
+    
+    Args:
+        consulta (np.array): Evaluaciones visibles del usuario
+        vecinos (np.array): Vecinos ordenados por similitud descendente
+        similitudes (np.array): Similitud de cada vecino
+        matriz (np.array): Matriz de entrenamiento
+    
+    Returns:
+        tuple: (no_evaluadas, scores, evaluaron), los dos últimos
+               (len(vecinos), len(no_evaluadas)); la fila k-1 es el
+               resultado con k vecinos
+    """
+    no_evaluadas = np.flatnonzero(consulta == 0)
+    ratings = matriz[vecinos][:, no_evaluadas].astype(float)
+    mascara = ratings > 0
+    
+    ponderada = np.cumsum(ratings * similitudes[:, None], axis=0)
+    suma_similitudes = np.cumsum(mascara * similitudes[:, None], axis=0)
+    suma_ratings = np.cumsum(ratings, axis=0)
+    evaluaron = np.cumsum(mascara, axis=0)
+    
+    scores = np.zeros(ratings.shape)
+    np.divide(suma_ratings, evaluaron, out=scores, where=evaluaron > 0)
+    np.divide(ponderada, suma_similitudes, out=scores, where=suma_similitudes > 0)
+    
+    return no_evaluadas, scores, evaluaron
+
+
+def top_n_por_k(scores, n):
+    """
+    Posiciones (en no_evaluadas) de las n mejores canciones de cada fila,
+    con el desempate de _seleccionar_top_k (a favor del índice mayor).
+    """
+    n_columnas = scores.shape[1]
+    # Orden estable sobre las columnas invertidas: entre empates queda
+    # primero el índice original mayor
+    orden = np.argsort(-scores[:, ::-1], axis=1, kind='stable')[:, :n]
+    return n_columnas - 1 - orden
+
+
+def evaluar_bloque(rango):
+    """
+    Métricas acumuladas para k = 1..k_max de las consultas en rango.
+    
+    Returns:
+        np.array: (4, k_max) con la suma de errores al cuadrado, ratings
+                  ocultos con predicción, aciertos y recomendaciones
+    """
+    inicio, fin = rango
+    entrenamiento = _CONTEXTO['entrenamiento']
+    consultas = _CONTEXTO['consultas'][inicio:fin]
+    ocultos = _CONTEXTO['ocultos'][inicio:fin]
+    k_max, n = _CONTEXTO['k_max'], _CONTEXTO['n']
+    
+    # Una sola búsqueda (un producto de matrices por bloque) para todo el rango
+    indices, similitudes = encontrar_k_vecinos_lote(consultas, entrenamiento, k_max,
+                                                    _CONTEXTO['normas'])
+    
+    totales = np.zeros((4, k_max))
+    for consulta, oculto, vecinos, similitudes_consulta in zip(consultas, ocultos, indices,
+                                                               similitudes):
+        no_evaluadas, scores, evaluaron = scores_por_k(consulta, vecinos, similitudes_consulta,
+                                                       entrenamiento)
+        if len(no_evaluadas) == 0:
+            continue
+        
+        # Error sobre los ratings ocultos que tienen predicción
+        oculto = oculto[no_evaluadas]
+        con_rating = oculto > 0
+        cubiertos = evaluaron[:, con_rating] > 0
+        errores = np.where(cubiertos, scores[:, con_rating] - oculto[con_rating], 0)
+        totales[0] += np.sum(errores ** 2, axis=1)
+        totales[1] += np.sum(cubiertos, axis=1)
+        
+        # Precisión de las n recomendaciones
+        top = top_n_por_k(scores, n)
+        totales[2] += np.sum(oculto[top] >= 4, axis=1)
+        totales[3] += top.shape[1]
+    
+    return totales
+
+
+def barrer(entrenamiento, consultas, ocultos, normas, k_max, n, procesos):
+    """
+    Evalúa todas las consultas para k = 1..k_max, repartidas entre procesos.
+    
+    Returns:
+        np.array: (4, k_max), ver evaluar_bloque
+    """
+    _CONTEXTO.update(entrenamiento=entrenamiento, consultas=consultas, ocultos=ocultos,
+                     normas=normas, k_max=k_max, n=n)
+    
+    # Bloques de 256 consultas (un producto de matrices cada uno)
+    rangos = [(inicio, min(inicio + 256, len(consultas)))
+              for inicio in range(0, len(consultas), 256)]
+    
+    if procesos > 1:
+        with multiprocessing.get_context('fork').Pool(procesos) as pool:
+            parciales = pool.map(evaluar_bloque, rangos)
+    else:
+        parciales = [evaluar_bloque(rango) for rango in rangos]
+    
+    return np.sum(parciales, axis=0)
+
+
+def verificar(entrenamiento, consultas, normas, ks, n, muestras=20):
+    """
+    Compara las recomendaciones del barrido con recomendar_desde_vecindario
+    para una muestra de consultas y valores de k.
+    
+    Returns:
+        tuple: (coincidencias, comparaciones)
+    """
+    nombres = [str(i) for i in range(entrenamiento.shape[1])]
+    k_max = max(ks)
+    indices, similitudes = encontrar_k_vecinos_lote(consultas[:muestras], entrenamiento, k_max,
+                                                    normas)
+    coincidencias = 0
+    comparaciones = 0
+    
+    for consulta, vecinos, similitudes_consulta in zip(consultas[:muestras], indices, similitudes):
+        no_evaluadas, scores, _ = scores_por_k(consulta, vecinos, similitudes_consulta,
+                                               entrenamiento)
+        top = top_n_por_k(scores, n)
+        for k in ks:
+            vecindario = calcular_vecindario(consulta, entrenamiento, k=k, normas=normas)
+            esperadas = [int(r['cancion']) for r in
+                         recomendar_desde_vecindario(consulta, vecindario, nombres, n)]
+            coincidencias += esperadas == no_evaluadas[top[k - 1]].tolist()
+            comparaciones += 1
+    
+    return coincidencias, comparaciones
+
+
+def latencia(entrenamiento, consultas, normas, k, n):
+    """p50 en ms de calcular_vecindario + recomendar_desde_vecindario con k vecinos."""
+    nombres = [str(i) for i in range(entrenamiento.shape[1])]
+    tiempos = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        vecindario = calcular_vecindario(consulta, entrenamiento, k=k, normas=normas)
+        recomendar_desde_vecindario(consulta, vecindario, nombres, n)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return float(np.percentile(tiempos, 50))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'dataset_ratings.csv'))
+    parser.add_argument('--usuarios', type=int, default=0,
+                        help='Usar una matriz sintética con este número de usuarios')
+    parser.add_argument('--canciones', type=int, default=200)
+    parser.add_argument('--grupos', type=int, default=100,
+                        help='Grupos de gustos de la matriz sintética')
+    parser.add_argument('--densidad', type=float, default=0.1)
+    parser.add_argument('--consultas', type=int, default=1000,
+                        help='Usuarios de prueba (fuera de la matriz de entrenamiento)')
+    parser.add_argument('--k-min', type=int, default=1)
+    parser.add_argument('--k-max', type=int, default=100)
+    parser.add_argument('--n', type=int, default=10, help='Recomendaciones por consulta')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--latencia-consultas', type=int, default=50,
+                        help='Consultas para medir la latencia de cada k (0 = no medir)')
+    parser.add_argument('--csv', default=None, help='Guardar la tabla en este archivo')
+    args = parser.parse_args()
+    
+    if args.usuarios > 0:
+        matriz = matriz_sintetica_agrupada(args.usuarios, args.canciones, args.grupos,
+                                           args.densidad)
+        origen = (f'sintético {args.usuarios}×{args.canciones}, {args.grupos} grupos, '
+                  f'densidad {args.densidad}')
+    else:
+        matriz = cargar_csv(args.dataset).matriz
+        origen = os.path.basename(args.dataset)
+    
+    entrenamiento, consultas, ocultos = separar_prueba(matriz, args.consultas)
+    # Matriz uint8 con normas float32 (almacenamiento compacto)
+    normas = calcular_normas(entrenamiento, dtype=np.float32)
+    k_max = min(args.k_max, entrenamiento.shape[0])
+    ks = list(range(max(1, args.k_min), k_max + 1))
+    
+    print(f"Dataset: {origen} → {matriz.shape[0]:,} usuarios × {matriz.shape[1]:,} canciones")
+    print(f"Consultas: {len(consultas)} usuarios fuera de la matriz, 20% de sus ratings ocultos")
+    
+    inicio = time.perf_counter()
+    totales = barrer(entrenamiento, consultas, ocultos, normas, k_max, args.n, args.procesos)
+    duracion = time.perf_counter() - inicio
+    print(f"Barrido: k = {ks[0]}..{ks[-1]} en {duracion:.2f}s "
+          f"({args.procesos} proceso{'s' if args.procesos > 1 else ''})")
+    
+    coincidencias, comparaciones = verificar(entrenamiento, consultas, normas,
+                                             sorted({ks[0], ks[len(ks) // 2], ks[-1]}), args.n)
+    print(f"Verificación: {coincidencias}/{comparaciones} recomendaciones idénticas a "
+          f"recomendar_desde_vecindario\n")
+    
+    errores, predichos, aciertos, recomendadas = totales
+    total_ocultos = int(np.count_nonzero(ocultos))
+    muestra = consultas[:args.latencia_consultas]
+    
+    filas = []
+    for k in ks:
+        filas.append({
+            'k': k,
+            'rmse': float(np.sqrt(errores[k - 1] / predichos[k - 1])) if predichos[k - 1] else float('nan'),
+            'cobertura': float(predichos[k - 1] / total_ocultos) if total_ocultos else 0.0,
+            'precision': float(aciertos[k - 1] / recomendadas[k - 1]) if recomendadas[k - 1] else 0.0,
+            'p50_ms': latencia(entrenamiento, muestra, normas, k, args.n) if len(muestra) else float('nan')
+        })
+    
+    mejor_rmse = min(filas, key=lambda fila: fila['rmse'])['k']
+    mejor_precision = max(filas, key=lambda fila: fila['precision'])['k']
+    
+    print(f"{'k':>4}{'RMSE':>9}{'cobertura':>11}{'precisión@' + str(args.n):>15}{'p50 ms':>9}")
+    for fila in filas:
+        marcas = ('  ← RMSE' if fila['k'] == mejor_rmse else '') + \
+                 ('  ← precisión' if fila['k'] == mejor_precision else '')
+        print(f"{fila['k']:>4}{fila['rmse']:>9.4f}{fila['cobertura']:>11.1%}"
+              f"{fila['precision']:>15.4f}{fila['p50_ms']:>9.3f}{marcas}")
+    
+    if args.csv:
+        with open(args.csv, 'w', newline='') as archivo:
+            escritor = csv.DictWriter(archivo, fieldnames=list(filas[0]))
+            escritor.writeheader()
+            escritor.writerows(filas)
+        print(f"\n✓ Tabla guardada en {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
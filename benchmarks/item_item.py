@@ -0,0 +1,163 @@
+"""
+BENCHMARK - FILTRADO ITEM-ITEM FRENTE AL FILTRADO BASADO EN USUARIO
+
+Compara las recomendaciones de recomendar_item_item (tabla precalculada de
+canciones similares) con las de recomendar_desde_vecindario (K usuarios
+más similares) sobre usuarios de prueba que no están en la matriz:
+    - MAE: error absoluto medio del score predicho frente a los ratings
+           ocultos del usuario
+    - cobertura: fracción de ratings ocultos para los que hay predicción
+    - recall@N: fracción de canciones ocultas con rating >= 4 que aparecen
+                entre las N recomendaciones
+    - p50 / p99 de latencia por petición
+
+Uso:
+    python benchmarks/item_item.py
+    python benchmarks/item_item.py --usuarios 200000 --canciones 500 --vecinas 20 50 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dataset_loader import cargar_csv
+from knn_engine import (
+    calcular_normas,
+    calcular_vecindario,
+    construir_vecinos_canciones,
+    recomendar_desde_vecindario,
+    recomendar_item_item
+)
+from recall_lsh import matriz_sintetica_agrupada
+
+
+def separar_prueba(matriz, n_prueba, fraccion_oculta=0.2, semilla=1):
+    """
+    Separa n_prueba usuarios de la matriz y oculta una fracción de sus
+    evaluaciones.
+    
+    Returns:
+        tuple: (matriz de entrenamiento, consultas, ratings ocultos), donde
+               ocultos tiene los ratings retirados de cada consulta (0 en
+               el resto)
+    """
+    rng = np.random.default_rng(semilla)
+    filas = rng.permutation(matriz.shape[0])
+    prueba, entrenamiento = filas[:n_prueba], filas[n_prueba:]
+    
+    evaluaciones = matriz[prueba].astype(float)
+    ocultar = (evaluaciones > 0) & (rng.random(evaluaciones.shape) < fraccion_oculta)
+    consultas = np.where(ocultar, 0, evaluaciones)
+    ocultos = np.where(ocultar, evaluaciones, 0)
+    
+    return matriz[np.sort(entrenamiento)], consultas, ocultos
+
+
+def evaluar(recomendar, consultas, ocultos, nombres, n):
+    """
+    Ejecuta recomendar(consulta, n_recomendaciones) con cada consulta.
+    
+    Returns:
+        tuple: (MAE, cobertura, recall@n, latencias en ms)
+    """
+    posicion = {nombre: i for i, nombre in enumerate(nombres)}
+    errores = []
+    predichos = 0
+    aciertos = 0
+    relevantes = 0
+    latencias = []
+    
+    for consulta, oculto in zip(consultas, ocultos):
+        # Latencia de una petición normal (top n)
+        inicio = time.perf_counter()
+        top = recomendar(consulta, n)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        
+        # Precisión del score sobre todas las canciones no evaluadas
+        scores = {posicion[r['cancion']]: r['score_predicho']
+                  for r in recomendar(consulta, len(nombres))}
+        for cancion in np.flatnonzero(oculto):
+            if cancion in scores:
+                errores.append(abs(scores[cancion] - oculto[cancion]))
+                predichos += 1
+        
+        gustadas = set(np.flatnonzero(oculto >= 4).tolist())
+        relevantes += len(gustadas)
+        aciertos += len(gustadas & {posicion[r['cancion']] for r in top})
+    
+    total_ocultos = int(np.count_nonzero(ocultos))
+    return (float(np.mean(errores)) if errores else float('nan'),
+            predichos / total_ocultos if total_ocultos else 0.0,
+            aciertos / relevantes if relevantes else 0.0,
+            np.array(latencias))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'dataset_ratings.csv'))
+    parser.add_argument('--usuarios', type=int, default=0,
+                        help='Usar una matriz sintética con este número de usuarios')
+    parser.add_argument('--canciones', type=int, default=200)
+    parser.add_argument('--grupos', type=int, default=100,
+                        help='Grupos de gustos de la matriz sintética')
+    parser.add_argument('--densidad', type=float, default=0.1)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--n', type=int, default=10, help='Recomendaciones por petición')
+    parser.add_argument('--vecinas', type=int, nargs='+', default=[20, 50, 100],
+                        help='Vecinas por canción (M) de la tabla item-item')
+    args = parser.parse_args()
+    
+    if args.usuarios > 0:
+        matriz = matriz_sintetica_agrupada(args.usuarios, args.canciones, args.grupos,
+                                           args.densidad)
+        origen = (f'sintético {args.usuarios}×{args.canciones}, {args.grupos} grupos, '
+                  f'densidad {args.densidad}')
+    else:
+        matriz = cargar_csv(args.dataset).matriz
+        origen = os.path.basename(args.dataset)
+    
+    entrenamiento, consultas, ocultos = separar_prueba(matriz, args.consultas)
+    # Matriz uint8 con normas float32 (almacenamiento compacto)
+    normas = calcular_normas(entrenamiento, dtype=np.float32)
+    nombres = [f'cancion_{i}' for i in range(matriz.shape[1])]
+    
+    print(f"Dataset: {origen} → {matriz.shape[0]:,} usuarios × {matriz.shape[1]:,} canciones")
+    print(f"Consultas: {args.consultas} usuarios fuera de la matriz, 20% de sus ratings ocultos\n")
+    print(f"{'modo':<22}{'build s':>9}{'tabla KB':>10}{'MAE':>8}{'cobertura':>11}"
+          f"{'recall@' + str(args.n):>11}{'p50 ms':>9}{'p99 ms':>9}")
+    
+    def basado_en_usuario(consulta, n):
+        vecindario = calcular_vecindario(consulta, entrenamiento, k=args.k, normas=normas)
+        return recomendar_desde_vecindario(consulta, vecindario, nombres, n_recomendaciones=n)
+    
+    mae, cobertura, recall, latencias = evaluar(basado_en_usuario, consultas, ocultos,
+                                                nombres, args.n)
+    print(f"{'usuario (k=' + str(args.k) + ')':<22}{'-':>9}{'-':>10}{mae:>8.3f}{cobertura:>11.1%}"
+          f"{recall:>11.3f}{np.percentile(latencias, 50):>9.3f}{np.percentile(latencias, 99):>9.3f}")
+    
+    for m_vecinos in args.vecinas:
+        inicio = time.perf_counter()
+        vecinos_canciones = construir_vecinos_canciones(entrenamiento, m_vecinos=m_vecinos)
+        construccion = time.perf_counter() - inicio
+        tamano = (vecinos_canciones.indices.nbytes + vecinos_canciones.similitudes.nbytes) / 1e3
+        
+        def basado_en_items(consulta, n):
+            return recomendar_item_item(consulta, vecinos_canciones, nombres, n_recomendaciones=n)
+        
+        mae, cobertura, recall, latencias = evaluar(basado_en_items, consultas, ocultos,
+                                                    nombres, args.n)
+        print(f"{'item (M=' + str(m_vecinos) + ')':<22}{construccion:>9.2f}{tamano:>10.1f}"
+              f"{mae:>8.3f}{cobertura:>11.1%}{recall:>11.3f}"
+              f"{np.percentile(latencias, 50):>9.3f}{np.percentile(latencias, 99):>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
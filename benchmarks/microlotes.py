@@ -0,0 +1,128 @@
+"""
+BENCHMARK - MICROLOTES FRENTE A UNA BÚSQUEDA POR PETICIÓN
+
+Simula un worker que recibe ráfagas de peticiones de /recomendar: C
+clientes concurrentes envían peticiones una tras otra (cada cliente espera
+su respuesta antes de enviar la siguiente). Compara:
+    - sync: una petición a la vez, como un worker síncrono de gunicorn
+    - hilos: un hilo por cliente, cada uno con su propio recorrido de la
+             matriz (worker gthread sin microlotes)
+    - microlotes: un hilo por cliente con AgrupadorConsultas, para cada
+                  ventana indicada
+
+Reporta peticiones por segundo, latencia p50 / p99, tamaño medio de los
+lotes y mediana de la espera en la cola. También verifica que los vecinos
+coincidan con los de encontrar_k_vecinos.
+
+Uso:
+    python benchmarks/microlotes.py
+    python benchmarks/microlotes.py --usuarios 100000 --clientes 64 --ventanas 1 2 5
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from almacenamiento import candidatos_aleatorios, matriz_sintetica
+from dataset_loader import cargar_csv
+from knn_engine import calcular_normas, encontrar_k_vecinos
+from microlotes import AgrupadorConsultas
+
+
+def ejecutar_clientes(buscar, candidatos, n_clientes):
+    """
+    Reparte los candidatos entre n_clientes hilos que llaman buscar(i).
+    
+    Returns:
+        tuple: (segundos totales, latencias en ms, resultados por candidato)
+    """
+    latencias = np.zeros(len(candidatos))
+    resultados = [None] * len(candidatos)
+    
+    def cliente(posiciones):
+        for i in posiciones:
+            inicio = time.perf_counter()
+            resultados[i] = buscar(i)
+            latencias[i] = (time.perf_counter() - inicio) * 1000
+    
+    hilos = [threading.Thread(target=cliente, args=(range(c, len(candidatos), n_clientes),))
+             for c in range(n_clientes)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    
+    return time.perf_counter() - inicio, latencias, resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'dataset_ratings.csv'))
+    parser.add_argument('--usuarios', type=int, default=0,
+                        help='Usar una matriz sintética con este número de usuarios')
+    parser.add_argument('--canciones', type=int, default=200)
+    parser.add_argument('--densidad', type=float, default=0.1)
+    parser.add_argument('--peticiones', type=int, default=2000)
+    parser.add_argument('--clientes', type=int, default=32, help='Peticiones concurrentes')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--ventanas', type=float, nargs='+', default=[0.5, 2, 5],
+                        help='Ventanas de los microlotes en ms')
+    parser.add_argument('--max-lote', type=int, default=64)
+    args = parser.parse_args()
+    
+    if args.usuarios > 0:
+        matriz = matriz_sintetica(args.usuarios, args.canciones, args.densidad)
+        origen = f'sintético {args.usuarios}×{args.canciones}, densidad {args.densidad}'
+    else:
+        matriz = cargar_csv(args.dataset).matriz.astype(float)
+        origen = os.path.basename(args.dataset)
+    
+    normas = calcular_normas(matriz)
+    candidatos = candidatos_aleatorios(args.peticiones, matriz.shape[1])
+    
+    print(f"Dataset: {origen} → {matriz.shape[0]:,} usuarios × {matriz.shape[1]:,} canciones")
+    print(f"Carga: {args.peticiones} peticiones de {args.clientes} clientes concurrentes, "
+          f"k={args.k}\n")
+    print(f"{'modo':<22}{'pet/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'lote medio':>12}"
+          f"{'cola ms':>9}{'idénticos':>11}")
+    
+    def fila(nombre, segundos, latencias, lote='-', cola='-', identicos='-'):
+        print(f"{nombre:<22}{len(latencias) / segundos:>9.0f}{np.percentile(latencias, 50):>9.2f}"
+              f"{np.percentile(latencias, 99):>9.2f}{lote:>12}{cola:>9}{identicos:>11}")
+    
+    def directa(i):
+        return encontrar_k_vecinos(candidatos[i], matriz, args.k, normas)
+    
+    segundos, latencias, referencia = ejecutar_clientes(directa, candidatos, 1)
+    fila('sync (1 a la vez)', segundos, latencias)
+    
+    segundos, latencias, _ = ejecutar_clientes(directa, candidatos, args.clientes)
+    fila(f'hilos ({args.clientes})', segundos, latencias)
+    
+    for ventana in args.ventanas:
+        agrupador = AgrupadorConsultas(ventana / 1000, args.max_lote)
+        
+        def agrupada(i):
+            return agrupador.encontrar_k_vecinos('bench', candidatos[i], matriz, args.k, normas)
+        
+        segundos, latencias, resultados = ejecutar_clientes(agrupada, candidatos, args.clientes)
+        estadisticas = agrupador.estadisticas()
+        identicos = all(np.array_equal(r[0], e[0]) and np.array_equal(r[1], e[1])
+                        for r, e in zip(resultados, referencia))
+        
+        fila(f'microlotes ({ventana:g} ms)', segundos, latencias,
+             f"{estadisticas['tamano_promedio']:.1f}", f"{estadisticas['espera_cola_ms']['p50']:.2f}",
+             'sí' if identicos else 'NO')
+
+
+if __name__ == '__main__':
+    main()
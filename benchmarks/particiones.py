@@ -0,0 +1,125 @@
+"""
+BENCHMARK - BÚSQUEDA POR LOTES PARTICIONADA ENTRE PROCESOS
+
+Mide encontrar_k_vecinos_lote en un solo proceso frente a
+BusquedaParticionada con 1..N particiones (un proceso por partición):
+    - primera: primera búsqueda, que además publica la matriz en memoria
+               compartida (una vez por instantánea)
+    - lote: tiempo de la búsqueda ya publicada (mediana de varias
+            repeticiones) y aceleración frente a un solo proceso
+    - idénticos: si índices y similitudes coinciden exactamente con la
+                 búsqueda en un solo proceso
+
+Con PARTICIONES > 1 conviene OPENBLAS_NUM_THREADS=1 (u OMP_NUM_THREADS=1):
+si no, cada proceso abre sus propios hilos de BLAS y compiten por los
+mismos núcleos.
+
+Uso:
+    OPENBLAS_NUM_THREADS=1 python benchmarks/particiones.py
+    OPENBLAS_NUM_THREADS=1 python benchmarks/particiones.py --usuarios 500000 --candidatos 2000 --particiones 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from almacenamiento import candidatos_aleatorios, matriz_sintetica
+from busqueda_particionada import BusquedaParticionada
+from dataset_loader import cargar_csv
+from knn_engine import calcular_normas, construir_matriz_compacta, encontrar_k_vecinos_lote
+
+
+def potencias_de_dos(maximo):
+    """1, 2, 4, ... hasta maximo (incluido aunque no sea potencia de dos)."""
+    valores = [1]
+    while valores[-1] * 2 < maximo:
+        valores.append(valores[-1] * 2)
+    if maximo > 1:
+        valores.append(maximo)
+    return valores
+
+
+def mediana_tiempo(funcion, repeticiones):
+    """Mediana en segundos de `repeticiones` ejecuciones de funcion()."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'dataset_ratings.csv'))
+    parser.add_argument('--usuarios', type=int, default=0,
+                        help='Usar una matriz sintética con este número de usuarios')
+    parser.add_argument('--canciones', type=int, default=200)
+    parser.add_argument('--densidad', type=float, default=0.1)
+    parser.add_argument('--compacta', action='store_true',
+                        help='Matriz uint8 con normas float32 (BACKEND_MATRIZ=compacta)')
+    parser.add_argument('--candidatos', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--tamano-bloque', type=int, default=256)
+    parser.add_argument('--particiones', type=int, nargs='+',
+                        default=potencias_de_dos(os.cpu_count() or 1))
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+    
+    if args.usuarios > 0:
+        matriz = matriz_sintetica(args.usuarios, args.canciones, args.densidad)
+        origen = f'sintético {args.usuarios}×{args.canciones}, densidad {args.densidad}'
+    else:
+        matriz = cargar_csv(args.dataset).matriz.astype(float)
+        origen = os.path.basename(args.dataset)
+    
+    if args.compacta:
+        matriz, normas = construir_matriz_compacta(matriz)
+    else:
+        normas = calcular_normas(matriz)
+    
+    candidatos = candidatos_aleatorios(args.candidatos, matriz.shape[1])
+    
+    print(f"Dataset: {origen} → {matriz.shape[0]:,} usuarios × {matriz.shape[1]:,} canciones "
+          f"({matriz.dtype}, {matriz.nbytes / 1e6:.1f} MB)")
+    print(f"Lote: {args.candidatos} candidatos, k={args.k}, bloques de {args.tamano_bloque}; "
+          f"{os.cpu_count()} núcleos\n")
+    print(f"{'particiones':<13}{'primera ms':>13}{'lote ms':>10}{'aceleración':>13}{'idénticos':>11}")
+    
+    def serie():
+        return encontrar_k_vecinos_lote(candidatos, matriz, args.k, normas, args.tamano_bloque)
+    
+    referencia = serie()
+    base = mediana_tiempo(serie, args.repeticiones)
+    print(f"{'1 proceso':<13}{'-':>13}{base * 1000:>10.1f}{1.0:>12.2f}x{'-':>11}")
+    
+    for n_particiones in args.particiones:
+        busqueda = BusquedaParticionada(n_particiones)
+        
+        def particionada():
+            return busqueda.encontrar_k_vecinos_lote('bench', candidatos, matriz, args.k,
+                                                     normas, args.tamano_bloque)
+        
+        # La primera llamada publica la matriz y abre los segmentos en cada proceso
+        inicio = time.perf_counter()
+        indices, similitudes = particionada()
+        primera = time.perf_counter() - inicio
+        
+        tiempo = mediana_tiempo(particionada, args.repeticiones)
+        identicos = (np.array_equal(indices, referencia[0])
+                     and np.array_equal(similitudes, referencia[1]))
+        busqueda.cerrar()
+        
+        print(f"{n_particiones:<13}{primera * 1000:>13.1f}{tiempo * 1000:>10.1f}"
+              f"{base / tiempo:>12.2f}x{'sí' if identicos else 'NO':>11}")
+
+
+if __name__ == '__main__':
+    main()
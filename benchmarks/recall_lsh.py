@@ -0,0 +1,151 @@
+"""
+BENCHMARK - RECALL DE LA BÚSQUEDA APROXIMADA (LSH)
+
+Compara encontrar_k_vecinos_aproximado con la búsqueda exacta
+(encontrar_k_vecinos) para varias configuraciones del índice:
+    - recall@k: fracción de los K vecinos exactos que también retorna
+                la búsqueda aproximada
+    - candidatos: fracción de usuarios que se examinan por consulta
+    - p50 / p99 de latencia y aceleración respecto a la búsqueda exacta
+
+Las consultas son usuarios del dataset con la mitad de sus evaluaciones
+ocultas, de modo que tienen vecinos reales en la matriz.
+
+Uso:
+    python benchmarks/recall_lsh.py
+    python benchmarks/recall_lsh.py --usuarios 200000 --canciones 500 --grupos 100
+    python benchmarks/recall_lsh.py --configuraciones 32x10x4 64x10x2 16x8x2
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dataset_loader import cargar_csv
+from knn_engine import (
+    calcular_normas,
+    candidatos_lsh,
+    construir_indice_lsh,
+    encontrar_k_vecinos,
+    encontrar_k_vecinos_aproximado
+)
+
+
+def matriz_sintetica_agrupada(n_usuarios, n_canciones, n_grupos, densidad, semilla=0):
+    """
+    Matriz uint8 con grupos de gustos: cada usuario pertenece a un grupo y
+    evalúa con más probabilidad las canciones preferidas por su grupo.
+    """
+    rng = np.random.default_rng(semilla)
+    preferencias = rng.random((n_grupos, n_canciones)) ** 4
+    preferencias *= densidad / preferencias.mean(axis=1, keepdims=True)
+    grupos = rng.integers(n_grupos, size=n_usuarios)
+    
+    matriz = np.zeros((n_usuarios, n_canciones), dtype=np.uint8)
+    for inicio in range(0, n_usuarios, 10000):
+        bloque = grupos[inicio:inicio + 10000]
+        evaluadas = rng.random((len(bloque), n_canciones)) < preferencias[bloque]
+        ratings = rng.integers(1, 6, size=evaluadas.shape)
+        matriz[inicio:inicio + len(bloque)] = np.where(evaluadas, ratings, 0)
+    
+    return matriz
+
+
+def consultas_desde_usuarios(matriz, n, fraccion_oculta=0.5, semilla=1):
+    """Usuarios al azar con una fracción de sus evaluaciones en 0."""
+    rng = np.random.default_rng(semilla)
+    filas = rng.integers(matriz.shape[0], size=n)
+    consultas = matriz[filas].astype(float)
+    consultas[rng.random(consultas.shape) < fraccion_oculta] = 0
+    return consultas
+
+
+def medir(funcion, consultas):
+    """Ejecuta la búsqueda con cada consulta. Retorna resultados y latencias (ms)."""
+    resultados = []
+    latencias = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        resultados.append(funcion(consulta)[0])
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return resultados, np.array(latencias)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'dataset_ratings.csv'))
+    parser.add_argument('--usuarios', type=int, default=0,
+                        help='Usar una matriz sintética con este número de usuarios')
+    parser.add_argument('--canciones', type=int, default=200)
+    parser.add_argument('--grupos', type=int, default=100,
+                        help='Grupos de gustos de la matriz sintética')
+    parser.add_argument('--densidad', type=float, default=0.1)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--configuraciones', nargs='+',
+                        default=['16x8x2', '32x8x2', '32x10x4', '64x10x2', '32x12x4'],
+                        help='Configuraciones TABLASxBITSxSONDAS')
+    args = parser.parse_args()
+    
+    if args.usuarios > 0:
+        matriz = matriz_sintetica_agrupada(args.usuarios, args.canciones, args.grupos,
+                                           args.densidad)
+        origen = (f'sintético {args.usuarios}×{args.canciones}, {args.grupos} grupos, '
+                  f'densidad {args.densidad}')
+    else:
+        matriz = cargar_csv(args.dataset).matriz
+        origen = os.path.basename(args.dataset)
+    
+    normas = calcular_normas(matriz, dtype=np.float32)
+    consultas = consultas_desde_usuarios(matriz, args.consultas)
+    
+    print(f"Dataset: {origen} → {matriz.shape[0]:,} usuarios × {matriz.shape[1]:,} canciones")
+    print(f"Consultas: {args.consultas} (k={args.k})\n")
+    
+    # Referencia: búsqueda exacta
+    medir(lambda c: encontrar_k_vecinos(c, matriz, args.k, normas), consultas[:5])
+    exactos, latencias_exactas = medir(
+        lambda c: encontrar_k_vecinos(c, matriz, args.k, normas), consultas
+    )
+    p50_exacto = np.percentile(latencias_exactas, 50)
+    
+    print(f"{'configuración':<16}{'build s':>9}{'recall@k':>10}{'candidatos':>12}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'acelera':>9}")
+    print(f"{'exacta':<16}{'-':>9}{1:>10.3f}{1:>12.1%}{p50_exacto:>9.3f}"
+          f"{np.percentile(latencias_exactas, 99):>9.3f}{1:>8.1f}x")
+    
+    for configuracion in args.configuraciones:
+        n_tablas, n_bits, sondas = (int(valor) for valor in configuracion.split('x'))
+        
+        inicio = time.perf_counter()
+        indice = construir_indice_lsh(matriz, n_tablas=n_tablas, n_bits=n_bits)
+        construccion = time.perf_counter() - inicio
+        
+        def buscar(consulta):
+            return encontrar_k_vecinos_aproximado(consulta, matriz, indice, args.k,
+                                                  normas, sondas)
+        
+        medir(buscar, consultas[:5])
+        aproximados, latencias = medir(buscar, consultas)
+        
+        recall = np.mean([
+            len(np.intersect1d(exacto, aproximado)) / len(exacto)
+            for exacto, aproximado in zip(exactos, aproximados)
+        ])
+        fraccion = np.mean([len(candidatos_lsh(indice, c, sondas)) for c in consultas])
+        fraccion /= matriz.shape[0]
+        p50 = np.percentile(latencias, 50)
+        
+        print(f"{configuracion:<16}{construccion:>9.2f}{recall:>10.3f}{fraccion:>12.1%}"
+              f"{p50:>9.3f}{np.percentile(latencias, 99):>9.3f}{p50_exacto / p50:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,481 @@
+"""
+BENCHMARK - SUITE REPRODUCIBLE DEL MOTOR KNN Y DE LA API
+
+Mide, con semillas fijas, las funciones del motor y las peticiones a la
+API (cliente de pruebas de Flask, sin red) sobre dataset_ratings.csv y
+sobre matrices sintéticas de tamaño configurable:
+    
+    - motor: calcular_similitud_coseno, encontrar_k_vecinos,
+             clasificar_usuario, recomendar_canciones y
+             encontrar_k_vecinos_lote
+    - api:   POST /clasificar, /recomendar y /recomendar/batch, GET /stats
+    - registro: peticiones de un archivo JSONL reproducidas en orden
+
+Para cada operación reporta operaciones por segundo, latencia p50 / p99 y
+memoria pico (tracemalloc, en una pasada aparte para no alterar los
+tiempos). Los resultados se pueden guardar como línea base y comparar con
+una ejecución posterior: la suite termina con código 1 si alguna
+operación empeoró más que la tolerancia.
+
+FORMATO DEL REGISTRO (una petición por línea):
+    {"metodo": "POST", "ruta": "/recomendar", "cuerpo": {"evaluaciones": [...]}}
+Las líneas sin "ruta" (p. ej. otros registros JSONL) se cuentan como
+omitidas. --generar-registro escribe un registro sintético de ejemplo.
+
+Uso:
+    python benchmarks/suite.py
+    python benchmarks/suite.py --sinteticos 20000x200x0.1 100000x500x0.05 --guardar base.json
+    python benchmarks/suite.py --comparar base.json --tolerancia 0.15
+    python benchmarks/suite.py --generar-registro registro.jsonl
+    python benchmarks/suite.py --registro registro.jsonl --sin-motor
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+from almacenamiento import candidatos_aleatorios, matriz_sintetica
+from dataset_loader import cargar_csv
+from knn_engine import (
+    calcular_normas,
+    calcular_similitud_coseno,
+    clasificar_usuario,
+    encontrar_k_vecinos,
+    encontrar_k_vecinos_lote,
+    recomendar_canciones
+)
+
+
+# ============================================================================
+# MEDICIÓN
+# ============================================================================
+
+def medir(funcion, repeticiones, calentamiento=3):
+    """
+    Ejecuta funcion(i) para i = 0..repeticiones-1 y mide cada llamada.
+    
+    Returns:
+        dict: ops_s, p50_ms, p99_ms y repeticiones
+    """
+    for i in range(min(calentamiento, repeticiones)):
+        funcion(i)
+    
+    tiempos = np.zeros(repeticiones)
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(i)
+        tiempos[i] = time.perf_counter() - inicio
+    
+    return {
+        'ops_s': round(float(repeticiones / tiempos.sum()), 2),
+        'p50_ms': round(float(np.percentile(tiempos, 50) * 1000), 4),
+        'p99_ms': round(float(np.percentile(tiempos, 99) * 1000), 4),
+        'repeticiones': repeticiones
+    }
+
+
+def memoria_pico(funcion, repeticiones=3):
+    """Bytes asignados en el pico de `repeticiones` llamadas (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        for i in range(repeticiones):
+            funcion(i)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def medir_operacion(funcion, repeticiones):
+    """medir + memoria pico en MB."""
+    resultado = medir(funcion, repeticiones)
+    resultado['memoria_pico_mb'] = round(memoria_pico(funcion) / 1e6, 3)
+    return resultado
+
+
+# ============================================================================
+# ESCENARIOS
+# ============================================================================
+
+def escenarios(args):
+    """
+    Matrices sobre las que se mide: el CSV incluido y las sintéticas.
+    
+    Returns:
+        list: (nombre, matriz float64, ruta del CSV o None)
+    """
+    lista = []
+    if not args.sin_csv:
+        lista.append(('csv', cargar_csv(args.dataset).matriz.astype(float), args.dataset))
+    
+    for especificacion in args.sinteticos:
+        usuarios, canciones, densidad = especificacion.split('x')
+        matriz = matriz_sintetica(int(usuarios), int(canciones), float(densidad))
+        lista.append((f'sintetico_{especificacion}', matriz, None))
+    
+    return lista
+
+
+def escribir_csv(ruta, matriz):
+    """CSV en el formato de dataset_ratings.csv (sin columnas de perfil)."""
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        archivo.write(','.join(f'cancion_{j}' for j in range(matriz.shape[1])) + '\n')
+        np.savetxt(archivo, matriz, fmt='%d', delimiter=',')
+
+
+# ============================================================================
+# MOTOR
+# ============================================================================
+
+def benchmark_motor(matriz, consultas, k, n, repeticiones):
+    """Mide las funciones del motor con las consultas dadas."""
+    normas = calcular_normas(matriz)
+    nombres = [f'cancion_{j}' for j in range(matriz.shape[1])]
+    filas = np.random.default_rng(2).integers(0, matriz.shape[0], len(consultas))
+    lote = consultas[:256]
+    
+    def consulta(i):
+        return consultas[i % len(consultas)]
+    
+    operaciones = {
+        'calcular_similitud_coseno':
+            lambda i: calcular_similitud_coseno(consulta(i), matriz[filas[i % len(filas)]]),
+        'encontrar_k_vecinos':
+            lambda i: encontrar_k_vecinos(consulta(i), matriz, k, normas),
+        'clasificar_usuario':
+            lambda i: clasificar_usuario(consulta(i), matriz, k, normas),
+        'recomendar_canciones':
+            lambda i: recomendar_canciones(consulta(i), matriz, nombres, k, n, normas),
+        f'encontrar_k_vecinos_lote[{len(lote)}]':
+            lambda i: encontrar_k_vecinos_lote(lote, matriz, k, normas)
+    }
+    
+    resultados = {}
+    for nombre, funcion in operaciones.items():
+        veces = repeticiones if 'lote' not in nombre else max(3, repeticiones // 50)
+        resultados[nombre] = medir_operacion(funcion, veces)
+    return resultados
+
+
+# ============================================================================
+# API (cliente de pruebas de Flask)
+# ============================================================================
+
+@contextlib.contextmanager
+def aplicacion(ruta_csv, directorio):
+    """
+    Importa app.py sobre el CSV indicado, con la caché desactivada y sin
+    dataset binario ni diario de ingesta previos.
+    """
+    variables = {
+        'DATASET_PATH': os.path.abspath(ruta_csv),
+        'DATASET_BINARIO': os.path.join(directorio, 'no_existe.bin'),
+        'INGESTA_DIARIO': os.path.join(directorio, 'ingesta.jsonl'),
+        'RECARGA_MARCA': os.path.join(directorio, 'recarga'),
+        'FACTORES_PATH': os.path.join(directorio, 'factores'),
+        'CACHE_CAPACIDAD': '0'
+    }
+    anteriores = {nombre: os.environ.get(nombre) for nombre in variables}
+    os.environ.update(variables)
+    
+    try:
+        sys.modules.pop('app', None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            modulo = importlib.import_module('app')
+        yield modulo
+    finally:
+        sys.modules.pop('app', None)
+        for nombre, valor in anteriores.items():
+            if valor is None:
+                os.environ.pop(nombre, None)
+            else:
+                os.environ[nombre] = valor
+
+
+def _peticion(cliente, metodo, ruta, cuerpo=None):
+    respuesta = cliente.open(ruta, method=metodo, json=cuerpo)
+    respuesta.get_data()
+    return respuesta.status_code
+
+
+def benchmark_api(modulo, consultas, k, n, repeticiones):
+    """
+    Mide los endpoints principales con el cliente de pruebas.
+    
+    /recomendar se mide con el vector denso, con el formato disperso
+    (canciones y valores) y, si msgpack está instalado, con el formato
+    disperso codificado en msgpack.
+    """
+    cliente = modulo.app.test_client()
+    cuerpos = [c.astype(int).tolist() for c in consultas]
+    dispersos = [{'canciones': np.flatnonzero(c).tolist(),
+                  'valores': c[np.flatnonzero(c)].astype(int).tolist()} for c in consultas]
+    
+    def post(ruta, cuerpo, **opciones):
+        if opciones:
+            respuesta = cliente.post(ruta, **opciones)
+            respuesta.get_data()
+            codigo = respuesta.status_code
+        else:
+            codigo = _peticion(cliente, 'POST', ruta, cuerpo)
+        if codigo != 200:
+            raise RuntimeError(f'{ruta} respondió {codigo}')
+    
+    operaciones = {
+        'GET /stats': lambda i: _peticion(cliente, 'GET', '/stats'),
+        'POST /clasificar': lambda i: post('/clasificar', {
+            'evaluaciones': cuerpos[i % len(cuerpos)], 'k_vecinos': k}),
+        'POST /recomendar': lambda i: post('/recomendar', {
+            'evaluaciones': cuerpos[i % len(cuerpos)], 'k_vecinos': k, 'n_recomendaciones': n}),
+        'POST /recomendar[disperso]': lambda i: post('/recomendar', {
+            **dispersos[i % len(dispersos)], 'k_vecinos': k, 'n_recomendaciones': n}),
+        'POST /recomendar/batch[64]': lambda i: post('/recomendar/batch', {
+            'evaluaciones': cuerpos[:64], 'k_vecinos': k, 'n_recomendaciones': n})
+    }
+    
+    if msgpack is not None:
+        binarios = [msgpack.packb({**d, 'k_vecinos': k, 'n_recomendaciones': n}) for d in dispersos]
+        operaciones['POST /recomendar[msgpack]'] = lambda i: post(
+            '/recomendar', None, data=binarios[i % len(binarios)],
+            content_type='application/msgpack', headers={'Accept': 'application/msgpack'})
+    
+    resultados = {}
+    for nombre, funcion in operaciones.items():
+        veces = repeticiones if 'batch' not in nombre else max(3, repeticiones // 20)
+        resultados[nombre] = medir_operacion(funcion, veces)
+    return resultados
+
+
+def reproducir_registro(modulo, ruta_registro):
+    """
+    Envía en orden las peticiones del registro y mide cada ruta.
+    
+    Returns:
+        dict: 'METODO ruta' → medidas y códigos de respuesta, más
+              'omitidas' (líneas sin ruta)
+    """
+    cliente = modulo.app.test_client()
+    peticiones = []
+    omitidas = 0
+    
+    with open(ruta_registro, encoding='utf-8') as archivo:
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            registro = json.loads(linea)
+            if 'ruta' not in registro:
+                omitidas += 1
+                continue
+            peticiones.append((registro.get('metodo', 'GET').upper(), registro['ruta'],
+                               registro.get('cuerpo')))
+    
+    tiempos = {}
+    codigos = {}
+    inicio_total = time.perf_counter()
+    for metodo, ruta, cuerpo in peticiones:
+        inicio = time.perf_counter()
+        codigo = _peticion(cliente, metodo, ruta, cuerpo)
+        clave = f'{metodo} {ruta}'
+        tiempos.setdefault(clave, []).append(time.perf_counter() - inicio)
+        codigos.setdefault(clave, {}).setdefault(str(codigo), 0)
+        codigos[clave][str(codigo)] += 1
+    duracion = time.perf_counter() - inicio_total
+    
+    resultados = {}
+    for clave, valores in tiempos.items():
+        valores = np.array(valores)
+        resultados[clave] = {
+            'ops_s': round(float(len(valores) / valores.sum()), 2),
+            'p50_ms': round(float(np.percentile(valores, 50) * 1000), 4),
+            'p99_ms': round(float(np.percentile(valores, 99) * 1000), 4),
+            'repeticiones': len(valores),
+            'codigos': codigos[clave]
+        }
+    resultados['total'] = {
+        'ops_s': round(len(peticiones) / duracion, 2) if peticiones else 0.0,
+        'repeticiones': len(peticiones),
+        'omitidas': omitidas
+    }
+    return resultados
+
+
+def generar_registro(ruta, n_peticiones, n_canciones, semilla=3):
+    """Escribe un registro sintético con la mezcla típica del frontend."""
+    rng = np.random.default_rng(semilla)
+    consultas = candidatos_aleatorios(n_peticiones, n_canciones, semilla=semilla)
+    
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        for i, consulta in enumerate(consultas):
+            sorteo = rng.random()
+            if sorteo < 0.6:
+                registro = {'metodo': 'POST', 'ruta': '/recomendar',
+                            'cuerpo': {'evaluaciones': consulta.astype(int).tolist(),
+                                       'n_recomendaciones': 10}}
+            elif sorteo < 0.85:
+                registro = {'metodo': 'POST', 'ruta': '/clasificar',
+                            'cuerpo': {'evaluaciones': consulta.astype(int).tolist()}}
+            elif sorteo < 0.95:
+                registro = {'metodo': 'GET', 'ruta': '/stats'}
+            else:
+                registro = {'metodo': 'GET', 'ruta': '/canciones'}
+            archivo.write(json.dumps(registro) + '\n')
+
+
+# ============================================================================
+# LÍNEA BASE
+# ============================================================================
+
+def comparar(actual, base, tolerancia):
+    """
+    Imprime la variación de p50 respecto a la línea base.
+    
+    Returns:
+        int: Operaciones cuyo p50 empeoró más que la tolerancia
+    """
+    print(f"\nComparación con la línea base (tolerancia {tolerancia:.0%} en p50)\n")
+    print(f"{'escenario / operación':<58}{'base ms':>10}{'actual ms':>11}{'cambio':>9}")
+    
+    regresiones = 0
+    for escenario, grupos in actual['resultados'].items():
+        for grupo, operaciones in grupos.items():
+            for operacion, medida in operaciones.items():
+                anterior = base['resultados'].get(escenario, {}).get(grupo, {}).get(operacion)
+                if not anterior or 'p50_ms' not in medida or not anterior.get('p50_ms'):
+                    continue
+                cambio = medida['p50_ms'] / anterior['p50_ms'] - 1
+                marca = ''
+                if cambio > tolerancia:
+                    regresiones += 1
+                    marca = '  ✗ más lento'
+                elif cambio < -tolerancia:
+                    marca = '  ✓ más rápido'
+                print(f"{escenario + ' / ' + operacion:<58}{anterior['p50_ms']:>10.3f}"
+                      f"{medida['p50_ms']:>11.3f}{cambio:>+9.1%}{marca}")
+    
+    return regresiones
+
+
+def imprimir(escenario, grupo, resultados):
+    print(f"\n[{escenario}] {grupo}")
+    print(f"{'operación':<40}{'ops/s':>11}{'p50 ms':>10}{'p99 ms':>10}{'pico MB':>10}")
+    for operacion, medida in resultados.items():
+        if 'p50_ms' not in medida:
+            print(f"{operacion:<40}{medida['ops_s']:>11.1f}   ({medida['repeticiones']} "
+                  f"peticiones, {medida['omitidas']} líneas omitidas)")
+            continue
+        memoria = medida.get('memoria_pico_mb')
+        print(f"{operacion:<40}{medida['ops_s']:>11.1f}{medida['p50_ms']:>10.3f}"
+              f"{medida['p99_ms']:>10.3f}{'-' if memoria is None else f'{memoria:.3f}':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(RAIZ, 'dataset_ratings.csv'))
+    parser.add_argument('--sin-csv', action='store_true', help='No medir dataset_ratings.csv')
+    parser.add_argument('--sinteticos', nargs='*', default=['20000x200x0.1'],
+                        help='Matrices sintéticas USUARIOSxCANCIONESxDENSIDAD')
+    parser.add_argument('--consultas', type=int, default=256)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--n', type=int, default=10, help='Recomendaciones por petición')
+    parser.add_argument('--sin-motor', action='store_true')
+    parser.add_argument('--sin-api', action='store_true')
+    parser.add_argument('--registro', help='Registro JSONL de peticiones a reproducir')
+    parser.add_argument('--generar-registro', metavar='RUTA',
+                        help='Escribir un registro sintético de ejemplo y salir')
+    parser.add_argument('--peticiones-registro', type=int, default=2000)
+    parser.add_argument('--guardar', metavar='RUTA', help='Guardar los resultados (JSON)')
+    parser.add_argument('--comparar', metavar='RUTA', help='Línea base con la que comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.10)
+    args = parser.parse_args()
+    
+    if args.generar_registro:
+        n_canciones = cargar_csv(args.dataset).matriz.shape[1]
+        generar_registro(args.generar_registro, args.peticiones_registro, n_canciones)
+        print(f"✓ {args.generar_registro}: {args.peticiones_registro} peticiones")
+        return 0
+    
+    salida = {
+        'entorno': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'nucleos': os.cpu_count(),
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'parametros': {
+            'consultas': args.consultas, 'repeticiones': args.repeticiones,
+            'k': args.k, 'n': args.n
+        },
+        'resultados': {}
+    }
+    print(f"Python {salida['entorno']['python']}, NumPy {salida['entorno']['numpy']}, "
+          f"{salida['entorno']['nucleos']} núcleos")
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        for nombre, matriz, ruta_csv in escenarios(args):
+            print(f"\n=== {nombre}: {matriz.shape[0]:,} usuarios × {matriz.shape[1]:,} canciones, "
+                  f"densidad {np.count_nonzero(matriz) / matriz.size:.1%}")
+            consultas = candidatos_aleatorios(args.consultas, matriz.shape[1])
+            resultados = salida['resultados'].setdefault(nombre, {})
+            
+            if not args.sin_motor:
+                resultados['motor'] = benchmark_motor(matriz, consultas, args.k, args.n,
+                                                      args.repeticiones)
+                imprimir(nombre, 'motor', resultados['motor'])
+            
+            if args.sin_api and not args.registro:
+                continue
+            
+            if ruta_csv is None:
+                ruta_csv = os.path.join(directorio, f'{nombre}.csv')
+                escribir_csv(ruta_csv, matriz)
+            
+            with aplicacion(ruta_csv, directorio) as modulo:
+                if not args.sin_api:
+                    resultados['api'] = benchmark_api(modulo, consultas, args.k, args.n,
+                                                      args.repeticiones)
+                    imprimir(nombre, 'api', resultados['api'])
+                
+                if args.registro and nombre == 'csv':
+                    resultados['registro'] = reproducir_registro(modulo, args.registro)
+                    imprimir(nombre, f'registro {os.path.basename(args.registro)}',
+                             resultados['registro'])
+    
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump(salida, archivo, indent=2, ensure_ascii=False)
+        print(f"\n✓ Resultados guardados en {args.guardar}")
+    
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+        regresiones = comparar(salida, base, args.tolerancia)
+        if regresiones:
+            print(f"\n✗ {regresiones} operaciones más lentas que la línea base")
+            return 1
+        print("\n✓ Sin regresiones respecto a la línea base")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
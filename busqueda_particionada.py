@@ -0,0 +1,237 @@
+"""
+BÚSQUEDA DE VECINOS PARTICIONADA ENTRE VARIOS PROCESOS
+
+Cada petición se atiende en un worker síncrono de gunicorn, así que un lote
+grande de /recomendar/batch recorre toda la matriz con un solo núcleo. En
+el modo particionado los usuarios se dividen en particiones contiguas y un
+pool de procesos busca en todas a la vez:
+    
+    usuarios 0 .. a    ──▶ proceso 1 ──▶ top-k parcial ─┐
+    usuarios a .. b    ──▶ proceso 2 ──▶ top-k parcial ─┼─▶ combinar_top_k ──▶ top-k
+    usuarios b .. n    ──▶ proceso 3 ──▶ top-k parcial ─┘
+
+- La matriz no viaja por pickle en cada tarea: los procesos la leen de
+  memoria compartida (multiprocessing.shared_memory). Si es el np.memmap
+  del dataset binario sin modificar, abren el mismo archivo y comparten
+  las páginas con el resto de workers.
+- Cada partición ejecuta encontrar_k_vecinos_lote (el mismo kernel) y
+  retorna sus k mejores usuarios con índices globales.
+- Un vecino del top-k global tiene menos de k usuarios por delante en todo
+  el dataset, y por tanto también en su partición: siempre está en el
+  top-k parcial. Por eso la combinación es exacta y con el mismo desempate
+  (a favor del índice mayor) que la búsqueda en un solo proceso.
+
+El pool se crea con fork, antes de cargar el dataset, para que los procesos
+nazcan pequeños y no vuelvan a importar la aplicación. Cuando cambia la
+instantánea (ingesta o recarga) la matriz se vuelve a publicar en la
+memoria compartida antes de la siguiente búsqueda.
+"""
+
+import atexit
+import multiprocessing
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from dataset_store import leer_cabecera
+from knn_engine import calcular_normas, encontrar_k_vecinos_lote
+
+
+# ============================================================================
+# LADO DE LOS PROCESOS DEL POOL
+# ============================================================================
+#
+# Una matriz publicada se describe con una tupla (picklable y hashable):
+#   ('memoria', nombre, dtype, forma)
+#   ('archivo', ruta, offset, dtype, forma, checksum_csv)
+# Cada proceso abre la descripción la primera vez que la recibe y la
+# conserva hasta que llega otra.
+
+# Descripción abierta en este proceso → (segmentos, matriz, normas)
+_abiertas = {}
+
+
+def _abrir_arreglo(descripcion, segmentos):
+    """Abre en este proceso un arreglo publicado por BusquedaParticionada."""
+    if descripcion[0] == 'memoria':
+        _, nombre, dtype, forma = descripcion
+        segmento = shared_memory.SharedMemory(name=nombre)
+        segmentos.append(segmento)
+        return np.ndarray(forma, dtype=dtype, buffer=segmento.buf)
+    
+    _, ruta, offset, dtype, forma, checksum_csv = descripcion
+    # El archivo pudo recompilarse después de publicarlo
+    if leer_cabecera(ruta).get('checksum_csv') != checksum_csv:
+        raise ValueError(f'{ruta} cambió desde que se publicó la matriz')
+    return np.memmap(ruta, dtype=dtype, mode='r', offset=offset, shape=forma)
+
+
+def _abrir(publicacion):
+    """Matriz y normas de la publicación, abriéndolas si hace falta."""
+    if publicacion not in _abiertas:
+        for segmentos, _, _ in _abiertas.values():
+            for segmento in segmentos:
+                segmento.close()
+        _abiertas.clear()
+        
+        segmentos = []
+        descripcion_matriz, descripcion_normas = publicacion
+        matriz = _abrir_arreglo(descripcion_matriz, segmentos)
+        normas = _abrir_arreglo(descripcion_normas, segmentos)
+        _abiertas[publicacion] = (segmentos, matriz, normas)
+    
+    _, matriz, normas = _abiertas[publicacion]
+    return matriz, normas
+
+
+def _buscar_en_particion(tarea):
+    """Top-k de los candidatos entre los usuarios [inicio, fin)."""
+    publicacion, inicio, fin, candidatos, k, tamano_bloque = tarea
+    matriz, normas = _abrir(publicacion)
+    
+    indices, similitudes = encontrar_k_vecinos_lote(
+        candidatos, matriz[inicio:fin], k, normas[inicio:fin], tamano_bloque
+    )
+    return indices + inicio, similitudes
+
+
+# ============================================================================
+# COMBINACIÓN Y POOL
+# ============================================================================
+
+def limites_particiones(n_usuarios, n_particiones):
+    """Inicio de cada partición y el final (n_particiones + 1 valores)."""
+    n_particiones = max(1, min(n_particiones, n_usuarios))
+    return np.linspace(0, n_usuarios, n_particiones + 1).astype(np.intp)
+
+
+def combinar_top_k(indices, similitudes, k):
+    """
+    Combina los top-k parciales de cada partición en el top-k global.
+    
+    Args:
+        indices (np.array): (n_candidatos, total) índices globales de los
+                            top-k parciales, concatenados por columnas
+        similitudes (np.array): (n_candidatos, total) similitudes
+        k (int): Vecinos por candidato
+    
+    Returns:
+        tuple: (indices, similitudes) de forma (n_candidatos, k), en el
+               orden de _seleccionar_top_k: similitud descendente y, en
+               caso de empate, índice descendente
+    """
+    orden = np.lexsort((-indices, -similitudes), axis=1)[:, :k]
+    return (np.take_along_axis(indices, orden, axis=1),
+            np.take_along_axis(similitudes, orden, axis=1))
+
+
+class BusquedaParticionada:
+    """
+    Pool de procesos que reparte la búsqueda de vecinos por usuarios.
+    
+    Las búsquedas se atienden de una en una (cada una ya usa todos los
+    procesos); publicar una matriz nueva también ocurre bajo el candado,
+    así que ningún proceso lee un segmento liberado.
+    """
+    
+    def __init__(self, n_particiones):
+        self.n_particiones = n_particiones
+        self._candado = threading.Lock()
+        self._clave = None
+        self._publicacion = None
+        self._segmentos = []
+        
+        # Los procesos heredan el resource tracker del padre: así no liberan
+        # por su cuenta los segmentos al terminar
+        resource_tracker.ensure_running()
+        self._pool = multiprocessing.get_context('fork').Pool(n_particiones)
+        atexit.register(self.cerrar)
+    
+    def _liberar_segmentos(self):
+        for segmento in self._segmentos:
+            segmento.close()
+            segmento.unlink()
+        self._segmentos = []
+    
+    def _copiar_a_memoria(self, arreglo):
+        arreglo = np.ascontiguousarray(arreglo)
+        segmento = shared_memory.SharedMemory(create=True, size=max(1, arreglo.nbytes))
+        np.ndarray(arreglo.shape, dtype=arreglo.dtype, buffer=segmento.buf)[...] = arreglo
+        self._segmentos.append(segmento)
+        return ('memoria', segmento.name, arreglo.dtype.str, arreglo.shape)
+    
+    def _publicar(self, clave, matriz, normas, archivo):
+        self._liberar_segmentos()
+        
+        if archivo is not None:
+            ruta, offset, checksum_csv = archivo
+            descripcion_matriz = ('archivo', ruta, int(offset), matriz.dtype.str,
+                                  matriz.shape, checksum_csv)
+        else:
+            descripcion_matriz = self._copiar_a_memoria(matriz)
+        
+        self._publicacion = (descripcion_matriz, self._copiar_a_memoria(normas))
+        self._clave = clave
+    
+    def encontrar_k_vecinos_lote(self, clave, candidatos, matriz_usuarios, k=10,
+                                 normas=None, tamano_bloque=256, archivo=None):
+        """
+        Igual que knn_engine.encontrar_k_vecinos_lote, repartido entre los
+        procesos del pool.
+        
+        Args:
+            clave: Identifica el contenido de la matriz (p. ej. versión y
+                   revisión de la instantánea); si cambia, se vuelve a
+                   publicar antes de buscar
+            candidatos (np.array): Matriz (n_candidatos, n_canciones)
+            matriz_usuarios (np.array): Matriz densa o compacta
+            k (int): Vecinos por candidato
+            normas (np.array): Normas de los usuarios
+            tamano_bloque (int): Candidatos por producto de matrices
+            archivo (tuple): (ruta, offset, checksum_csv) si matriz_usuarios
+                             es el np.memmap del dataset binario; los procesos
+                             abren el archivo en lugar de copiar la matriz
+        
+        Returns:
+            tuple: (indices_vecinos, similitudes_vecinos), cada uno
+                   (n_candidatos, k)
+        
+        Complejidad:
+            O(c × n × m / particiones) por proceso, más O(n × m) para
+            publicar la matriz cuando cambia la clave
+        """
+        if normas is None:
+            normas = calcular_normas(matriz_usuarios)
+        
+        k = min(k, matriz_usuarios.shape[0])
+        limites = limites_particiones(matriz_usuarios.shape[0], self.n_particiones)
+        
+        with self._candado:
+            if clave != self._clave:
+                self._publicar(clave, matriz_usuarios, normas, archivo)
+            
+            tareas = [(self._publicacion, int(inicio), int(fin), candidatos, k, tamano_bloque)
+                      for inicio, fin in zip(limites[:-1], limites[1:])]
+            try:
+                parciales = self._pool.map(_buscar_en_particion, tareas)
+            except (ValueError, FileNotFoundError):
+                if archivo is None:
+                    raise
+                # Binario recompilado o borrado: publicar una copia
+                self._publicar(clave, matriz_usuarios, normas, None)
+                tareas = [(self._publicacion,) + tarea[1:] for tarea in tareas]
+                parciales = self._pool.map(_buscar_en_particion, tareas)
+        
+        return combinar_top_k(np.hstack([indices for indices, _ in parciales]),
+                              np.hstack([similitudes for _, similitudes in parciales]), k)
+    
+    def cerrar(self):
+        """Termina los procesos y libera la memoria compartida."""
+        with self._candado:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+            self._liberar_segmentos()
+            self._clave = self._publicacion = None
@@ -0,0 +1,271 @@
+"""
+CARGA DEL DATASET DE RATINGS
+
+Lee dataset_ratings.csv en una sola pasada, sin pandas ni DataFrames
+intermedios, y produce directamente la matriz final.
+
+FORMATO DEL CSV:
+La cabecera solo contiene los nombres de las canciones, pero cada fila
+empieza con campos de perfil del usuario que no tienen nombre:
+    
+    La Piragua,La Gota Fría,...                      ← 200 canciones
+    1,24,F,Llanos,Vallenato,Amante del Vallenato,2,5,0,...
+    └──────────── metadatos (6) ─────────────┘ └ ratings ┘
+
+Los campos sobrantes al inicio de cada fila se separan como metadatos del
+usuario (id, edad, género, región, género musical, perfil) en arreglos
+compactos propios. Si la cabecera sí nombra columnas de metadatos
+(UserID, Edad, Género...) al inicio, también se separan.
+
+LIMPIEZA:
+- Nombres de canciones repetidos → sufijo .1, .2, ...
+- Valores no numéricos o vacíos → 0
+- Ratings recortados al rango [0, 5]
+- Se eliminan las canciones que nadie evaluó
+"""
+
+import csv
+from collections import namedtuple
+
+import numpy as np
+
+
+# Nombres de los campos de perfil que preceden a los ratings en cada fila
+CAMPOS_METADATOS = ['id', 'edad', 'genero', 'region', 'genero_musical', 'perfil']
+
+# Nombres de columnas de la cabecera que no son canciones
+COLUMNAS_NO_MUSICALES = {'userid', 'user_id', 'id', 'edad', 'genero', 'género',
+                         'region', 'región', 'perfil'}
+
+# Campos numéricos de los metadatos; el resto se codifica como categorías
+CAMPOS_NUMERICOS = {'id': np.int64, 'edad': np.uint8}
+
+# Filas que se convierten a la vez: acota la memoria temporal del parseo
+FILAS_POR_BLOQUE = 4096
+
+# Dataset listo para servir
+#   - matriz: np.array uint8 (usuarios, canciones) con ratings 0-5
+#   - nombres_canciones: list
+#   - metadatos: dict campo → np.array (n_usuarios,). Los campos
+#                categóricos se guardan como códigos enteros.
+#   - categorias: dict campo → list con el valor de cada código
+#   - canciones_eliminadas: list de canciones sin ninguna evaluación
+Dataset = namedtuple('Dataset', ['matriz', 'nombres_canciones', 'metadatos',
+                                 'categorias', 'canciones_eliminadas'])
+
+
+def _parsear_ratings(lineas, n_canciones, numero_primera_linea):
+    """
+    Convierte un bloque de filas de ratings (texto) a una matriz uint8.
+    
+    Camino rápido: todo el bloque se parsea con una sola llamada a
+    np.loadtxt, que exige el mismo número de campos en cada fila. Si hay
+    valores no numéricos o vacíos, el bloque se parsea campo por campo y
+    esos valores quedan en 0.
+    
+    Raises:
+        ValueError: Si alguna fila no tiene n_canciones ratings
+    """
+    try:
+        valores = np.loadtxt(lineas, dtype=np.float64, delimiter=',', comments=None,
+                             ndmin=2).ravel()
+    except ValueError:
+        valores = np.zeros(0)
+    
+    if valores.size != len(lineas) * n_canciones:
+        valores = np.zeros(len(lineas) * n_canciones)
+        for i, linea in enumerate(lineas):
+            campos = linea.split(',')
+            if len(campos) != n_canciones:
+                raise ValueError(
+                    f'Línea {numero_primera_linea + i}: se esperaban {n_canciones} '
+                    f'ratings, se encontraron {len(campos)}'
+                )
+            for j, campo in enumerate(campos):
+                try:
+                    valores[i * n_canciones + j] = float(campo)
+                except ValueError:
+                    pass
+    
+    valores = np.nan_to_num(valores, nan=0.0, posinf=5.0, neginf=0.0)
+    
+    return np.clip(valores, 0, 5).astype(np.uint8).reshape(len(lineas), n_canciones)
+
+
+def _nombres_unicos(nombres):
+    """
+    Hace únicos los nombres de canciones repetidos en la cabecera.
+    
+    Los duplicados reciben el sufijo .1, .2, ... (mismo criterio que
+    pandas.read_csv), así cada canción puede identificarse por su nombre.
+    """
+    vistos = set(nombres)
+    repeticiones = {}
+    unicos = []
+    
+    for nombre in nombres:
+        if nombre in repeticiones:
+            while True:
+                repeticiones[nombre] += 1
+                candidato = f'{nombre}.{repeticiones[nombre]}'
+                if candidato not in vistos:
+                    break
+            vistos.add(candidato)
+            unicos.append(candidato)
+        else:
+            repeticiones[nombre] = 0
+            unicos.append(nombre)
+    
+    return unicos
+
+
+def _codificar_metadatos(columnas):
+    """Convierte las columnas de texto de metadatos en arreglos compactos."""
+    metadatos = {}
+    categorias = {}
+    
+    for campo, valores in columnas.items():
+        if campo in CAMPOS_NUMERICOS:
+            tipo = CAMPOS_NUMERICOS[campo]
+            limite = np.iinfo(tipo).max
+            numeros = np.zeros(len(valores), dtype=tipo)
+            for i, valor in enumerate(valores):
+                try:
+                    numeros[i] = min(max(int(float(valor)), 0), limite)
+                except ValueError:
+                    pass
+            metadatos[campo] = numeros
+        else:
+            codigos_por_valor = {}
+            codigos = [codigos_por_valor.setdefault(valor, len(codigos_por_valor))
+                       for valor in valores]
+            tipo = np.uint8 if len(codigos_por_valor) <= 256 else np.uint32
+            metadatos[campo] = np.array(codigos, dtype=tipo)
+            categorias[campo] = list(codigos_por_valor)
+    
+    return metadatos, categorias
+
+
+def cargar_csv(ruta_csv, eliminar_canciones_vacias=True):
+    """
+    Carga el CSV de ratings en una sola pasada.
+    
+    PROCESO:
+    1. Leer la cabecera y deducir cuántos campos de metadatos hay por fila
+    2. Para cada fila: separar los metadatos y acumular el texto de ratings
+    3. Cada FILAS_POR_BLOQUE filas, convertir el bloque a uint8
+    4. Validar dimensiones y eliminar canciones sin evaluaciones
+    
+    Args:
+        ruta_csv (str): Ruta del CSV
+        eliminar_canciones_vacias (bool): Quitar columnas sin evaluaciones
+    
+    Returns:
+        Dataset: (matriz, nombres_canciones, metadatos, categorias,
+                  canciones_eliminadas)
+    
+    Raises:
+        ValueError: Si el archivo está vacío o las filas no tienen todas
+                    la misma cantidad de campos
+    """
+    with open(ruta_csv, 'r', encoding='utf-8', newline='') as archivo:
+        linea_cabecera = archivo.readline()
+        if not linea_cabecera.strip():
+            raise ValueError(f'{ruta_csv} está vacío')
+        
+        cabecera = next(csv.reader([linea_cabecera]))
+        
+        # Columnas de metadatos nombradas al inicio de la cabecera
+        n_nombradas = 0
+        while (n_nombradas < len(cabecera)
+               and cabecera[n_nombradas].strip().lower() in COLUMNAS_NO_MUSICALES):
+            n_nombradas += 1
+        nombres_canciones = _nombres_unicos(cabecera[n_nombradas:])
+        n_canciones = len(nombres_canciones)
+        
+        n_metadatos = None
+        columnas_metadatos = None
+        bloques = []
+        lineas_bloque = []
+        primera_linea_bloque = 2
+        
+        for numero_linea, linea in enumerate(archivo, start=2):
+            linea = linea.rstrip('\r\n')
+            if not linea:
+                continue
+            
+            # Un metadato entre comillas puede contener comas: esas filas
+            # se separan con el módulo csv
+            con_comillas = '"' in linea
+            campos_csv = next(csv.reader([linea])) if con_comillas else None
+            
+            if n_metadatos is None:
+                # La primera fila fija cuántos campos preceden a los ratings
+                n_campos = len(campos_csv) if con_comillas else linea.count(',') + 1
+                n_metadatos = n_campos - n_canciones
+                if n_metadatos < n_nombradas:
+                    raise ValueError(
+                        f'Línea {numero_linea}: {n_metadatos + n_canciones} campos para '
+                        f'{len(cabecera)} columnas en la cabecera'
+                    )
+                nombres_metadatos = (
+                    CAMPOS_METADATOS[:n_metadatos - n_nombradas]
+                    + [f'extra_{i}' for i in range(len(CAMPOS_METADATOS), n_metadatos - n_nombradas)]
+                )
+                for nombre in cabecera[:n_nombradas]:
+                    nombre = nombre.strip().lower()
+                    while nombre in nombres_metadatos:
+                        nombre += '_'
+                    nombres_metadatos.append(nombre)
+                columnas_metadatos = {nombre: [] for nombre in nombres_metadatos}
+            
+            if con_comillas:
+                campos = campos_csv[:n_metadatos] + [','.join(campos_csv[n_metadatos:])]
+            else:
+                campos = linea.split(',', n_metadatos)
+            if len(campos) != n_metadatos + 1:
+                raise ValueError(f'Línea {numero_linea}: faltan campos')
+            
+            for nombre, valor in zip(columnas_metadatos, campos):
+                columnas_metadatos[nombre].append(valor)
+            
+            # Cada fila debe tener un rating por canción: filas con campos de
+            # más y de menos no pueden compensarse dentro del bloque
+            ratings = campos[n_metadatos] if n_metadatos or con_comillas else linea
+            if ratings.count(',') + 1 != n_canciones:
+                raise ValueError(
+                    f'Línea {numero_linea}: se esperaban {n_canciones} ratings, '
+                    f'se encontraron {ratings.count(",") + 1}'
+                )
+            
+            if not lineas_bloque:
+                primera_linea_bloque = numero_linea
+            lineas_bloque.append(ratings)
+            
+            if len(lineas_bloque) == FILAS_POR_BLOQUE:
+                bloques.append(_parsear_ratings(lineas_bloque, n_canciones, primera_linea_bloque))
+                lineas_bloque = []
+        
+        if lineas_bloque:
+            bloques.append(_parsear_ratings(lineas_bloque, n_canciones, primera_linea_bloque))
+    
+    if not bloques:
+        raise ValueError(f'{ruta_csv} no contiene usuarios')
+    
+    matriz = bloques[0] if len(bloques) == 1 else np.concatenate(bloques)
+    del bloques
+    
+    metadatos, categorias = _codificar_metadatos(columnas_metadatos or {})
+    
+    # Eliminar canciones que nadie evaluó
+    canciones_eliminadas = []
+    if eliminar_canciones_vacias:
+        evaluadas = np.any(matriz > 0, axis=0)
+        if not np.all(evaluadas):
+            canciones_eliminadas = [nombre for nombre, usada
+                                    in zip(nombres_canciones, evaluadas) if not usada]
+            matriz = np.ascontiguousarray(matriz[:, evaluadas])
+            nombres_canciones = [nombre for nombre, usada
+                                 in zip(nombres_canciones, evaluadas) if usada]
+    
+    return Dataset(matriz, nombres_canciones, metadatos, categorias, canciones_eliminadas)
@@ -0,0 +1,287 @@
+"""
+FORMATO BINARIO PRECOMPILADO DEL DATASET
+
+Compila dataset_ratings.csv a un archivo binario que contiene todo lo que
+el backend necesita para servir: matriz de ratings (uint8), normas de cada
+usuario (float64), nombres de canciones, metadatos de los usuarios y
+datos del CSV de origen.
+
+El backend abre el archivo con np.memmap en modo solo lectura, así que
+todos los workers de gunicorn comparten una única copia en la caché de
+páginas del sistema operativo y el arranque no necesita parsear el CSV.
+
+ESTRUCTURA DEL ARCHIVO:
+┌──────────────────────────────────────────────────────────┐
+│ MAGIA (8 bytes)           b'KNNDSET1'                    │
+│ Longitud cabecera (8 B)   uint64 little-endian           │
+│ Cabecera JSON (utf-8)     canciones, categorías,         │
+│                           checksum, tamaño y mtime del   │
+│                           CSV de origen y                │
+│                           offset/tipo/forma por sección  │
+│ Sección matriz            uint8 (usuarios × canciones)   │
+│ Sección normas            float64 (usuarios,)            │
+│ Secciones metadatos/*     un arreglo por campo de perfil │
+└──────────────────────────────────────────────────────────┘
+Las secciones de datos empiezan en múltiplos de 64 bytes.
+
+Uso (paso de build):
+    python dataset_store.py dataset_ratings.csv dataset_ratings.bin
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from dataset_loader import cargar_csv
+from knn_engine import calcular_normas
+
+
+MAGIA = b'KNNDSET1'
+VERSION_FORMATO = 2
+ALINEACION = 64
+
+# Dataset abierto desde el archivo binario
+#   - matriz: np.memmap uint8 (usuarios, canciones), solo lectura
+#   - normas: np.memmap float64 (usuarios,), solo lectura
+#   - nombres_canciones: list
+#   - metadatos_usuarios: dict campo → np.memmap (usuarios,)
+#   - metadatos: dict con la cabecera completa
+DatasetBinario = namedtuple('DatasetBinario', ['matriz', 'normas', 'nombres_canciones',
+                                               'metadatos_usuarios', 'metadatos'])
+
+
+def calcular_checksum(ruta, tamano_bloque=1 << 20):
+    """SHA-256 del contenido de un archivo, leído por bloques."""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def _alinear(posicion):
+    return (posicion + ALINEACION - 1) // ALINEACION * ALINEACION
+
+
+def escribir_secciones(ruta, magia, cabecera, secciones):
+    """
+    Escribe un archivo MAGIA + cabecera JSON + secciones alineadas.
+    
+    Agrega a la cabecera el offset, tipo y forma de cada sección. El
+    archivo se escribe con otro nombre y luego se renombra, de modo que un
+    worker que ya lo tenía mapeado sigue leyendo la versión anterior.
+    
+    Args:
+        ruta (str): Archivo de destino
+        magia (bytes): Identificador del formato (8 bytes)
+        cabecera (dict): Datos serializables a JSON
+        secciones (dict): nombre → np.array
+    """
+    cabecera['secciones'] = {
+        nombre: {
+            'offset': 0,
+            'dtype': np.dtype(datos.dtype).newbyteorder('<').str,
+            'shape': list(datos.shape)
+        }
+        for nombre, datos in secciones.items()
+    }
+    
+    # Los offsets dependen del tamaño de la cabecera, que a su vez contiene
+    # los offsets: se reserva espacio de sobra para los números.
+    def serializar(cabecera):
+        return json.dumps(cabecera, ensure_ascii=False).encode('utf-8')
+    
+    for seccion in cabecera['secciones'].values():
+        seccion['offset'] = 10 ** 15
+    posicion = _alinear(len(magia) + 8 + len(serializar(cabecera)))
+    for nombre, datos in secciones.items():
+        cabecera['secciones'][nombre]['offset'] = posicion
+        posicion = _alinear(posicion + datos.nbytes)
+    bytes_cabecera = serializar(cabecera)
+    
+    ruta_temporal = f'{ruta}.tmp{os.getpid()}'
+    with open(ruta_temporal, 'wb') as archivo:
+        archivo.write(magia)
+        archivo.write(struct.pack('<Q', len(bytes_cabecera)))
+        archivo.write(bytes_cabecera)
+        
+        for nombre, datos in secciones.items():
+            seccion = cabecera['secciones'][nombre]
+            archivo.seek(seccion['offset'])
+            archivo.write(np.ascontiguousarray(datos, dtype=seccion['dtype']).tobytes())
+    
+    os.replace(ruta_temporal, ruta)
+
+
+def leer_cabecera_secciones(ruta, magia):
+    """
+    Lee la cabecera JSON de un archivo escrito con escribir_secciones.
+    
+    Raises:
+        ValueError: Si el archivo no empieza con la magia indicada
+    """
+    with open(ruta, 'rb') as archivo:
+        if archivo.read(len(magia)) != magia:
+            raise ValueError(f'{ruta} no tiene el formato esperado')
+        
+        longitud, = struct.unpack('<Q', archivo.read(8))
+        return json.loads(archivo.read(longitud).decode('utf-8'))
+
+
+def mapear_secciones(ruta, cabecera):
+    """Abre cada sección del archivo con np.memmap (solo lectura)."""
+    return {
+        nombre: np.memmap(ruta, dtype=seccion['dtype'], mode='r',
+                          offset=seccion['offset'], shape=tuple(seccion['shape']))
+        for nombre, seccion in cabecera['secciones'].items()
+    }
+
+
+def compilar_dataset(ruta_csv, ruta_binario):
+    """
+    Compila el CSV de ratings al formato binario.
+    
+    Args:
+        ruta_csv (str): CSV de origen
+        ruta_binario (str): Archivo binario de destino
+    
+    Returns:
+        dict: Cabecera escrita
+    """
+    # Tamaño y fecha antes de leer: si el CSV cambia durante la compilación,
+    # no coinciden y binario_vigente compara el checksum
+    estado_csv = os.stat(ruta_csv)
+    dataset = cargar_csv(ruta_csv)
+    matriz = dataset.matriz
+    
+    secciones = {
+        'matriz': matriz,
+        'normas': calcular_normas(matriz, dtype=np.float64),
+    }
+    for campo, valores in dataset.metadatos.items():
+        secciones[f'metadatos/{campo}'] = valores
+    
+    cabecera = {
+        'version_formato': VERSION_FORMATO,
+        'usuarios': int(matriz.shape[0]),
+        'canciones': int(matriz.shape[1]),
+        'nombres_canciones': dataset.nombres_canciones,
+        'canciones_eliminadas': dataset.canciones_eliminadas,
+        'categorias': dataset.categorias,
+        'evaluaciones': int(np.count_nonzero(matriz)),
+        'checksum_csv': calcular_checksum(ruta_csv),
+        'tamano_csv': estado_csv.st_size,
+        'mtime_csv': estado_csv.st_mtime_ns,
+        'origen': os.path.basename(ruta_csv),
+        'creado': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    escribir_secciones(ruta_binario, MAGIA, cabecera, secciones)
+    
+    return cabecera
+
+
+def leer_cabecera(ruta_binario):
+    """
+    Lee la cabecera de un archivo binario.
+    
+    Raises:
+        ValueError: Si el archivo no tiene el formato esperado
+    """
+    try:
+        cabecera = leer_cabecera_secciones(ruta_binario, MAGIA)
+    except ValueError:
+        raise ValueError(f'{ruta_binario} no es un dataset binario')
+    
+    if cabecera.get('version_formato') != VERSION_FORMATO:
+        raise ValueError(f'Versión de formato no soportada: {cabecera.get("version_formato")}')
+    
+    return cabecera
+
+
+def binario_vigente(ruta_binario, ruta_csv, verificar_contenido=False):
+    """
+    Indica si el binario fue compilado a partir del CSV actual.
+    
+    Si el tamaño y la fecha de modificación del CSV son los guardados en la
+    cabecera, el binario se da por vigente sin leer el CSV: el arranque de
+    cada worker no depende del tamaño del CSV. Si difieren (o con
+    verificar_contenido), se compara el checksum del CSV con el de la
+    cabecera. Si el binario no existe o es ilegible se considera
+    desactualizado.
+    """
+    if not os.path.exists(ruta_binario):
+        return False
+    
+    try:
+        cabecera = leer_cabecera(ruta_binario)
+    except (ValueError, OSError, struct.error):
+        return False
+    
+    if not os.path.exists(ruta_csv):
+        # Sin CSV de referencia el binario es la única fuente
+        return True
+    
+    if not verificar_contenido:
+        estado_csv = os.stat(ruta_csv)
+        if (cabecera.get('tamano_csv'), cabecera.get('mtime_csv')) == (estado_csv.st_size,
+                                                                       estado_csv.st_mtime_ns):
+            return True
+    
+    return cabecera['checksum_csv'] == calcular_checksum(ruta_csv)
+
+
+def cargar_dataset_binario(ruta_binario):
+    """
+    Abre un dataset binario con np.memmap (solo lectura).
+    
+    No se copia ningún dato: las páginas se cargan bajo demanda y se
+    comparten entre todos los procesos que abren el mismo archivo.
+    
+    Returns:
+        DatasetBinario: (matriz, normas, nombres_canciones,
+                         metadatos_usuarios, metadatos)
+    """
+    cabecera = leer_cabecera(ruta_binario)
+    
+    arreglos = mapear_secciones(ruta_binario, cabecera)
+    metadatos_usuarios = {
+        nombre.split('/', 1)[1]: datos
+        for nombre, datos in arreglos.items() if nombre.startswith('metadatos/')
+    }
+    
+    return DatasetBinario(arreglos['matriz'], arreglos['normas'],
+                          cabecera['nombres_canciones'], metadatos_usuarios, cabecera)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compila el CSV de ratings al formato binario')
+    parser.add_argument('csv', nargs='?', default=os.getenv('DATASET_PATH', 'dataset_ratings.csv'))
+    parser.add_argument('salida', nargs='?', default=None,
+                        help='Archivo de salida (por defecto: mismo nombre con extensión .bin)')
+    parser.add_argument('--verificar', action='store_true',
+                        help='Solo verificar si el binario está actualizado (compara el checksum)')
+    args = parser.parse_args()
+    
+    salida = args.salida or os.path.splitext(args.csv)[0] + '.bin'
+    
+    if args.verificar:
+        vigente = binario_vigente(salida, args.csv, verificar_contenido=True)
+        print(f"{salida}: {'actualizado' if vigente else 'desactualizado'}")
+        raise SystemExit(0 if vigente else 1)
+    
+    inicio = time.perf_counter()
+    cabecera = compilar_dataset(args.csv, salida)
+    duracion = time.perf_counter() - inicio
+    
+    print(f"✓ {salida}: {cabecera['usuarios']:,} usuarios × {cabecera['canciones']:,} canciones "
+          f"({os.path.getsize(salida) / 1e6:.1f} MB) en {duracion:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+ESTADÍSTICAS GLOBALES DE LOS RATINGS
+
+/stats se consulta en cada carga del frontend. En lugar de recorrer la
+matriz en cada petición, las estadísticas se derivan de un histograma de
+ratings (cuántas celdas valen 0, 1, ..., 5) que se calcula una vez por
+instantánea y se actualiza con cada operación de ingesta.
+
+Como los ratings son enteros entre 0 y 5, el histograma basta para
+obtener exactamente el total, la media, la desviación estándar y la
+mediana, sin guardar los ratings individuales.
+"""
+
+import numpy as np
+
+from knn_engine import MatrizDispersa
+
+
+# Valores posibles de un rating (0 = sin evaluar)
+RATING_MAXIMO = 5
+
+# Filas por bloque al recorrer la matriz (evita copiarla completa a enteros)
+FILAS_POR_BLOQUE = 4096
+
+
+def histograma_ratings(matriz_usuarios):
+    """
+    Cuenta las celdas de la matriz con cada valor de rating.
+    
+    ALGORITMO:
+    Una sola pasada por bloques de filas con np.bincount. En una matriz
+    dispersa solo se cuentan los valores guardados; los ceros son las
+    celdas restantes.
+    
+    Args:
+        matriz_usuarios: Matriz densa, compacta o MatrizDispersa con
+                         ratings enteros entre 0 y 5
+    
+    Returns:
+        np.array: Arreglo int64 de longitud 6; la posición r tiene el
+                  número de celdas con rating r
+    
+    Complejidad:
+        O(n × m) para matrices densas, O(evaluaciones) para dispersas
+    """
+    n_usuarios, n_canciones = matriz_usuarios.shape
+    
+    if isinstance(matriz_usuarios, MatrizDispersa):
+        histograma = np.bincount(matriz_usuarios.datos.astype(np.intp),
+                                 minlength=RATING_MAXIMO + 1).astype(np.int64)
+        histograma[0] = n_usuarios * n_canciones - int(histograma[1:].sum())
+        return histograma
+    
+    histograma = np.zeros(RATING_MAXIMO + 1, dtype=np.int64)
+    for inicio in range(0, n_usuarios, FILAS_POR_BLOQUE):
+        histograma += contar_ratings(matriz_usuarios[inicio:inicio + FILAS_POR_BLOQUE])
+    
+    return histograma
+
+
+def contar_ratings(valores):
+    """Histograma (longitud 6) de un arreglo de ratings enteros entre 0 y 5."""
+    return np.bincount(np.asarray(valores).astype(np.intp).ravel(),
+                       minlength=RATING_MAXIMO + 1).astype(np.int64)
+
+
+def resumen_ratings(histograma, n_usuarios, n_canciones):
+    """
+    Estadísticas de /stats a partir del histograma de ratings.
+    
+    La media y la desviación se calculan con sumas enteras exactas; la
+    mediana, con el histograma acumulado (promedio de los dos valores
+    centrales si el número de evaluaciones es par, como np.median).
+    
+    Args:
+        histograma (np.array): Resultado de histograma_ratings
+        n_usuarios (int): Filas de la matriz
+        n_canciones (int): Columnas de la matriz
+    
+    Returns:
+        dict: Métricas del dataset en el formato de /stats
+    
+    Complejidad:
+        O(1)
+    """
+    conteos = [int(c) for c in histograma[1:]]
+    evaluaciones_totales = sum(conteos)
+    total_posible = n_usuarios * n_canciones
+    
+    suma = sum(rating * c for rating, c in enumerate(conteos, start=1))
+    suma_cuadrados = sum(rating * rating * c for rating, c in enumerate(conteos, start=1))
+    
+    if evaluaciones_totales:
+        promedio = suma / evaluaciones_totales
+        varianza = (evaluaciones_totales * suma_cuadrados - suma * suma) / evaluaciones_totales ** 2
+        
+        # Ratings en las posiciones centrales del orden ascendente
+        acumulado = np.cumsum(conteos)
+        centro_bajo = int(np.searchsorted(acumulado, (evaluaciones_totales - 1) // 2, side='right')) + 1
+        centro_alto = int(np.searchsorted(acumulado, evaluaciones_totales // 2, side='right')) + 1
+        mediana = (centro_bajo + centro_alto) / 2
+        desviacion = float(np.sqrt(varianza))
+    else:
+        promedio = mediana = desviacion = float('nan')
+    
+    densidad = evaluaciones_totales / total_posible * 100 if total_posible else 0.0
+    
+    return {
+        'total_usuarios': int(n_usuarios),
+        'total_canciones': int(n_canciones),
+        'evaluaciones_totales': evaluaciones_totales,
+        'evaluaciones_posibles': int(total_posible),
+        'densidad_porcentaje': round(float(densidad), 2),
+        'rating_promedio_global': round(float(promedio), 2),
+        'rating_mediana_global': round(float(mediana), 2),
+        'rating_desviacion_global': round(float(desviacion), 2),
+        'distribucion_ratings': {
+            '1_estrella': conteos[0],
+            '2_estrellas': conteos[1],
+            '3_estrellas': conteos[2],
+            '4_estrellas': conteos[3],
+            '5_estrellas': conteos[4]
+        }
+    }
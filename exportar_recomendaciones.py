@@ -0,0 +1,371 @@
+"""
+EXPORTACIÓN MASIVA DE RECOMENDACIONES
+
+Calcula los k vecinos y las N mejores recomendaciones de todos los
+usuarios del dataset (CSV más diario de ingesta) y las escribe en disco a
+medida que se calculan, para cargarlas en otro sistema (data warehouse,
+correo, precarga de una caché).
+
+PIPELINE (generadores, un bloque de usuarios en memoria a la vez):
+    
+    bloques_usuarios ──▶ calcular_bloques ──▶ escritor ──▶ checkpoint
+     [i, i + bloque)      vecinos y top-N       NDJSON o     usuarios
+                          (calcular_filas_      Parquet      completados
+                           grafo)
+
+La memoria no depende del número de usuarios: además de la matriz, solo
+viven las filas del bloque actual y la matriz de similitudes de un
+sub-bloque (acotada por --memoria-mb, como en grafo_vecinos.py).
+
+FORMATOS:
+- ndjson: un archivo, una línea por usuario con el formato de
+  GET /usuarios/<id>/recomendaciones:
+      {"usuario": 7, "recomendaciones": [{"cancion": ..., "score_predicho": ...,
+       "vecinos_que_evaluaron": ..., "rating_promedio_vecinos": ...}, ...]}
+- parquet: un directorio con un archivo parte-NNNNN.parquet por bloque, en
+  formato largo (usuario, posicion, cancion, score_predicho,
+  vecinos_que_evaluaron, rating_promedio_vecinos). Requiere pyarrow
+  (opcional, no está en requirements.txt).
+
+REANUDAR:
+Después de cada bloque se guarda <salida>.checkpoint (JSON, reemplazo
+atómico) con los usuarios completados, los bytes escritos (ndjson) o las
+partes escritas (parquet) y los parámetros de la exportación. Con
+--reanudar se descarta lo escrito después del último checkpoint y se
+continúa desde ahí, aplicando solo las operaciones del diario que ya
+estaban en la primera ejecución para que todas las filas salgan de la
+misma matriz.
+
+Uso:
+    python exportar_recomendaciones.py dataset_ratings.csv recomendaciones.ndjson --k 10 --n 20
+    python exportar_recomendaciones.py dataset_ratings.csv recomendaciones --formato parquet
+    python exportar_recomendaciones.py dataset_ratings.csv recomendaciones.ndjson --reanudar
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from dataset_loader import cargar_csv
+from dataset_store import calcular_checksum
+from grafo_vecinos import aplicar_diario
+from knn_engine import calcular_filas_grafo, filas_por_bloque_grafo
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+VERSION_FORMATO = 1
+FORMATOS = ('ndjson', 'parquet')
+
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def bloques_usuarios(n_usuarios, tamano_bloque, desde=0):
+    """Genera los índices de los usuarios de a tamano_bloque, desde `desde`."""
+    for inicio in range(desde, n_usuarios, tamano_bloque):
+        yield np.arange(inicio, min(inicio + tamano_bloque, n_usuarios))
+
+
+def calcular_bloques(matriz_usuarios, bloques, k, n_recomendaciones, normas, memoria_mb=256):
+    """
+    Genera (usuarios, filas) para cada bloque de usuarios, donde filas es
+    el resultado de knn_engine.calcular_filas_grafo.
+    """
+    tamano_sub_bloque = filas_por_bloque_grafo(matriz_usuarios.shape[0], memoria_mb)
+    
+    for usuarios in bloques:
+        yield usuarios, calcular_filas_grafo(matriz_usuarios, usuarios, k, n_recomendaciones,
+                                             normas, tamano_sub_bloque)
+
+
+# ============================================================================
+# ESCRITORES
+# ============================================================================
+
+class EscritorNDJSON:
+    """
+    Una línea JSON por usuario en un único archivo.
+    
+    Al reanudar, el archivo se trunca al byte del último checkpoint: lo que
+    se escribió después (un bloque a medias) se descarta.
+    """
+    
+    def __init__(self, ruta, posicion=0):
+        self.ruta = ruta
+        if posicion and (not os.path.exists(ruta) or os.path.getsize(ruta) < posicion):
+            raise ValueError(f'{ruta} es más corto que su checkpoint ({posicion} bytes)')
+        
+        self._archivo = open(ruta, 'r+b' if posicion else 'wb')
+        self._archivo.truncate(posicion)
+        self._archivo.seek(posicion)
+    
+    def escribir(self, usuarios, filas, nombres_canciones):
+        """Agrega las recomendaciones de un bloque de usuarios."""
+        _, _, canciones, scores, evaluaron, promedios = filas
+        
+        # Un solo tolist() por bloque: convertir cada escalar de NumPy es
+        # más lento que serializar
+        lineas = []
+        for usuario, fila_canciones, fila_scores, fila_evaluaron, fila_promedios in zip(
+            usuarios.tolist(), canciones.tolist(), np.round(scores, 6).tolist(),
+            evaluaron.tolist(), np.round(promedios, 6).tolist()
+        ):
+            recomendaciones = [
+                {
+                    'cancion': nombres_canciones[cancion],
+                    'score_predicho': score,
+                    'vecinos_que_evaluaron': n_evaluaron,
+                    'rating_promedio_vecinos': promedio
+                }
+                for cancion, score, n_evaluaron, promedio in zip(
+                    fila_canciones, fila_scores, fila_evaluaron, fila_promedios
+                )
+                if cancion >= 0
+            ]
+            lineas.append(json.dumps({'usuario': usuario, 'recomendaciones': recomendaciones},
+                                     ensure_ascii=False))
+        
+        self._archivo.write(('\n'.join(lineas) + '\n').encode('utf-8'))
+    
+    def confirmar(self):
+        """Lleva lo escrito al disco y retorna la posición para el checkpoint."""
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        return {'bytes': self._archivo.tell()}
+    
+    def cerrar(self):
+        self._archivo.close()
+
+
+class EscritorParquet:
+    """
+    Un archivo Parquet por bloque (parte-00000.parquet, ...) en un
+    directorio, con una fila por recomendación.
+    
+    Al reanudar se borran las partes posteriores al último checkpoint.
+    """
+    
+    def __init__(self, directorio, partes=0):
+        if pq is None:
+            raise RuntimeError('El formato parquet requiere pyarrow (pip install pyarrow)')
+        
+        self.directorio = directorio
+        self.partes = partes
+        os.makedirs(directorio, exist_ok=True)
+        
+        for ruta in glob.glob(os.path.join(directorio, 'parte-*.parquet')):
+            numero = os.path.basename(ruta)[len('parte-'):-len('.parquet')]
+            if not numero.isdigit() or int(numero) >= partes:
+                os.remove(ruta)
+    
+    def escribir(self, usuarios, filas, nombres_canciones):
+        """Escribe las recomendaciones de un bloque de usuarios en una parte nueva."""
+        _, _, canciones, scores, evaluaron, promedios = filas
+        
+        validas = canciones >= 0
+        filas_validas, posiciones = np.nonzero(validas)
+        tabla = pa.table({
+            'usuario': pa.array(usuarios[filas_validas], type=pa.int64()),
+            'posicion': pa.array(posiciones, type=pa.int16()),
+            'cancion': pa.array(np.asarray(nombres_canciones, dtype=object)[canciones[validas]],
+                                type=pa.string()),
+            'score_predicho': pa.array(scores[validas], type=pa.float32()),
+            'vecinos_que_evaluaron': pa.array(evaluaron[validas], type=pa.uint16()),
+            'rating_promedio_vecinos': pa.array(promedios[validas], type=pa.float32())
+        })
+        
+        ruta = os.path.join(self.directorio, f'parte-{self.partes:05d}.parquet')
+        pq.write_table(tabla, ruta + '.tmp')
+        os.replace(ruta + '.tmp', ruta)
+        self.partes += 1
+    
+    def confirmar(self):
+        return {'partes': self.partes}
+    
+    def cerrar(self):
+        pass
+
+
+# ============================================================================
+# CHECKPOINT
+# ============================================================================
+
+def leer_checkpoint(ruta):
+    """Checkpoint guardado, o None si no existe o no es válido."""
+    try:
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            checkpoint = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+    
+    if checkpoint.get('version_formato') != VERSION_FORMATO:
+        return None
+    
+    return checkpoint
+
+
+def guardar_checkpoint(ruta, checkpoint):
+    """Escribe el checkpoint en un temporal y lo reemplaza (atómico)."""
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(checkpoint, archivo, ensure_ascii=False, indent=2)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+def _formatear_duracion(segundos):
+    minutos, segundos = divmod(int(segundos), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f'{horas}:{minutos:02d}:{segundos:02d}'
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Exporta las recomendaciones de todos los usuarios del dataset'
+    )
+    parser.add_argument('csv', nargs='?', default=os.getenv('DATASET_PATH', 'dataset_ratings.csv'))
+    parser.add_argument('salida', nargs='?', default=None,
+                        help='Archivo (ndjson) o directorio (parquet) de salida '
+                             '(por defecto: mismo nombre con extensión .recomendaciones.ndjson '
+                             'o .recomendaciones)')
+    parser.add_argument('--formato', choices=FORMATOS, default='ndjson')
+    parser.add_argument('--k', type=int, default=10, help='Vecinos por usuario')
+    parser.add_argument('--n', type=int, default=20, help='Recomendaciones por usuario')
+    parser.add_argument('--bloque', type=int, default=10000,
+                        help='Usuarios por bloque escrito (y por checkpoint)')
+    parser.add_argument('--memoria-mb', type=float, default=256,
+                        help='Memoria máxima de la matriz de similitudes de un sub-bloque')
+    parser.add_argument('--diario', default=None,
+                        help='Diario de ingesta (por defecto: mismo nombre con extensión .ingesta.jsonl)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='Archivo de checkpoint (por defecto: <salida>.checkpoint)')
+    parser.add_argument('--reanudar', action='store_true',
+                        help='Continuar una exportación interrumpida desde su checkpoint')
+    args = parser.parse_args()
+    
+    if args.k < 1 or args.n < 1 or args.bloque < 1:
+        print("❌ --k, --n y --bloque deben ser mayores que 0")
+        raise SystemExit(1)
+    
+    if args.formato == 'parquet' and pq is None:
+        print("❌ El formato parquet requiere pyarrow (pip install pyarrow)")
+        raise SystemExit(1)
+    
+    base = os.path.splitext(args.csv)[0]
+    salida = args.salida or base + ('.recomendaciones.ndjson' if args.formato == 'ndjson'
+                                    else '.recomendaciones')
+    ruta_checkpoint = args.checkpoint or salida + '.checkpoint'
+    ruta_diario = args.diario or os.getenv('INGESTA_DIARIO', base + '.ingesta.jsonl')
+    checksum_csv = calcular_checksum(args.csv)
+    
+    # Al reanudar, los parámetros tienen que ser los de la primera ejecución
+    checkpoint = leer_checkpoint(ruta_checkpoint) if args.reanudar else None
+    if args.reanudar and checkpoint is None:
+        print(f"⚠️  No hay checkpoint válido en {ruta_checkpoint}: se exporta desde el inicio")
+    
+    if checkpoint is not None:
+        esperado = {'formato': args.formato, 'checksum_csv': checksum_csv,
+                    'k': args.k, 'n_recomendaciones': args.n}
+        distintos = [campo for campo, valor in esperado.items() if checkpoint.get(campo) != valor]
+        if distintos:
+            print(f"❌ El checkpoint no corresponde a esta exportación (difiere: {', '.join(distintos)})")
+            raise SystemExit(1)
+        
+        if checkpoint['completo']:
+            print(f"✓ {salida} ya está completo ({checkpoint['usuarios_completados']:,} usuarios)")
+            return
+    
+    dataset = cargar_csv(args.csv)
+    try:
+        creciente, operaciones, _ = aplicar_diario(
+            dataset.matriz, ruta_diario, hasta=checkpoint['operaciones'] if checkpoint else None,
+            checksum_csv=checksum_csv
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    matriz, normas = creciente.matriz, creciente.normas
+    n_usuarios = matriz.shape[0]
+    
+    if checkpoint is not None and (operaciones, n_usuarios) != (checkpoint['operaciones'],
+                                                                checkpoint['usuarios_totales']):
+        print(f"❌ El diario ya no tiene las {checkpoint['operaciones']} operaciones de la "
+              f"exportación interrumpida: exporte de nuevo sin --reanudar")
+        raise SystemExit(1)
+    
+    desde = checkpoint['usuarios_completados'] if checkpoint else 0
+    try:
+        if args.formato == 'ndjson':
+            escritor = EscritorNDJSON(salida, checkpoint['bytes'] if checkpoint else 0)
+        else:
+            escritor = EscritorParquet(salida, checkpoint['partes'] if checkpoint else 0)
+    except (OSError, ValueError) as e:
+        print(f"❌ No se puede abrir {salida}: {e}")
+        raise SystemExit(1)
+    
+    checkpoint = {
+        'version_formato': VERSION_FORMATO,
+        'formato': args.formato,
+        'checksum_csv': checksum_csv,
+        'operaciones': operaciones,
+        'k': args.k,
+        'n_recomendaciones': args.n,
+        'usuarios_totales': n_usuarios,
+        'usuarios_completados': desde,
+        'completo': False
+    }
+    
+    if desde:
+        print(f"↻ Reanudando {salida} desde el usuario {desde:,} de {n_usuarios:,}")
+    
+    inicio = time.perf_counter()
+    bloques = bloques_usuarios(n_usuarios, args.bloque, desde)
+    
+    try:
+        for usuarios, filas in calcular_bloques(matriz, bloques, args.k, args.n, normas,
+                                                args.memoria_mb):
+            escritor.escribir(usuarios, filas, dataset.nombres_canciones)
+            
+            checkpoint.update(escritor.confirmar())
+            checkpoint['usuarios_completados'] = int(usuarios[-1]) + 1
+            checkpoint['completo'] = checkpoint['usuarios_completados'] == n_usuarios
+            checkpoint['actualizado'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            guardar_checkpoint(ruta_checkpoint, checkpoint)
+            
+            completados = checkpoint['usuarios_completados']
+            transcurrido = time.perf_counter() - inicio
+            por_segundo = (completados - desde) / transcurrido if transcurrido > 0 else 0.0
+            restante = (n_usuarios - completados) / por_segundo if por_segundo > 0 else 0.0
+            print(f"  {completados:,}/{n_usuarios:,} usuarios ({completados / n_usuarios:.1%}) · "
+                  f"{por_segundo:,.0f} usuarios/s · restante {_formatear_duracion(restante)}",
+                  flush=True)
+    finally:
+        escritor.cerrar()
+    
+    if n_usuarios == desde:
+        checkpoint['completo'] = True
+        checkpoint['actualizado'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        guardar_checkpoint(ruta_checkpoint, checkpoint)
+    
+    duracion = time.perf_counter() - inicio
+    print(f"✓ {salida}: {n_usuarios - desde:,} usuarios exportados ({args.formato}, k={args.k}, "
+          f"N={args.n}, {operaciones} operaciones del diario) en {_formatear_duracion(duracion)}")
+
+
+if __name__ == '__main__':
+    main()
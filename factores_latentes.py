@@ -0,0 +1,145 @@
+"""
+PERSISTENCIA DE LOS FACTORES LATENTES
+
+Guarda en disco el resultado de knn_engine.factorizar (coordenadas de los
+usuarios, base de canciones, normas y valores singulares) con el mismo
+formato de secciones que dataset_store.py, junto con el checksum del CSV
+de origen. Los workers abren el archivo con np.memmap en lugar de
+refactorizar la matriz al arrancar; el primero en arrancar lo crea bajo
+un candado de archivo.
+
+ESTRUCTURA DEL ARCHIVO:
+┌──────────────────────────────────────────────────────────┐
+│ MAGIA (8 bytes)           b'KNNFACT1'                    │
+│ Longitud cabecera (8 B)   uint64 little-endian           │
+│ Cabecera JSON (utf-8)     forma, rango, checksum del CSV │
+│ usuarios                  float32 (usuarios × rango)     │
+│ canciones                 float32 (canciones × rango)    │
+│ normas                    float32 (usuarios,)            │
+│ valores_singulares        float64 (rango,)               │
+└──────────────────────────────────────────────────────────┘
+
+Uso (paso de build, opcional):
+    python factores_latentes.py dataset_ratings.csv dataset_ratings.factores --rango 64
+"""
+
+import argparse
+import fcntl
+import os
+import struct
+import time
+
+import numpy as np
+
+from dataset_loader import cargar_csv
+from dataset_store import (
+    calcular_checksum,
+    escribir_secciones,
+    leer_cabecera_secciones,
+    mapear_secciones
+)
+from knn_engine import FactoresLatentes, factorizar
+
+
+MAGIA = b'KNNFACT1'
+VERSION_FORMATO = 1
+
+
+def guardar_factores(ruta, factores, checksum_csv):
+    """
+    Guarda los factores (sin pendientes) en un archivo para np.memmap.
+    
+    Args:
+        ruta (str): Archivo de destino
+        factores (FactoresLatentes): Factores consolidados
+        checksum_csv (str): SHA-256 del CSV del que se obtuvo la matriz
+    """
+    cabecera = {
+        'version_formato': VERSION_FORMATO,
+        'usuarios': int(factores.usuarios.shape[0]),
+        'canciones': int(factores.canciones.shape[0]),
+        'rango': int(factores.canciones.shape[1]),
+        'checksum_csv': checksum_csv,
+        'creado': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    escribir_secciones(ruta, MAGIA, cabecera, {
+        'usuarios': factores.usuarios,
+        'canciones': factores.canciones,
+        'normas': factores.normas,
+        'valores_singulares': factores.valores_singulares
+    })
+
+
+def factores_vigentes(ruta, checksum_csv, forma, rango):
+    """
+    Indica si el archivo de factores corresponde al CSV y a la matriz
+    (forma = (usuarios, canciones)) actuales y tiene el rango pedido.
+    """
+    try:
+        cabecera = leer_cabecera_secciones(ruta, MAGIA)
+    except (ValueError, OSError, struct.error):
+        return False
+    
+    return (cabecera.get('version_formato') == VERSION_FORMATO
+            and cabecera['checksum_csv'] == checksum_csv
+            and (cabecera['usuarios'], cabecera['canciones']) == tuple(forma)
+            and cabecera['rango'] == min(rango, forma[0], forma[1]))
+
+
+def cargar_factores(ruta):
+    """Abre un archivo de factores con np.memmap (solo lectura)."""
+    cabecera = leer_cabecera_secciones(ruta, MAGIA)
+    secciones = mapear_secciones(ruta, cabecera)
+    
+    return FactoresLatentes(secciones['usuarios'], secciones['canciones'], secciones['normas'],
+                            secciones['valores_singulares'], np.zeros(0, dtype=np.intp))
+
+
+def obtener_factores(ruta, matriz_usuarios, checksum_csv, rango=64):
+    """
+    Abre los factores guardados o, si no están al día, factoriza y guarda.
+    
+    Un candado de archivo evita que varios workers que arrancan a la vez
+    factoricen la misma matriz: el primero la factoriza y los demás
+    esperan y abren el archivo.
+    
+    Returns:
+        tuple: (FactoresLatentes, bool indicando si se factorizó)
+    """
+    with open(f'{ruta}.lock', 'a') as candado:
+        fcntl.flock(candado, fcntl.LOCK_EX)
+        try:
+            if factores_vigentes(ruta, checksum_csv, matriz_usuarios.shape, rango):
+                return cargar_factores(ruta), False
+            
+            factores = factorizar(matriz_usuarios, rango=rango)
+            guardar_factores(ruta, factores, checksum_csv)
+            return cargar_factores(ruta), True
+        finally:
+            fcntl.flock(candado, fcntl.LOCK_UN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Factoriza la matriz de ratings (SVD truncada)')
+    parser.add_argument('csv', nargs='?', default=os.getenv('DATASET_PATH', 'dataset_ratings.csv'))
+    parser.add_argument('salida', nargs='?', default=None,
+                        help='Archivo de salida (por defecto: mismo nombre con extensión .factores)')
+    parser.add_argument('--rango', type=int, default=int(os.getenv('RANGO_LATENTE', 64)))
+    args = parser.parse_args()
+    
+    salida = args.salida or os.path.splitext(args.csv)[0] + '.factores'
+    
+    inicio = time.perf_counter()
+    matriz = cargar_csv(args.csv).matriz
+    factores = factorizar(matriz, rango=args.rango)
+    guardar_factores(salida, factores, calcular_checksum(args.csv))
+    duracion = time.perf_counter() - inicio
+    
+    energia = np.sum(factores.valores_singulares ** 2) / np.sum(matriz.astype(np.float64) ** 2)
+    print(f"✓ {salida}: rango {factores.canciones.shape[1]}, "
+          f"{energia:.1%} de la energía de la matriz ({os.path.getsize(salida) / 1e6:.1f} MB) "
+          f"en {duracion:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+FORMATOS DE LAS PETICIONES DE RECOMENDACIÓN
+
+EVALUACIONES (/clasificar y /recomendar), tres formas equivalentes:
+    - Vector denso, un valor por canción en el orden de /canciones:
+        "evaluaciones": [0, 5, 3, 0, 4, ...]
+    - Objeto {canción: rating}, con el nombre de la canción o su posición
+      en /canciones:
+        "evaluaciones": {"La Piragua": 5, "17": 4}
+    - Posiciones y ratings en dos arreglos:
+        "canciones": [3, 17, 42], "valores": [5, 4, 3]
+
+Las dos últimas solo envían las canciones evaluadas (el frontend pide
+unas 10) y se convierten en un CandidatoDisperso: el motor las usa sin
+construir el vector de n_canciones valores.
+
+CODIFICACIÓN:
+El body puede ir en JSON (Content-Type: application/json) o en msgpack
+(application/msgpack), más compacto y rápido de decodificar para clientes
+con mucho volumen. Con Accept: application/msgpack la respuesta exitosa
+también se codifica en msgpack; los errores siempre van en JSON. msgpack
+es opcional: sin el paquete instalado solo se acepta JSON.
+"""
+
+import numpy as np
+from flask import Response, jsonify
+
+from knn_engine import construir_candidato_disperso
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+TIPOS_MSGPACK = ('application/msgpack', 'application/x-msgpack')
+
+
+def leer_cuerpo(peticion):
+    """
+    Decodifica el body de una petición JSON o msgpack.
+    
+    Args:
+        peticion: flask.request
+    
+    Returns:
+        tuple: (data, error). error es None si el body es un objeto válido.
+    """
+    if peticion.mimetype in TIPOS_MSGPACK:
+        if msgpack is None:
+            return None, 'application/msgpack no está disponible (falta el paquete msgpack)'
+        
+        try:
+            data = msgpack.unpackb(peticion.get_data(), raw=False, strict_map_key=False)
+        except Exception:
+            return None, 'Body msgpack inválido'
+    
+    elif peticion.is_json:
+        data = peticion.get_json()
+    
+    else:
+        return None, 'Content-Type debe ser application/json o application/msgpack'
+    
+    if not isinstance(data, dict):
+        return None, 'El body debe ser un objeto'
+    
+    return data, None
+
+
+def _posicion_cancion(cancion, indice_canciones):
+    """Posición de una canción dada por nombre o por posición; None si no existe."""
+    if isinstance(cancion, str):
+        if cancion in indice_canciones:
+            return indice_canciones[cancion]
+        if cancion.isdigit():
+            return int(cancion)
+        return None
+    
+    if isinstance(cancion, (int, np.integer)) and not isinstance(cancion, bool):
+        return int(cancion)
+    
+    return None
+
+
+def leer_candidato(data, indice_canciones, n_canciones):
+    """
+    Evaluaciones del candidato en cualquiera de los tres formatos.
+    
+    Args:
+        data (dict): Body de la petición
+        indice_canciones (dict): Nombre de canción → posición
+        n_canciones (int): Número de canciones del dataset
+    
+    Returns:
+        tuple: (candidato, error). candidato es un np.array denso (formato
+               de lista) o un CandidatoDisperso; error es None si las
+               evaluaciones son válidas.
+    
+    Raises:
+        ValueError: Si los valores no se pueden convertir a números, hay
+                    posiciones fuera de rango o canciones repetidas
+    """
+    if 'evaluaciones' in data and not isinstance(data['evaluaciones'], dict):
+        evaluaciones = np.array(data['evaluaciones'], dtype=float)
+        
+        if evaluaciones.ndim != 1 or len(evaluaciones) != n_canciones:
+            return None, (f'Se esperan {n_canciones} evaluaciones, '
+                          f'se recibieron {len(evaluaciones) if evaluaciones.ndim else 0}')
+        
+        if np.any((evaluaciones < 0) | (evaluaciones > 5)):
+            return None, 'Las evaluaciones deben estar entre 0 y 5'
+        
+        return evaluaciones, None
+    
+    if 'evaluaciones' in data:
+        canciones = list(data['evaluaciones'].keys())
+        valores = list(data['evaluaciones'].values())
+    
+    elif 'canciones' in data and 'valores' in data:
+        canciones, valores = data['canciones'], data['valores']
+        if not isinstance(canciones, list) or not isinstance(valores, list):
+            return None, '"canciones" y "valores" deben ser listas'
+    
+    else:
+        return None, 'Falta el campo "evaluaciones" en el body'
+    
+    posiciones = [_posicion_cancion(cancion, indice_canciones) for cancion in canciones]
+    desconocidas = [cancion for cancion, posicion in zip(canciones, posiciones) if posicion is None]
+    if desconocidas:
+        return None, f'Canciones no encontradas: {desconocidas[:10]}'
+    
+    valores = np.array(valores, dtype=float)
+    if np.any((valores < 0) | (valores > 5)):
+        return None, 'Las evaluaciones deben estar entre 0 y 5'
+    
+    return construir_candidato_disperso(posiciones, valores, n_canciones), None
+
+
+def responder(contenido, peticion):
+    """
+    Respuesta en msgpack si el cliente la prefiere (Accept) y el paquete
+    está instalado; si no, en JSON.
+    """
+    if msgpack is not None:
+        preferido = peticion.accept_mimetypes.best_match(('application/json',) + TIPOS_MSGPACK)
+        if preferido in TIPOS_MSGPACK:
+            return Response(msgpack.packb(contenido, use_bin_type=True), content_type=preferido)
+    
+    return jsonify(contenido)
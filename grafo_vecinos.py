@@ -0,0 +1,237 @@
+"""
+GRAFO DE VECINOS Y RECOMENDACIONES PRECALCULADAS
+
+Proceso fuera de línea que calcula, para cada usuario del dataset, sus k
+vecinos y sus N mejores recomendaciones (knn_engine.construir_grafo_vecinos)
+y los guarda con el mismo formato de secciones que dataset_store.py. La
+API abre el archivo con np.memmap y responde
+GET /usuarios/<id>/recomendaciones leyendo una fila, en O(N).
+
+El grafo se calcula sobre el CSV más el diario de ingesta. Si el archivo
+ya existe y corresponde al mismo CSV, k y N, solo se recalculan las filas
+afectadas por las operaciones del diario registradas después de la última
+ejecución (knn_engine.actualizar_grafo_vecinos).
+
+ESTRUCTURA DEL ARCHIVO:
+┌──────────────────────────────────────────────────────────┐
+│ MAGIA (8 bytes)           b'KNNGRAF1'                    │
+│ Longitud cabecera (8 B)   uint64 little-endian           │
+│ Cabecera JSON (utf-8)     forma, k, N, revisión, checksum│
+│ vecinos                   int32 (usuarios × k)           │
+│ similitudes               float32 (usuarios × k)         │
+│ canciones                 int32 (usuarios × N), -1 vacío │
+│ scores                    float32 (usuarios × N)         │
+│ evaluaron                 uint16 (usuarios × N)          │
+│ promedios                 float32 (usuarios × N)         │
+└──────────────────────────────────────────────────────────┘
+
+Uso (paso de build o tarea periódica):
+    python grafo_vecinos.py dataset_ratings.csv dataset_ratings.grafo --k 10 --n 20
+    python grafo_vecinos.py --diario dataset_ratings.ingesta.jsonl   # reconstrucción parcial
+"""
+
+import argparse
+import os
+import struct
+import time
+
+import numpy as np
+
+from dataset_loader import cargar_csv
+from dataset_store import (
+    calcular_checksum,
+    escribir_secciones,
+    leer_cabecera_secciones,
+    mapear_secciones
+)
+from ingesta import DiarioIngesta, MatrizCreciente
+from knn_engine import (
+    GrafoVecinos,
+    actualizar_grafo_vecinos,
+    calcular_normas,
+    construir_grafo_vecinos
+)
+
+
+MAGIA = b'KNNGRAF1'
+VERSION_FORMATO = 1
+
+
+def guardar_grafo(ruta, grafo, checksum_csv):
+    """
+    Guarda el grafo (sin pendientes) en un archivo para np.memmap.
+    
+    Args:
+        ruta (str): Archivo de destino
+        grafo (GrafoVecinos): Grafo calculado
+        checksum_csv (str): SHA-256 del CSV del que se obtuvo la matriz
+    """
+    cabecera = {
+        'version_formato': VERSION_FORMATO,
+        'usuarios': int(grafo.vecinos.shape[0]),
+        'k': int(grafo.vecinos.shape[1]),
+        'n_recomendaciones': int(grafo.canciones.shape[1]),
+        'revision': int(grafo.revision),
+        'checksum_csv': checksum_csv,
+        'creado': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    escribir_secciones(ruta, MAGIA, cabecera, {
+        'vecinos': grafo.vecinos,
+        'similitudes': grafo.similitudes,
+        'canciones': grafo.canciones,
+        'scores': grafo.scores,
+        'evaluaron': grafo.evaluaron,
+        'promedios': grafo.promedios
+    })
+
+
+def leer_cabecera_grafo(ruta):
+    """Cabecera del archivo del grafo, o None si no existe o no es válido."""
+    try:
+        cabecera = leer_cabecera_secciones(ruta, MAGIA)
+    except (ValueError, OSError, struct.error):
+        return None
+    
+    if cabecera.get('version_formato') != VERSION_FORMATO:
+        return None
+    
+    return cabecera
+
+
+def grafo_vigente(ruta, checksum_csv):
+    """Indica si el archivo del grafo se calculó a partir del CSV actual."""
+    cabecera = leer_cabecera_grafo(ruta)
+    return cabecera is not None and cabecera['checksum_csv'] == checksum_csv
+
+
+def cargar_grafo(ruta):
+    """Abre un archivo del grafo con np.memmap (solo lectura)."""
+    cabecera = leer_cabecera_secciones(ruta, MAGIA)
+    secciones = mapear_secciones(ruta, cabecera)
+    
+    return GrafoVecinos(secciones['vecinos'], secciones['similitudes'], secciones['canciones'],
+                        secciones['scores'], secciones['evaluaron'], secciones['promedios'],
+                        cabecera['revision'], np.zeros(0, dtype=np.intp))
+
+
+def _aplicar(creciente, operacion):
+    """Aplica a la matriz una operación del diario (ya validada por la API)."""
+    if operacion['tipo'] == 'agregar':
+        return creciente.agregar(np.array(operacion['evaluaciones'], dtype=creciente.matriz.dtype))
+    
+    usuario = int(operacion['usuario'])
+    creciente.actualizar(usuario, np.array(operacion['canciones'], dtype=np.intp),
+                         np.array(operacion['valores']))
+    return np.array([usuario])
+
+
+def aplicar_diario(matriz, ruta_diario, desde=0, hasta=None, checksum_csv=None):
+    """
+    Matriz del CSV con las operaciones del diario aplicadas.
+    
+    Args:
+        matriz (np.array): Matriz del CSV (no se modifica)
+        ruta_diario (str): Diario de ingesta (puede no existir)
+        desde (int): Las operaciones a partir de esta posición cuentan
+                     como modificaciones
+        hasta (int): Aplicar solo las primeras `hasta` operaciones
+                     (por defecto: todas)
+        checksum_csv (str): SHA-256 del CSV, para comprobar que el diario
+                            es de este dataset (opcional)
+    
+    Returns:
+        tuple: (MatrizCreciente, operaciones aplicadas, np.array de usuarios
+                modificados por las operaciones desde `desde`)
+    
+    Raises:
+        ValueError: Si el diario es de otro dataset
+    """
+    creciente = MatrizCreciente(matriz, calcular_normas(matriz))
+    modificados = []
+    posicion = [0]
+    
+    def aplicar(operacion):
+        if hasta is not None and posicion[0] >= hasta:
+            return
+        usuarios = _aplicar(creciente, operacion)
+        if posicion[0] >= desde:
+            modificados.append(usuarios)
+        posicion[0] += 1
+    
+    DiarioIngesta(ruta_diario, checksum_csv, matriz.shape[0]).sincronizar(aplicar)
+    
+    modificados = np.unique(np.concatenate(modificados)) if modificados else np.zeros(0, dtype=np.intp)
+    return creciente, posicion[0], modificados
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Calcula el grafo de vecinos y las recomendaciones de cada usuario'
+    )
+    parser.add_argument('csv', nargs='?', default=os.getenv('DATASET_PATH', 'dataset_ratings.csv'))
+    parser.add_argument('salida', nargs='?', default=None,
+                        help='Archivo de salida (por defecto: mismo nombre con extensión .grafo)')
+    parser.add_argument('--k', type=int, default=10, help='Vecinos por usuario')
+    parser.add_argument('--n', type=int, default=20, help='Recomendaciones guardadas por usuario')
+    parser.add_argument('--diario', default=None,
+                        help='Diario de ingesta (por defecto: mismo nombre con extensión .ingesta.jsonl)')
+    parser.add_argument('--memoria-mb', type=float, default=256,
+                        help='Memoria máxima de la matriz de similitudes de un bloque')
+    parser.add_argument('--completo', action='store_true',
+                        help='Recalcular todas las filas aunque el grafo esté al día')
+    args = parser.parse_args()
+    
+    base = os.path.splitext(args.csv)[0]
+    salida = args.salida or base + '.grafo'
+    ruta_diario = args.diario or os.getenv('INGESTA_DIARIO', base + '.ingesta.jsonl')
+    checksum_csv = calcular_checksum(args.csv)
+    
+    inicio = time.perf_counter()
+    
+    # Reconstrucción parcial si el grafo existente es del mismo CSV, k y N
+    cabecera = leer_cabecera_grafo(salida)
+    parcial = (not args.completo and cabecera is not None
+               and cabecera['checksum_csv'] == checksum_csv
+               and (cabecera['k'], cabecera['n_recomendaciones']) == (args.k, args.n))
+    desde = cabecera['revision'] if parcial else 0
+    
+    matriz = cargar_csv(args.csv).matriz
+    try:
+        creciente, operaciones, modificados = aplicar_diario(matriz, ruta_diario, desde,
+                                                             checksum_csv=checksum_csv)
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    matriz, normas = creciente.matriz, creciente.normas
+    
+    # Un diario más corto que la revisión del grafo se reinició: no hay
+    # forma de saber qué cambió
+    if parcial and operaciones < desde:
+        print(f"⚠️  El diario tiene {operaciones} operaciones y el grafo incluye {desde}: "
+              f"se recalcula completo")
+        parcial = False
+    
+    if parcial:
+        grafo, recalculados = actualizar_grafo_vecinos(
+            cargar_grafo(salida), matriz, modificados, normas,
+            memoria_mb=args.memoria_mb, revision=operaciones
+        )
+        n_recalculados = len(recalculados)
+    else:
+        grafo = construir_grafo_vecinos(matriz, k=args.k, n_recomendaciones=args.n, normas=normas,
+                                        memoria_mb=args.memoria_mb, revision=operaciones)
+        n_recalculados = matriz.shape[0]
+    
+    if not parcial or n_recalculados:
+        guardar_grafo(salida, grafo, checksum_csv)
+    duracion = time.perf_counter() - inicio
+    
+    print(f"✓ {salida}: {matriz.shape[0]:,} usuarios, k={grafo.vecinos.shape[1]}, "
+          f"N={grafo.canciones.shape[1]}, {operaciones} operaciones del diario "
+          f"({os.path.getsize(salida) / 1e6:.1f} MB)")
+    print(f"  Filas recalculadas: {n_recalculados:,} de {matriz.shape[0]:,} "
+          f"({'parcial' if parcial else 'completo'}) en {duracion:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
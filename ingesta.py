@@ -0,0 +1,450 @@
+"""
+INGESTA INCREMENTAL DE RATINGS
+
+Permite agregar usuarios y modificar ratings sin reiniciar el servicio ni
+volver a parsear el CSV.
+
+COMPONENTES:
+- MatrizCreciente: matriz de ratings con filas de reserva. Agregar un
+  usuario escribe una fila libre; modificar ratings toca solo las celdas
+  cambiadas. Las normas (y, si se usan, los agregados de
+  knn_engine.AgregadosUsuarios) se actualizan con la diferencia entre los
+  valores nuevos y los anteriores, así que el costo es O(celdas cambiadas)
+  (más una copia amortizada cuando se acaba la reserva).
+- CandadoLecturaEscritura: las peticiones leen con el candado compartido y
+  la ingesta escribe con el exclusivo, de modo que ningún lector ve una
+  actualización a medio aplicar (fila nueva con la norma vieja, etc.).
+- DiarioIngesta: archivo JSONL donde se registra cada operación. Con varios
+  workers de gunicorn cada uno tiene su propia copia de la matriz: antes
+  de atender una petición, el worker aplica las operaciones que otros
+  registraron. Como todos aplican las mismas operaciones en el mismo
+  orden, los índices de usuario coinciden en todos. Al arrancar, el diario
+  completo se aplica sobre el dataset, así que los cambios persisten. Su
+  cabecera identifica el dataset (checksum del CSV y usuarios) sobre el
+  que valen esos índices.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from knn_engine import AgregadosUsuarios
+
+
+# Filas que se reservan como mínimo al crear el buffer de la matriz
+RESERVA_MINIMA = 1024
+
+# Versión de la cabecera del diario de ingesta
+VERSION_DIARIO = 1
+
+
+class CandadoLecturaEscritura:
+    """
+    Varios lectores a la vez o un único escritor.
+    
+    Un escritor en espera bloquea a los lectores nuevos, para que un flujo
+    continuo de peticiones no retrase la ingesta indefinidamente.
+    """
+    
+    def __init__(self):
+        self._condicion = threading.Condition(threading.Lock())
+        self._lectores = 0
+        self._escribiendo = False
+        self._escritores_esperando = 0
+    
+    @contextmanager
+    def lectura(self):
+        with self._condicion:
+            while self._escribiendo or self._escritores_esperando:
+                self._condicion.wait()
+            self._lectores += 1
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._lectores -= 1
+                if self._lectores == 0:
+                    self._condicion.notify_all()
+    
+    @contextmanager
+    def escritura(self):
+        with self._condicion:
+            self._escritores_esperando += 1
+            while self._escribiendo or self._lectores:
+                self._condicion.wait()
+            self._escritores_esperando -= 1
+            self._escribiendo = True
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._escribiendo = False
+                self._condicion.notify_all()
+
+
+class MatrizCreciente:
+    """
+    Matriz de ratings (densa float64 o compacta uint8) que admite agregar
+    usuarios y modificar celdas manteniendo sus normas al día.
+    
+    Mientras no haya cambios se usa la matriz original sin copiarla (puede
+    ser un np.memmap de solo lectura). El primer cambio la copia a un
+    buffer con filas de reserva, que duplica su capacidad al llenarse.
+    
+    Las propiedades matriz, normas y agregados retornan vistas de las filas
+    en uso.
+    """
+    
+    def __init__(self, matriz, normas, agregados=None):
+        self._matriz = matriz
+        self._normas = normas
+        self._sumas_cuadrados = None
+        self._agregados = agregados
+        self.n_usuarios = matriz.shape[0]
+    
+    @property
+    def matriz(self):
+        return self._matriz[:self.n_usuarios]
+    
+    @property
+    def normas(self):
+        return self._normas[:self.n_usuarios]
+    
+    @property
+    def agregados(self):
+        if self._agregados is None:
+            return None
+        return AgregadosUsuarios(*(columna[:self.n_usuarios] for columna in self._agregados))
+    
+    def _reservar(self, filas_nuevas):
+        """Garantiza espacio escribible para filas_nuevas usuarios más."""
+        necesarias = self.n_usuarios + filas_nuevas
+        
+        if self._sumas_cuadrados is None:
+            # Sumas de cuadrados exactas de cada fila (una sola vez)
+            tipo_suma = np.int64 if self._matriz.dtype.kind in 'ui' else np.float64
+            self._sumas_cuadrados = np.zeros(self.n_usuarios, dtype=tipo_suma)
+            for inicio in range(0, self.n_usuarios, 4096):
+                bloque = np.asarray(self._matriz[inicio:inicio + 4096], dtype=tipo_suma)
+                self._sumas_cuadrados[inicio:inicio + len(bloque)] = np.sum(bloque * bloque, axis=1)
+        
+        if self._agregados is not None and self._agregados.evaluadas.shape[0] < necesarias:
+            capacidad = max(necesarias, 2 * self._agregados.evaluadas.shape[0], RESERVA_MINIMA)
+            columnas = []
+            for columna in self._agregados:
+                nueva = np.zeros(capacidad, dtype=columna.dtype)
+                nueva[:self.n_usuarios] = columna[:self.n_usuarios]
+                columnas.append(nueva)
+            self._agregados = AgregadosUsuarios(*columnas)
+        
+        if (self._matriz.shape[0] >= necesarias and self._matriz.flags.writeable
+                and self._normas.flags.writeable):
+            return
+        
+        capacidad = max(necesarias, 2 * self._matriz.shape[0], RESERVA_MINIMA)
+        
+        matriz = np.zeros((capacidad, self._matriz.shape[1]), dtype=self._matriz.dtype)
+        matriz[:self.n_usuarios] = self._matriz[:self.n_usuarios]
+        normas = np.zeros(capacidad, dtype=self._normas.dtype)
+        normas[:self.n_usuarios] = self._normas[:self.n_usuarios]
+        sumas = np.zeros(capacidad, dtype=self._sumas_cuadrados.dtype)
+        sumas[:self.n_usuarios] = self._sumas_cuadrados[:self.n_usuarios]
+        
+        self._matriz, self._normas, self._sumas_cuadrados = matriz, normas, sumas
+    
+    def agregar(self, evaluaciones):
+        """
+        Agrega usuarios al final de la matriz.
+        
+        Args:
+            evaluaciones (np.array): Matriz (n_nuevos, n_canciones) con
+                                     ratings enteros entre 0 y 5
+        
+        Returns:
+            np.array: Índices asignados a los nuevos usuarios
+        
+        Complejidad:
+            O(n_nuevos × m), más una copia amortizada al crecer el buffer
+        """
+        evaluaciones = np.asarray(evaluaciones)
+        n_nuevos = evaluaciones.shape[0]
+        self._reservar(n_nuevos)
+        
+        filas = np.arange(self.n_usuarios, self.n_usuarios + n_nuevos)
+        self._matriz[filas] = evaluaciones
+        sumas = np.sum(evaluaciones.astype(self._sumas_cuadrados.dtype) ** 2, axis=1)
+        self._sumas_cuadrados[filas] = sumas
+        self._normas[filas] = np.sqrt(sumas)
+        
+        if self._agregados is not None:
+            positivos = np.where(evaluaciones > 0, evaluaciones, 0).astype(np.float64)
+            self._agregados.evaluadas[filas] = np.count_nonzero(positivos, axis=1)
+            self._agregados.sumas[filas] = np.sum(positivos, axis=1)
+            self._agregados.sumas_cuadrados[filas] = np.sum(positivos ** 2, axis=1)
+        
+        # Las filas nuevas se vuelven visibles al final
+        self.n_usuarios += n_nuevos
+        
+        return filas
+    
+    def actualizar(self, usuario, canciones, valores):
+        """
+        Modifica ratings de un usuario (0 elimina la evaluación).
+        
+        Args:
+            usuario (int): Índice del usuario
+            canciones (np.array): Índices de las canciones
+            valores (np.array): Nuevos ratings enteros entre 0 y 5
+        
+        Complejidad:
+            O(len(canciones))
+        """
+        self._reservar(0)
+        
+        tipo_suma = self._sumas_cuadrados.dtype
+        anteriores = self._matriz[usuario, canciones].astype(tipo_suma)
+        nuevos = np.asarray(valores).astype(tipo_suma)
+        
+        self._matriz[usuario, canciones] = valores
+        self._sumas_cuadrados[usuario] += np.sum(nuevos ** 2) - np.sum(anteriores ** 2)
+        self._normas[usuario] = np.sqrt(self._sumas_cuadrados[usuario])
+        
+        if self._agregados is not None:
+            anteriores = np.where(anteriores > 0, anteriores, 0).astype(np.float64)
+            nuevos = np.where(nuevos > 0, nuevos, 0).astype(np.float64)
+            self._agregados.evaluadas[usuario] += np.count_nonzero(nuevos) - np.count_nonzero(anteriores)
+            self._agregados.sumas[usuario] += np.sum(nuevos) - np.sum(anteriores)
+            self._agregados.sumas_cuadrados[usuario] += np.sum(nuevos ** 2) - np.sum(anteriores ** 2)
+
+
+class DiarioIngesta:
+    """
+    Registro de operaciones de ingesta compartido entre procesos.
+    
+    Cada línea es un JSON con una operación. El archivo se bloquea con
+    flock mientras se escribe, y cada proceso recuerda hasta qué byte lo
+    leyó para aplicar solo las operaciones nuevas.
+    
+    Las operaciones identifican a los usuarios por su posición en la
+    matriz, así que solo tienen sentido sobre el dataset en el que se
+    registraron. La primera línea es una cabecera con el checksum del CSV y
+    el número de usuarios de ese dataset; antes de aplicar o registrar nada
+    se comprueba que coincide con los del dataset cargado, y al cargar un
+    dataset nuevo un diario ajeno se aparta (rotar_si_ajeno). Un diario
+    sin cabecera (creado antes de que existiera) se acepta sin comprobar.
+    """
+    
+    def __init__(self, ruta, checksum_csv=None, usuarios=None):
+        """
+        Args:
+            ruta (str): Archivo del diario
+            checksum_csv (str): SHA-256 del CSV cargado (sin él no se
+                                escribe ni se comprueba la cabecera)
+            usuarios (int): Usuarios del dataset antes de la ingesta
+        """
+        self.ruta = ruta
+        self.cabecera = {
+            'tipo': 'cabecera',
+            'version': VERSION_DIARIO,
+            'checksum_csv': checksum_csv,
+            'usuarios': usuarios
+        }
+        self.operaciones_aplicadas = 0
+        self._posicion = 0
+        self._inodo = None
+    
+    def hay_pendientes(self):
+        """Indica si otro proceso registró operaciones que faltan por aplicar."""
+        try:
+            estado = os.stat(self.ruta)
+        except OSError:
+            return False
+        
+        # Un diario reemplazado es de otra carga: lo aplicará la recarga
+        if self._inodo is not None and estado.st_ino != self._inodo:
+            return False
+        
+        return estado.st_size > self._posicion
+    
+    @contextmanager
+    def _abierto(self, modo, candado):
+        """
+        Abre el diario con el candado tomado. Si otro proceso reemplazó el
+        archivo mientras se esperaba el candado, se abre el nuevo.
+        """
+        while True:
+            archivo = open(self.ruta, modo)
+            fcntl.flock(archivo, candado)
+            try:
+                vigente = os.stat(self.ruta).st_ino == os.fstat(archivo.fileno()).st_ino
+            except FileNotFoundError:
+                vigente = False
+            if vigente:
+                break
+            archivo.close()
+        
+        try:
+            yield archivo
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+            archivo.close()
+    
+    def _coincide(self, cabecera):
+        """Indica si la cabecera de un diario es la del dataset cargado."""
+        return (self.cabecera['checksum_csv'] is None
+                or (cabecera.get('checksum_csv'), cabecera.get('usuarios'))
+                == (self.cabecera['checksum_csv'], self.cabecera['usuarios']))
+    
+    def _verificar(self, archivo):
+        """
+        Comprueba, con el archivo bloqueado, que el diario es el que este
+        proceso venía leyendo y que pertenece al dataset cargado; al
+        empezar, salta la cabecera.
+        
+        Raises:
+            ValueError: Si el diario fue reemplazado o es de otro dataset
+        """
+        inodo = os.fstat(archivo.fileno()).st_ino
+        if self._inodo is not None and inodo != self._inodo:
+            raise ValueError(f'{self.ruta} fue reemplazado por otro proceso: '
+                             f'hay que recargar el dataset')
+        self._inodo = inodo
+        
+        if self._posicion:
+            return
+        
+        archivo.seek(0)
+        linea = archivo.readline()
+        if not linea.endswith(b'\n'):
+            return
+        
+        primera = json.loads(linea)
+        if primera.get('tipo') != 'cabecera':
+            return
+        
+        if not self._coincide(primera):
+            raise ValueError(
+                f'{self.ruta} es de otro dataset (checksum {primera.get("checksum_csv")}, '
+                f'{primera.get("usuarios")} usuarios) y no se puede aplicar sobre el cargado'
+            )
+        self._posicion = len(linea)
+    
+    def rotar_si_ajeno(self):
+        """
+        Aparta el diario si su cabecera es de otro dataset, para que la
+        carga del dataset actual empiece con un diario vacío en lugar de
+        fallar o aplicar operaciones sobre usuarios equivocados.
+        
+        El diario ajeno se conserva como <nombre>.<fecha><extensión> y se
+        reemplaza por uno que solo tiene la cabecera del dataset cargado.
+        Los procesos que todavía sirven el dataset anterior lo detectan por
+        el cambio de archivo y rechazan la ingesta hasta recargar.
+        
+        Returns:
+            str: Ruta donde quedó el diario ajeno, o None si no se movió
+        """
+        if self.cabecera['checksum_csv'] is None or not os.path.exists(self.ruta):
+            return None
+        
+        with self._abierto('rb', fcntl.LOCK_EX) as archivo:
+            linea = archivo.readline()
+            if not linea.endswith(b'\n'):
+                return None
+            
+            primera = json.loads(linea)
+            if primera.get('tipo') != 'cabecera' or self._coincide(primera):
+                return None
+            
+            base, extension = os.path.splitext(self.ruta)
+            fecha = time.strftime('%Y%m%d-%H%M%S')
+            destino = f'{base}.{fecha}{extension}'
+            intento = 1
+            while os.path.exists(destino):
+                intento += 1
+                destino = f'{base}.{fecha}-{intento}{extension}'
+            
+            temporal = f'{self.ruta}.{os.getpid()}.tmp'
+            with open(temporal, 'wb') as nuevo:
+                nuevo.write(json.dumps(self.cabecera).encode('utf-8') + b'\n')
+            os.link(self.ruta, destino)
+            os.replace(temporal, self.ruta)
+        
+        return destino
+    
+    def _leer_nuevas(self, archivo):
+        self._verificar(archivo)
+        archivo.seek(self._posicion)
+        operaciones = []
+        for linea in archivo:
+            # Una línea sin salto final todavía se está escribiendo
+            if not linea.endswith(b'\n'):
+                break
+            self._posicion += len(linea)
+            if linea.strip():
+                operaciones.append(json.loads(linea))
+        return operaciones
+    
+    def sincronizar(self, aplicar):
+        """
+        Aplica las operaciones registradas desde la última lectura.
+        
+        Args:
+            aplicar (callable): Función que aplica una operación
+        
+        Returns:
+            int: Operaciones aplicadas
+        
+        Raises:
+            ValueError: Si el diario fue reemplazado o es de otro dataset
+                        (no se aplica nada)
+        """
+        if not os.path.exists(self.ruta):
+            return 0
+        
+        with self._abierto('rb', fcntl.LOCK_SH) as archivo:
+            operaciones = self._leer_nuevas(archivo)
+        
+        for operacion in operaciones:
+            aplicar(operacion)
+        self.operaciones_aplicadas += len(operaciones)
+        
+        return len(operaciones)
+    
+    def registrar(self, operacion, aplicar):
+        """
+        Aplica una operación y la agrega al diario.
+        
+        Con el archivo bloqueado, primero se aplican las operaciones de otros
+        procesos y luego la nueva, de modo que el orden es el mismo en todos.
+        Si aplicar lanza una excepción, la operación no se registra. Un
+        diario nuevo empieza con la cabecera del dataset cargado.
+        
+        Returns:
+            Lo que retorne aplicar(operacion)
+        
+        Raises:
+            ValueError: Si el diario fue reemplazado o es de otro dataset
+                        (no se aplica ni se registra nada)
+        """
+        with self._abierto('a+b', fcntl.LOCK_EX) as archivo:
+            for anterior in self._leer_nuevas(archivo):
+                aplicar(anterior)
+                self.operaciones_aplicadas += 1
+            
+            resultado = aplicar(operacion)
+            
+            linea = json.dumps(operacion, ensure_ascii=False).encode('utf-8') + b'\n'
+            archivo.seek(0, os.SEEK_END)
+            if archivo.tell() == 0 and self.cabecera['checksum_csv'] is not None:
+                linea = json.dumps(self.cabecera).encode('utf-8') + b'\n' + linea
+            archivo.write(linea)
+            archivo.flush()
+            self._posicion = archivo.tell()
+            self.operaciones_aplicadas += 1
+        
+        return resultado
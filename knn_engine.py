@@ -16,9 +16,49 @@ JUSTIFICACIÓN:
 6. Computacionalmente eficiente
 """
 
+from collections import namedtuple
+
 import numpy as np
 
 
+# Resultado de una búsqueda de vecinos, compartido por la clasificación y
+# la recomendación para no recorrer el dataset dos veces por petición.
+#   - indices: np.array (k,) posiciones de los vecinos en la matriz
+#   - similitudes: np.array (k,) similitud de cada vecino
+#   - evaluaciones: np.array (k, n_canciones) filas de los vecinos
+Vecindario = namedtuple('Vecindario', ['indices', 'similitudes', 'evaluaciones'])
+
+# Agregados de los ratings (> 0) de cada usuario, para clasificar un
+# vecindario sin leer las filas de los vecinos. Ver calcular_agregados_usuarios.
+#   - evaluadas: np.array float64 (n_usuarios,) canciones evaluadas
+#   - sumas: np.array float64 (n_usuarios,) suma de los ratings
+#   - sumas_cuadrados: np.array float64 (n_usuarios,) suma de los cuadrados
+AgregadosUsuarios = namedtuple('AgregadosUsuarios', ['evaluadas', 'sumas', 'sumas_cuadrados'])
+
+# Matriz de usuarios en formato disperso CSR (solo evaluaciones > 0).
+#   - indptr: np.array (n_usuarios + 1,) inicio de cada fila en indices/datos
+#   - indices: np.array (nnz,) canción de cada evaluación
+#   - datos: np.array (nnz,) int8 con el rating (1-5)
+#   - shape: (n_usuarios, n_canciones)
+#   - normas: np.array (n_usuarios,) normas precalculadas
+# Ver construir_matriz_dispersa.
+MatrizDispersa = namedtuple('MatrizDispersa', ['indptr', 'indices', 'datos', 'shape', 'normas'])
+
+# Evaluaciones de un candidato en forma dispersa: solo las canciones que
+# evaluó, sin construir el vector de n_canciones valores.
+#   - indices: np.array (e,) canciones evaluadas, en orden ascendente y sin repetir
+#   - valores: np.array (e,) float con el rating de cada una (> 0)
+#   - n_canciones: número de canciones del dataset
+# calcular_similitudes, encontrar_k_vecinos, calcular_vecindario,
+# recomendar_desde_vecindario y recomendar_item_item lo aceptan en lugar del
+# vector denso. Ver construir_candidato_disperso.
+CandidatoDisperso = namedtuple('CandidatoDisperso', ['indices', 'valores', 'n_canciones'])
+
+# Filas de una matriz compacta (uint8) que se convierten a float32 a la vez
+# en los productos punto. Acota la memoria temporal a este número de filas.
+FILAS_POR_BLOQUE_COMPACTO = 4096
+
+
 def calcular_similitud_coseno(vector_a, vector_b):
     """
     Calcula la similitud del coseno entre dos vectores de evaluaciones.
@@ -72,25 +112,167 @@ def calcular_similitud_coseno(vector_a, vector_b):
     return similitud
 
 
-def encontrar_k_vecinos(candidato, matriz_usuarios, k=10):
+def calcular_normas(matriz_usuarios, dtype=np.float64):
+    """
+    Precalcula la norma euclidiana de cada fila de la matriz de usuarios.
+    
+    Las normas solo dependen del dataset, así que se calculan una vez al
+    cargarlo y se reutilizan en cada petición en lugar de recalcularlas
+    por cada par (candidato, usuario).
+    
+    Args:
+        matriz_usuarios (np.array | MatrizDispersa): Matriz con todos los usuarios
+                                   Dimensión: (n_usuarios, n_canciones)
+        dtype: Tipo de las normas (float64 por defecto, float32 para el
+               almacenamiento compacto)
+    
+    Returns:
+        np.array: Norma de cada usuario. Dimensión: (n_usuarios,)
+    
+    Complejidad:
+        O(n × m) una sola vez al cargar el dataset
+    """
+    if isinstance(matriz_usuarios, MatrizDispersa):
+        return matriz_usuarios.normas
+    
+    if matriz_usuarios.dtype.kind in 'ui':
+        # Ratings enteros: sumas de cuadrados exactas, por bloques de filas
+        # para no crear una copia completa de la matriz
+        sumas = np.zeros(matriz_usuarios.shape[0], dtype=np.int64)
+        for inicio in range(0, matriz_usuarios.shape[0], FILAS_POR_BLOQUE_COMPACTO):
+            bloque = matriz_usuarios[inicio:inicio + FILAS_POR_BLOQUE_COMPACTO].astype(np.int32)
+            sumas[inicio:inicio + len(bloque)] = np.sum(bloque * bloque, axis=1)
+        return np.sqrt(sumas).astype(dtype)
+    
+    return np.sqrt(np.sum(matriz_usuarios ** 2, axis=1)).astype(dtype, copy=False)
+
+
+def calcular_similitudes(candidato, matriz_usuarios, normas=None):
+    """
+    Calcula la similitud del coseno entre el candidato y todos los usuarios.
+    
+    Versión vectorizada de calcular_similitud_coseno: en lugar de recorrer
+    la matriz fila por fila, todos los productos punto se obtienen con un
+    único producto matriz-vector (BLAS).
+    
+    FÓRMULA:
+    similitudes = (M · c) / (||M_i|| × ||c||)
+    
+    Se mantiene la misma regla que calcular_similitud_coseno: si la norma
+    del candidato o la del usuario es 0, la similitud es 0.
+    
+    Args:
+        candidato (np.array | CandidatoDisperso): Vector de evaluaciones del nuevo usuario
+        matriz_usuarios (np.array | MatrizDispersa): Matriz con todos los usuarios
+        normas (np.array): Normas precalculadas con calcular_normas.
+                           Si es None se calculan en el momento.
+    
+    Returns:
+        np.array: Similitud con cada usuario. Dimensión: (n_usuarios,)
+    
+    Complejidad:
+        O(n × m) en una sola operación vectorizada
+        O(nnz) con una MatrizDispersa
+    """
+    if normas is None:
+        normas = calcular_normas(matriz_usuarios)
+    
+    # Paso 1: Productos punto con todos los usuarios a la vez
+    productos_punto = _productos_punto(matriz_usuarios, candidato)
+    
+    # Paso 2: Norma del candidato (en la misma precisión que las normas)
+    valores = candidato.valores if isinstance(candidato, CandidatoDisperso) else candidato
+    norma_candidato = normas.dtype.type(np.sqrt(np.sum(valores ** 2)))
+    
+    # Paso 3: Dividir solo donde ambas normas son distintas de cero
+    similitudes = np.zeros(matriz_usuarios.shape[0])
+    if norma_candidato == 0:
+        return similitudes
+    
+    validos = normas != 0
+    np.divide(productos_punto, norma_candidato * normas,
+              out=similitudes, where=validos)
+    
+    return similitudes
+
+
+def _productos_punto(matriz_usuarios, candidatos):
+    """
+    Productos punto entre los usuarios y uno o varios candidatos.
+    
+    Retorna (n_usuarios,) para un vector y (n_candidatos, n_usuarios) para
+    una matriz de candidatos, sea la matriz de usuarios densa o dispersa.
+    Con un CandidatoDisperso solo se leen las columnas que evaluó.
+    """
+    if isinstance(candidatos, CandidatoDisperso):
+        return productos_punto_candidato_disperso(matriz_usuarios, candidatos)
+    
+    if isinstance(matriz_usuarios, MatrizDispersa):
+        if candidatos.ndim == 1:
+            return productos_punto_dispersos(matriz_usuarios, candidatos)
+        return np.stack([productos_punto_dispersos(matriz_usuarios, c) for c in candidatos])
+    
+    if matriz_usuarios.dtype.kind in 'ui':
+        return productos_punto_compactos(matriz_usuarios, candidatos)
+    
+    if candidatos.ndim == 1:
+        return matriz_usuarios @ candidatos
+    return candidatos @ matriz_usuarios.T
+
+
+def _extraer_filas(matriz_usuarios, filas):
+    """Filas densas (float) de los usuarios indicados, sea la matriz densa o dispersa."""
+    if isinstance(matriz_usuarios, MatrizDispersa):
+        return extraer_filas_dispersas(matriz_usuarios, filas)
+    
+    return matriz_usuarios[filas].astype(float, copy=False)
+
+
+def _seleccionar_top_k(valores, k):
+    """
+    Retorna los índices de los k valores más altos en orden descendente.
+    
+    Usa np.argpartition (O(n)) para aislar los candidatos y solo ordena
+    esos k elementos. Los empates se resuelven a favor del índice mayor,
+    igual que un ordenamiento estable invertido (np.argsort(...)[::-1]).
+    """
+    n = valores.shape[0]
+    k = min(k, n)
+    
+    if k <= 0:
+        return np.zeros(0, dtype=np.intp)
+    
+    if k < n:
+        # Umbral: k-ésimo valor más alto. Se incluyen todos los empatados
+        # con el umbral para que el desempate no dependa de la partición.
+        umbral = valores[np.argpartition(valores, n - k)[n - k]]
+        candidatos = np.flatnonzero(valores >= umbral)
+    else:
+        candidatos = np.arange(n)
+    
+    # Orden: valor descendente, luego índice descendente
+    orden = np.lexsort((-candidatos, -valores[candidatos]))
+    
+    return candidatos[orden[:k]]
+
+
+def encontrar_k_vecinos(candidato, matriz_usuarios, k=10, normas=None):
     """
     Encuentra los K usuarios más similares al candidato.
     
     ALGORITMO:
-    1. Calcular similitud del coseno entre candidato y cada usuario
-    2. Ordenar usuarios por similitud (descendente)
-    3. Seleccionar los K más similares
-    
-    PROCESO:
-    Para cada usuario i en el dataset:
-        similitud[i] = calcular_similitud_coseno(candidato, usuario[i])
+    1. Calcular similitud del coseno entre candidato y todos los usuarios
+       (un solo producto matriz-vector con normas precalculadas)
+    2. Seleccionar los K más similares con selección parcial (argpartition)
+    3. Ordenar solo esos K por similitud (descendente)
     
     Args:
-        candidato (np.array): Vector de evaluaciones del nuevo usuario
-                             Dimensión: (n_canciones,)
+        candidato (np.array | CandidatoDisperso): Vector de evaluaciones del
+                             nuevo usuario. Dimensión: (n_canciones,)
         matriz_usuarios (np.array): Matriz con todos los usuarios
                                    Dimensión: (n_usuarios, n_canciones)
         k (int): Número de vecinos a retornar
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
     
     Returns:
         tuple: (indices_vecinos, similitudes_vecinos)
@@ -98,27 +280,138 @@ def encontrar_k_vecinos(candidato, matriz_usuarios, k=10):
                - similitudes: np.array con valores de similitud
     
     Complejidad:
-        O(n × m + n log n)
+        O(n × m + n + k log k)
         donde n = usuarios, m = canciones
+        O(n × e + n + k log k) con un CandidatoDisperso de e evaluaciones
     """
-    n_usuarios = matriz_usuarios.shape[0]
-    similitudes = np.zeros(n_usuarios)
-    
-    # Calcular similitud con cada usuario
-    for i in range(n_usuarios):
-        similitudes[i] = calcular_similitud_coseno(candidato, matriz_usuarios[i])
-    
-    # Ordenar por similitud (descendente)
-    indices_ordenados = np.argsort(similitudes)[::-1]
+    similitudes = calcular_similitudes(candidato, matriz_usuarios, normas)
     
     # Seleccionar top K
-    k_vecinos_indices = indices_ordenados[:k]
+    k_vecinos_indices = _seleccionar_top_k(similitudes, k)
     k_vecinos_similitudes = similitudes[k_vecinos_indices]
     
     return k_vecinos_indices, k_vecinos_similitudes
 
 
-def clasificar_usuario(candidato, matriz_usuarios, k=10):
+def calcular_vecindario(candidato, matriz_usuarios, k=10, normas=None, vecinos=None):
+    """
+    Encuentra los K vecinos del candidato y extrae sus evaluaciones.
+    
+    El vecindario resultante contiene todo lo que necesitan
+    clasificar_vecindario y recomendar_desde_vecindario, de modo que una
+    petición que clasifica y recomienda hace una sola búsqueda de vecinos.
+    
+    Args:
+        candidato (np.array | CandidatoDisperso): Vector de evaluaciones
+        matriz_usuarios (np.array): Matriz de usuarios
+        k (int): Número de vecinos
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
+        vecinos (tuple): (indices, similitudes) ya calculados, p. ej. en un
+                         microlote (opcional)
+    
+    Returns:
+        Vecindario: (indices, similitudes, evaluaciones)
+    """
+    if vecinos is None:
+        vecinos = encontrar_k_vecinos(candidato, matriz_usuarios, k, normas)
+    indices_vecinos, similitudes = vecinos
+    
+    return Vecindario(indices_vecinos, similitudes,
+                      _extraer_filas(matriz_usuarios, indices_vecinos))
+
+
+def calcular_agregados_usuarios(matriz_usuarios):
+    """
+    Canciones evaluadas, suma y suma de cuadrados de los ratings de cada usuario.
+    
+    Se calculan una vez por dataset (la ingesta los mantiene al día, ver
+    ingesta.MatrizCreciente) y reemplazan en clasificar_vecindario el
+    recorrido de las k × m evaluaciones de los vecinos.
+    
+    Args:
+        matriz_usuarios (np.array): Matriz de usuarios (densa, compacta o dispersa)
+    
+    Returns:
+        AgregadosUsuarios
+    
+    Complejidad:
+        O(n × m) una sola vez, en bloques de filas
+    """
+    n_usuarios = matriz_usuarios.shape[0]
+    agregados = AgregadosUsuarios(np.zeros(n_usuarios), np.zeros(n_usuarios), np.zeros(n_usuarios))
+    
+    for filas, bloque in _bloques_filas(matriz_usuarios):
+        bloque = np.where(bloque > 0, bloque, 0)
+        agregados.evaluadas[filas] = np.count_nonzero(bloque, axis=1)
+        agregados.sumas[filas] = np.sum(bloque, axis=1)
+        agregados.sumas_cuadrados[filas] = np.sum(bloque * bloque, axis=1)
+    
+    return agregados
+
+
+def estadisticas_vecindario(agregados, indices_vecinos):
+    """
+    Rating promedio, desviación estándar y canciones evaluadas promedio de
+    un vecindario a partir de los agregados de sus usuarios.
+    
+    Con N = Σ evaluadas, S = Σ sumas y Q = Σ sumas_cuadrados:
+        promedio = S / N
+        desviación = √(N·Q − S²) / N
+    Con ratings enteros N, S y Q son exactos, así que el promedio coincide
+    con np.mean de las evaluaciones y la desviación con np.std salvo el
+    redondeo de la última cifra.
+    
+    Args:
+        agregados (AgregadosUsuarios): Resultado de calcular_agregados_usuarios
+        indices_vecinos (np.array): Posiciones de los k vecinos
+    
+    Returns:
+        tuple: (promedio_rating, desviacion_rating, canciones_evaluadas_promedio)
+    
+    Complejidad:
+        O(k)
+    """
+    evaluadas = np.sum(agregados.evaluadas[indices_vecinos])
+    suma = np.sum(agregados.sumas[indices_vecinos])
+    suma_cuadrados = np.sum(agregados.sumas_cuadrados[indices_vecinos])
+    
+    if evaluadas > 0:
+        promedio_rating = suma / evaluadas
+        desviacion_rating = np.sqrt(max(evaluadas * suma_cuadrados - suma * suma, 0)) / evaluadas
+    else:
+        promedio_rating = 0
+        desviacion_rating = 0
+    
+    return promedio_rating, desviacion_rating, evaluadas / len(indices_vecinos)
+
+
+def clasificar_usuario(candidato, matriz_usuarios, k=10, normas=None, agregados=None):
+    """
+    Clasifica un usuario en una categoría según su vecindario.
+    
+    Atajo de calcular_vecindario + clasificar_vecindario. Con los agregados
+    de los usuarios no se extraen las filas de los vecinos.
+    
+    Args:
+        candidato (np.array | CandidatoDisperso): Vector de evaluaciones
+        matriz_usuarios (np.array): Matriz de usuarios
+        k (int): Número de vecinos a considerar
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
+        agregados (AgregadosUsuarios): Agregados de los usuarios (opcional)
+    
+    Returns:
+        dict: Ver clasificar_vecindario
+    """
+    if agregados is not None:
+        indices_vecinos, similitudes = encontrar_k_vecinos(candidato, matriz_usuarios, k, normas)
+        return clasificar_vecindario(Vecindario(indices_vecinos, similitudes, None), agregados)
+    
+    vecindario = calcular_vecindario(candidato, matriz_usuarios, k, normas)
+    
+    return clasificar_vecindario(vecindario)
+
+
+def clasificar_vecindario(vecindario, agregados=None):
     """
     Clasifica un usuario en una categoría según su vecindario.
     
@@ -140,10 +433,12 @@ def clasificar_usuario(candidato, matriz_usuarios, k=10):
     │ Exploradores       │ <3.0         │ ≤100 canciones  │
     └─────────────────────┴──────────────┴─────────────────┘
     
+    Con agregados (ver calcular_agregados_usuarios) las estadísticas salen
+    de O(k) lecturas y vecindario.evaluaciones no se usa (puede ser None).
+    
     Args:
-        candidato (np.array): Vector de evaluaciones
-        matriz_usuarios (np.array): Matriz de usuarios
-        k (int): Número de vecinos a considerar
+        vecindario (Vecindario): Resultado de calcular_vecindario
+        agregados (AgregadosUsuarios): Agregados de los usuarios (opcional)
     
     Returns:
         dict: {
@@ -156,24 +451,26 @@ def clasificar_usuario(candidato, matriz_usuarios, k=10):
             'similitud_promedio': float
         }
     """
-    # Encontrar K vecinos
-    indices_vecinos, similitudes = encontrar_k_vecinos(candidato, matriz_usuarios, k)
-    
-    # Extraer evaluaciones de vecinos
-    vecinos = matriz_usuarios[indices_vecinos]
+    indices_vecinos, similitudes, vecinos = vecindario
     
-    # Calcular estadísticas (solo evaluaciones válidas > 0)
-    evaluaciones_vecinos = vecinos[vecinos > 0]
+    if agregados is not None:
+        promedio_rating, desviacion_rating, canciones_evaluadas_vecinos = estadisticas_vecindario(
+            agregados, indices_vecinos
+        )
     
-    if len(evaluaciones_vecinos) > 0:
-        promedio_rating = np.mean(evaluaciones_vecinos)
-        desviacion_rating = np.std(evaluaciones_vecinos)
     else:
-        promedio_rating = 0
-        desviacion_rating = 0
-    
-    # Promedio de canciones evaluadas por vecinos
-    canciones_evaluadas_vecinos = np.mean(np.sum(vecinos > 0, axis=1))
+        # Calcular estadísticas (solo evaluaciones válidas > 0)
+        evaluaciones_vecinos = vecinos[vecinos > 0]
+        
+        if len(evaluaciones_vecinos) > 0:
+            promedio_rating = np.mean(evaluaciones_vecinos)
+            desviacion_rating = np.std(evaluaciones_vecinos)
+        else:
+            promedio_rating = 0
+            desviacion_rating = 0
+        
+        # Promedio de canciones evaluadas por vecinos
+        canciones_evaluadas_vecinos = np.mean(np.sum(vecinos > 0, axis=1))
     
     # Determinar categoría
     if promedio_rating >= 4.0:
@@ -204,19 +501,89 @@ def clasificar_usuario(candidato, matriz_usuarios, k=10):
 
 
 def recomendar_canciones(candidato, matriz_usuarios, nombres_canciones,
-                        k_vecinos=10, n_recomendaciones=10):
+                        k_vecinos=10, n_recomendaciones=10, normas=None):
+    """
+    Recomienda canciones usando filtrado colaborativo basado en usuario.
+    
+    Atajo de calcular_vecindario + recomendar_desde_vecindario.
+    
+    Args:
+        candidato (np.array | CandidatoDisperso): Vector de evaluaciones
+        matriz_usuarios (np.array): Matriz de usuarios
+        nombres_canciones (list): Lista de nombres
+        k_vecinos (int): Número de vecinos
+        n_recomendaciones (int): Cantidad a recomendar
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
+    
+    Returns:
+        list: Ver recomendar_desde_vecindario
+    """
+    vecindario = calcular_vecindario(candidato, matriz_usuarios, k_vecinos, normas)
+    
+    return recomendar_desde_vecindario(candidato, vecindario, nombres_canciones,
+                                       n_recomendaciones)
+
+
+def puntuar_canciones(candidato, vecindario):
+    """
+    Score predicho de cada canción que el candidato no evaluó (pasos 2 y 3
+    de recomendar_desde_vecindario).
+    
+    Args:
+        candidato (np.array | CandidatoDisperso): Vector de evaluaciones
+        vecindario (Vecindario): Resultado de calcular_vecindario
+    
+    Returns:
+        tuple: (canciones, scores, vecinos_evaluaron, rating_promedio)
+               - canciones: np.array con las posiciones no evaluadas
+               - scores: np.array Σ(rating × similitud) / Σ(similitud)
+               - vecinos_evaluaron: np.array vecinos que evaluaron cada una
+               - rating_promedio: np.array rating promedio de esos vecinos
+    """
+    _, similitudes, vecinos = vecindario
+    
+    # Canciones no evaluadas
+    canciones_no_evaluadas = np.flatnonzero(mascara_no_evaluadas(candidato))
+    
+    # Ratings de los vecinos solo para las canciones no evaluadas (k × u)
+    ratings_vecinos = vecinos[:, canciones_no_evaluadas]
+    mascara_evaluados = ratings_vecinos > 0
+    
+    # Agregados por canción para todas las canciones a la vez
+    vecinos_evaluaron = np.sum(mascara_evaluados, axis=0)
+    suma_ratings = np.sum(ratings_vecinos, axis=0)
+    suma_ponderada = np.sum(ratings_vecinos * similitudes[:, None], axis=0)
+    suma_similitudes = np.sum(mascara_evaluados * similitudes[:, None], axis=0)
+    
+    # Rating promedio de los vecinos que evaluaron cada canción
+    rating_promedio = np.zeros(len(canciones_no_evaluadas))
+    np.divide(suma_ratings, vecinos_evaluaron, out=rating_promedio,
+              where=vecinos_evaluaron > 0)
+    
+    # Score ponderado: Σ(rating × similitud) / Σ(similitud).
+    # Si las similitudes suman 0 se usa el promedio simple; si ningún
+    # vecino evaluó la canción el score es 0.
+    scores = rating_promedio.copy()
+    np.divide(suma_ponderada, suma_similitudes, out=scores,
+              where=suma_similitudes > 0)
+    
+    return canciones_no_evaluadas, scores, vecinos_evaluaron, rating_promedio
+
+
+def recomendar_desde_vecindario(candidato, vecindario, nombres_canciones,
+                                n_recomendaciones=10):
     """
     Recomienda canciones usando filtrado colaborativo basado en usuario.
     
     ALGORITMO DE RECOMENDACIÓN:
     
-    1. Identificar K vecinos más similares
+    1. Identificar K vecinos más similares (vecindario)
     2. Encontrar canciones no evaluadas por el candidato
-    3. Para cada canción:
+    3. Para todas las canciones a la vez (operaciones sobre la matriz k × m):
        a. Obtener ratings de vecinos que la evaluaron
        b. Calcular score ponderado por similitud
        c. Formula: Σ(rating × similitud) / Σ(similitud)
-    4. Ordenar por score y retornar top N
+    4. Seleccionar top N por score (selección parcial)
     
     VENTAJAS:
     ✓ Personalización basada en usuarios similares
@@ -235,10 +602,9 @@ def recomendar_canciones(candidato, matriz_usuarios, nombres_canciones,
           = 9.6 / 1.7 = 4.04
     
     Args:
-        candidato (np.array): Vector de evaluaciones
-        matriz_usuarios (np.array): Matriz de usuarios
+        candidato (np.array | CandidatoDisperso): Vector de evaluaciones
+        vecindario (Vecindario): Resultado de calcular_vecindario
         nombres_canciones (list): Lista de nombres
-        k_vecinos (int): Número de vecinos
         n_recomendaciones (int): Cantidad a recomendar
     
     Returns:
@@ -253,58 +619,1536 @@ def recomendar_canciones(candidato, matriz_usuarios, nombres_canciones,
     Complejidad:
         O(k × m) donde k = vecinos, m = canciones
     """
-    # Encontrar vecinos
-    indices_vecinos, similitudes = encontrar_k_vecinos(candidato, matriz_usuarios, k_vecinos)
-    vecinos = matriz_usuarios[indices_vecinos]
-    
-    # Canciones no evaluadas
-    canciones_no_evaluadas = np.where(candidato == 0)[0]
+    canciones_no_evaluadas, scores, vecinos_evaluaron, rating_promedio = puntuar_canciones(
+        candidato, vecindario
+    )
     
     if len(canciones_no_evaluadas) == 0:
         return []
     
-    # Calcular scores
-    scores = np.zeros(len(canciones_no_evaluadas))
-    
-    for idx, cancion_idx in enumerate(canciones_no_evaluadas):
-        ratings_vecinos = vecinos[:, cancion_idx]
-        mascara_evaluados = ratings_vecinos > 0
-        
-        if np.any(mascara_evaluados):
-            # Score ponderado
-            ratings_ponderados = ratings_vecinos[mascara_evaluados] * similitudes[mascara_evaluados]
-            suma_similitudes = np.sum(similitudes[mascara_evaluados])
-            
-            if suma_similitudes > 0:
-                scores[idx] = np.sum(ratings_ponderados) / suma_similitudes
-            else:
-                scores[idx] = np.mean(ratings_vecinos[mascara_evaluados])
-        else:
-            scores[idx] = 0
-    
-    # Ordenar y seleccionar top N
-    indices_ordenados = np.argsort(scores)[::-1]
-    top_n = min(n_recomendaciones, len(indices_ordenados))
+    # Seleccionar top N con selección parcial
+    top_n = _seleccionar_top_k(scores, n_recomendaciones)
     
     # Construir lista de recomendaciones
     recomendaciones = []
-    for i in range(top_n):
-        idx_score = indices_ordenados[i]
+    for idx_score in top_n:
         idx_cancion = canciones_no_evaluadas[idx_score]
         
-        ratings_vecinos = vecinos[:, idx_cancion]
-        vecinos_evaluaron = np.sum(ratings_vecinos > 0)
-        
-        if vecinos_evaluaron > 0:
-            rating_prom = float(np.mean(ratings_vecinos[ratings_vecinos > 0]))
-        else:
-            rating_prom = 0.0
-        
         recomendaciones.append({
             'cancion': nombres_canciones[idx_cancion],
             'score_predicho': float(scores[idx_score]),
-            'vecinos_que_evaluaron': int(vecinos_evaluaron),
-            'rating_promedio_vecinos': rating_prom
+            'vecinos_que_evaluaron': int(vecinos_evaluaron[idx_score]),
+            'rating_promedio_vecinos': float(rating_promedio[idx_score])
         })
     
-    return recomendaciones
\ No newline at end of file
+    return recomendaciones
+
+
+# ============================================================================
+# ALMACENAMIENTO COMPACTO (uint8 / float32)
+# ============================================================================
+#
+# Los ratings son enteros entre 0 y 5, así que caben en un byte: la matriz
+# ocupa 8 veces menos que en float64. Los productos punto se hacen en
+# float32 por bloques de filas; como los ratings son enteros, las sumas son
+# exactas mientras no superen 2^24 (más de 600.000 canciones evaluadas con 5).
+# La precisión final de la similitud la fija el tipo de las normas.
+
+def construir_matriz_compacta(matriz_usuarios):
+    """
+    Convierte la matriz de ratings a uint8.
+    
+    Args:
+        matriz_usuarios (np.array): Matriz (n_usuarios, n_canciones) con
+                                   ratings enteros entre 0 y 5
+    
+    Returns:
+        tuple: (matriz_compacta, normas)
+               - matriz_compacta: np.array uint8
+               - normas: np.array float32 con la norma de cada usuario
+    """
+    matriz_compacta = np.clip(matriz_usuarios, 0, 5).astype(np.uint8)
+    
+    return matriz_compacta, calcular_normas(matriz_compacta, dtype=np.float32)
+
+
+def productos_punto_compactos(matriz_compacta, candidatos):
+    """
+    Productos punto entre una matriz uint8 y uno o varios candidatos.
+    
+    La matriz se convierte a float32 de a FILAS_POR_BLOQUE_COMPACTO filas,
+    de modo que nunca existe una copia en punto flotante de toda la matriz.
+    
+    Args:
+        matriz_compacta (np.array): Matriz uint8 (n_usuarios, n_canciones)
+        candidatos (np.array): Vector (n_canciones,) o matriz
+                               (n_candidatos, n_canciones)
+    
+    Returns:
+        np.array: (n_usuarios,) o (n_candidatos, n_usuarios) en float32
+    
+    Complejidad:
+        O(n × m) por candidato, con memoria extra O(bloque × m)
+    """
+    candidatos = candidatos.astype(np.float32)
+    n_usuarios = matriz_compacta.shape[0]
+    
+    if candidatos.ndim == 1:
+        productos_punto = np.zeros(n_usuarios, dtype=np.float32)
+    else:
+        productos_punto = np.zeros((candidatos.shape[0], n_usuarios), dtype=np.float32)
+    
+    for inicio in range(0, n_usuarios, FILAS_POR_BLOQUE_COMPACTO):
+        fin = min(inicio + FILAS_POR_BLOQUE_COMPACTO, n_usuarios)
+        bloque = matriz_compacta[inicio:fin].astype(np.float32)
+        
+        if candidatos.ndim == 1:
+            productos_punto[inicio:fin] = bloque @ candidatos
+        else:
+            productos_punto[:, inicio:fin] = candidatos @ bloque.T
+    
+    return productos_punto
+
+
+# ============================================================================
+# CANDIDATOS DISPERSOS
+# ============================================================================
+#
+# El frontend pide unas 10 evaluaciones y el catálogo puede tener miles de
+# canciones: el vector denso del candidato es casi todo ceros. Con un
+# CandidatoDisperso los productos punto solo leen las columnas evaluadas
+# de la matriz de usuarios:
+#
+#     M · c = M[:, indices] · valores
+#
+# Los ratings son enteros, así que las sumas son exactas y las
+# similitudes coinciden con las del vector denso.
+
+def construir_candidato_disperso(indices, valores, n_canciones):
+    """
+    Crea un CandidatoDisperso a partir de pares (canción, rating).
+    
+    Las evaluaciones con rating 0 se descartan (equivalen a no evaluar).
+    
+    Args:
+        indices (array-like): Posición de cada canción evaluada
+        valores (array-like): Rating de cada canción
+        n_canciones (int): Número de canciones del dataset
+    
+    Returns:
+        CandidatoDisperso: Con los índices en orden ascendente
+    
+    Raises:
+        ValueError: Si las longitudes no coinciden, hay índices fuera de
+                    rango o canciones repetidas
+    """
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    valores = np.asarray(valores, dtype=float).ravel()
+    
+    if len(indices) != len(valores):
+        raise ValueError('canciones y valores deben tener la misma longitud')
+    
+    if np.any((indices < 0) | (indices >= n_canciones)):
+        raise ValueError(f'Los índices de canción deben estar entre 0 y {n_canciones - 1}')
+    
+    orden = np.argsort(indices, kind='stable')
+    indices, valores = indices[orden], valores[orden]
+    
+    if np.any(indices[1:] == indices[:-1]):
+        raise ValueError('Hay canciones repetidas')
+    
+    evaluadas = valores != 0
+    return CandidatoDisperso(indices[evaluadas].astype(np.intp), valores[evaluadas],
+                             int(n_canciones))
+
+
+def mascara_no_evaluadas(candidato):
+    """np.array bool (n_canciones,) con True en las canciones sin evaluar."""
+    if isinstance(candidato, CandidatoDisperso):
+        mascara = np.ones(candidato.n_canciones, dtype=bool)
+        mascara[candidato.indices] = False
+        return mascara
+    
+    return candidato == 0
+
+
+def densificar(candidato):
+    """Vector denso (n_canciones,) del candidato (sin copia si ya es denso)."""
+    if isinstance(candidato, CandidatoDisperso):
+        vector = np.zeros(candidato.n_canciones)
+        vector[candidato.indices] = candidato.valores
+        return vector
+    
+    return candidato
+
+
+def productos_punto_candidato_disperso(matriz_usuarios, candidato):
+    """
+    Producto punto de un CandidatoDisperso con cada usuario.
+    
+    Args:
+        matriz_usuarios (np.array | MatrizDispersa): Matriz de usuarios
+        candidato (CandidatoDisperso): Evaluaciones del candidato
+    
+    Returns:
+        np.array: Producto punto con cada usuario. Dimensión: (n_usuarios,)
+    
+    Complejidad:
+        O(n × e) donde e = canciones evaluadas por el candidato
+        O(nnz + m) con una MatrizDispersa (que ya recorre solo sus evaluaciones)
+    """
+    if isinstance(matriz_usuarios, MatrizDispersa):
+        return productos_punto_dispersos(matriz_usuarios, densificar(candidato))
+    
+    columnas = matriz_usuarios[:, candidato.indices]
+    
+    if matriz_usuarios.dtype.kind in 'ui':
+        return productos_punto_compactos(columnas, candidato.valores)
+    
+    return columnas @ candidato.valores
+
+
+# ============================================================================
+# ALMACENAMIENTO DISPERSO (CSR)
+# ============================================================================
+#
+# La mayoría de las celdas de la matriz de ratings son 0. En formato CSR
+# solo se guardan las evaluaciones (int8) y su columna, y los productos
+# punto recorren únicamente esas celdas. calcular_similitudes,
+# encontrar_k_vecinos, calcular_vecindario, clasificar_usuario,
+# recomendar_canciones y las funciones por lotes aceptan una
+# MatrizDispersa en lugar de la matriz densa.
+
+def construir_matriz_dispersa(matriz_usuarios):
+    """
+    Convierte la matriz densa de ratings al formato disperso CSR.
+    
+    ESTRUCTURA:
+    Para el usuario i, sus evaluaciones están en
+    datos[indptr[i]:indptr[i+1]] y las canciones correspondientes en
+    indices[indptr[i]:indptr[i+1]].
+    
+    EJEMPLO:
+    [[5, 0, 3],        indptr  = [0, 2, 3]
+     [0, 4, 0]]   →    indices = [0, 2, 1]
+                       datos   = [5, 3, 4]
+    
+    Args:
+        matriz_usuarios (np.array): Matriz densa (n_usuarios, n_canciones)
+                                   con ratings enteros entre 0 y 5
+    
+    Returns:
+        MatrizDispersa: Matriz CSR con normas precalculadas
+    
+    Complejidad:
+        O(n × m) una sola vez al cargar el dataset
+    """
+    n_usuarios, n_canciones = matriz_usuarios.shape
+    filas, columnas = np.nonzero(matriz_usuarios > 0)
+    
+    indptr = np.zeros(n_usuarios + 1, dtype=np.int64)
+    np.cumsum(np.bincount(filas, minlength=n_usuarios), out=indptr[1:])
+    
+    # Índices de columna en el tipo entero más pequeño posible
+    tipo_indices = np.uint16 if n_canciones <= np.iinfo(np.uint16).max else np.int32
+    indices = columnas.astype(tipo_indices)
+    datos = matriz_usuarios[filas, columnas].astype(np.int8)
+    
+    return MatrizDispersa(indptr, indices, datos, (n_usuarios, n_canciones),
+                          calcular_normas(matriz_usuarios))
+
+
+def productos_punto_dispersos(matriz_dispersa, candidato):
+    """
+    Producto punto del candidato con cada usuario de una MatrizDispersa.
+    
+    Solo se multiplican las celdas evaluadas: para cada evaluación se toma
+    el rating del candidato en esa canción y las sumas por fila se hacen
+    con np.add.reduceat sobre los segmentos de indptr.
+    
+    Args:
+        matriz_dispersa (MatrizDispersa): Matriz de usuarios
+        candidato (np.array): Vector denso de evaluaciones (n_canciones,)
+    
+    Returns:
+        np.array: Producto punto con cada usuario. Dimensión: (n_usuarios,)
+    
+    Complejidad:
+        O(nnz) donde nnz = evaluaciones en el dataset
+    """
+    indptr = matriz_dispersa.indptr
+    productos = matriz_dispersa.datos * candidato[matriz_dispersa.indices]
+    
+    productos_punto = np.zeros(matriz_dispersa.shape[0])
+    
+    # reduceat no admite segmentos vacíos: solo se suman filas con datos
+    filas_con_datos = indptr[:-1] < indptr[1:]
+    if np.any(filas_con_datos):
+        productos_punto[filas_con_datos] = np.add.reduceat(
+            productos, indptr[:-1][filas_con_datos]
+        )
+    
+    return productos_punto
+
+
+def calcular_similitudes_dispersas(candidato, matriz_dispersa):
+    """
+    Similitud del coseno del candidato con todos los usuarios de una
+    MatrizDispersa, usando sus normas precalculadas.
+    
+    Args:
+        candidato (np.array): Vector denso de evaluaciones (n_canciones,)
+        matriz_dispersa (MatrizDispersa): Matriz de usuarios
+    
+    Returns:
+        np.array: Similitud con cada usuario. Dimensión: (n_usuarios,)
+    """
+    return calcular_similitudes(candidato, matriz_dispersa, matriz_dispersa.normas)
+
+
+def extraer_filas_dispersas(matriz_dispersa, filas):
+    """
+    Reconstruye en forma densa las filas indicadas de una MatrizDispersa.
+    
+    Se usa para obtener las evaluaciones de los K vecinos, que luego se
+    procesan igual que con la matriz densa.
+    
+    Args:
+        matriz_dispersa (MatrizDispersa): Matriz de usuarios
+        filas (np.array): Índices de los usuarios a extraer
+    
+    Returns:
+        np.array: Matriz densa (len(filas), n_canciones) de tipo float
+    """
+    filas = np.asarray(filas)
+    resultado = np.zeros((len(filas), matriz_dispersa.shape[1]))
+    
+    inicios = matriz_dispersa.indptr[filas]
+    longitudes = matriz_dispersa.indptr[filas + 1] - inicios
+    
+    # Posición en indices/datos de cada evaluación de las filas pedidas
+    desplazamientos = np.repeat(inicios - np.cumsum(longitudes) + longitudes, longitudes)
+    posiciones = desplazamientos + np.arange(np.sum(longitudes))
+    filas_destino = np.repeat(np.arange(len(filas)), longitudes)
+    
+    resultado[filas_destino, matriz_dispersa.indices[posiciones]] = \
+        matriz_dispersa.datos[posiciones]
+    
+    return resultado
+
+
+# ============================================================================
+# PROCESAMIENTO POR LOTES
+# ============================================================================
+
+def encontrar_k_vecinos_lote(candidatos, matriz_usuarios, k=10, normas=None,
+                             tamano_bloque=256):
+    """
+    Encuentra los K vecinos de muchos candidatos a la vez.
+    
+    ALGORITMO:
+    1. Dividir los candidatos en bloques de `tamano_bloque` filas
+    2. Para cada bloque, calcular todas las similitudes con un único
+       producto de matrices (BLAS): S = C · Mᵀ / (||C_j|| × ||M_i||)
+    3. Seleccionar los K mayores de cada fila con argpartition
+    
+    El tamaño del bloque acota la memoria: la matriz temporal de
+    similitudes ocupa tamano_bloque × n_usuarios valores.
+    
+    Los resultados son idénticos a llamar encontrar_k_vecinos con cada
+    candidato por separado.
+    
+    Args:
+        candidatos (np.array): Matriz de evaluaciones de los candidatos
+                              Dimensión: (n_candidatos, n_canciones)
+        matriz_usuarios (np.array): Matriz con todos los usuarios
+                                   Dimensión: (n_usuarios, n_canciones)
+        k (int): Número de vecinos a retornar por candidato
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
+        tamano_bloque (int): Candidatos procesados por producto de matrices
+    
+    Returns:
+        tuple: (indices_vecinos, similitudes_vecinos)
+               - indices: np.array (n_candidatos, k)
+               - similitudes: np.array (n_candidatos, k)
+    
+    Complejidad:
+        O(c × n × m) en c / tamano_bloque productos de matrices
+        donde c = candidatos, n = usuarios, m = canciones
+    """
+    if normas is None:
+        normas = calcular_normas(matriz_usuarios)
+    
+    n_candidatos = candidatos.shape[0]
+    k = min(k, matriz_usuarios.shape[0])
+    tamano_bloque = max(1, int(tamano_bloque))
+    
+    indices = np.zeros((n_candidatos, k), dtype=np.intp)
+    similitudes = np.zeros((n_candidatos, k))
+    
+    for inicio in range(0, n_candidatos, tamano_bloque):
+        bloque = candidatos[inicio:inicio + tamano_bloque]
+        
+        # Paso 1: Productos punto de todo el bloque con todos los usuarios
+        productos_punto = _productos_punto(matriz_usuarios, bloque)
+        
+        # Paso 2: Normas de los candidatos del bloque
+        normas_bloque = np.sqrt(np.sum(bloque ** 2, axis=1)).astype(normas.dtype)
+        
+        # Paso 3: Misma regla de normas nulas que calcular_similitud_coseno
+        similitudes_bloque = np.zeros(productos_punto.shape)
+        validos = (normas_bloque[:, None] != 0) & (normas[None, :] != 0)
+        np.divide(productos_punto, normas_bloque[:, None] * normas[None, :],
+                  out=similitudes_bloque, where=validos)
+        
+        # Paso 4: Top K por candidato
+        for fila, similitudes_fila in enumerate(similitudes_bloque):
+            top_k = _seleccionar_top_k(similitudes_fila, k)
+            indices[inicio + fila] = top_k
+            similitudes[inicio + fila] = similitudes_fila[top_k]
+    
+    return indices, similitudes
+
+
+def clasificar_usuarios_lote(candidatos, matriz_usuarios, k=10, normas=None,
+                             tamano_bloque=256, agregados=None):
+    """
+    Clasifica muchos candidatos con una sola búsqueda de vecinos por lotes.
+    
+    Args:
+        candidatos (np.array): Matriz (n_candidatos, n_canciones)
+        matriz_usuarios (np.array): Matriz de usuarios
+        k (int): Número de vecinos a considerar
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
+        tamano_bloque (int): Candidatos procesados por producto de matrices
+        agregados (AgregadosUsuarios): Agregados de los usuarios (opcional)
+    
+    Returns:
+        list: Un diccionario por candidato, con el mismo formato que
+              clasificar_usuario
+    """
+    indices, similitudes = encontrar_k_vecinos_lote(
+        candidatos, matriz_usuarios, k, normas, tamano_bloque
+    )
+    
+    return [
+        clasificar_vecindario(
+            Vecindario(indices[i], similitudes[i],
+                       None if agregados is not None else _extraer_filas(matriz_usuarios, indices[i])),
+            agregados
+        )
+        for i in range(candidatos.shape[0])
+    ]
+
+
+def recomendar_canciones_lote(candidatos, matriz_usuarios, nombres_canciones,
+                              k_vecinos=10, n_recomendaciones=10, normas=None,
+                              tamano_bloque=256, vecinos=None, agregados=None):
+    """
+    Clasifica y recomienda canciones a muchos candidatos a la vez.
+    
+    Los vecinos de cada candidato se calculan una sola vez (por lotes) y se
+    reutilizan para la clasificación y para las recomendaciones.
+    
+    Args:
+        candidatos (np.array): Matriz (n_candidatos, n_canciones)
+        matriz_usuarios (np.array): Matriz de usuarios
+        nombres_canciones (list): Lista de nombres
+        k_vecinos (int): Número de vecinos
+        n_recomendaciones (int): Cantidad a recomendar por candidato
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
+        tamano_bloque (int): Candidatos procesados por producto de matrices
+        vecinos (tuple): (indices, similitudes) ya calculados, p. ej. con la
+                         búsqueda particionada (opcional)
+        agregados (AgregadosUsuarios): Agregados de los usuarios para la
+                                       clasificación (opcional)
+    
+    Returns:
+        list: Un diccionario por candidato:
+        [{
+            'clasificacion': dict,     # formato de clasificar_usuario
+            'recomendaciones': list    # formato de recomendar_canciones
+        }, ...]
+    """
+    if vecinos is None:
+        vecinos = encontrar_k_vecinos_lote(
+            candidatos, matriz_usuarios, k_vecinos, normas, tamano_bloque
+        )
+    indices, similitudes = vecinos
+    
+    resultados = []
+    for i in range(candidatos.shape[0]):
+        vecindario = Vecindario(indices[i], similitudes[i],
+                                _extraer_filas(matriz_usuarios, indices[i]))
+        resultados.append({
+            'clasificacion': clasificar_vecindario(vecindario, agregados),
+            'recomendaciones': recomendar_desde_vecindario(
+                candidatos[i], vecindario, nombres_canciones, n_recomendaciones
+            )
+        })
+    
+    return resultados
+
+
+# ============================================================================
+# BÚSQUEDA APROXIMADA (LSH CON PROYECCIONES ALEATORIAS)
+# ============================================================================
+#
+# La búsqueda exacta recorre todos los usuarios en cada petición. El índice
+# LSH (locality-sensitive hashing) para similitud del coseno reduce ese
+# recorrido a los usuarios que caen en la misma cubeta que el candidato:
+#
+# - Cada tabla tiene n_bits hiperplanos aleatorios. La firma de un vector
+#   es el signo de su proyección sobre cada hiperplano (un bit por plano).
+# - Dos vectores con ángulo θ coinciden en cada bit con probabilidad
+#   1 - θ/π, así que los usuarios similares comparten cubeta con mayor
+#   probabilidad.
+# - Con varias tablas independientes y sondeo múltiple (también se visitan
+#   las cubetas que difieren en los bits más dudosos) se recupera la
+#   mayoría de los vecinos reales.
+# - Los candidatos recuperados se ordenan con la similitud del coseno
+#   exacta, así que las similitudes retornadas son exactas: lo único
+#   aproximado es el conjunto de usuarios que se examina.
+#
+# Más tablas o más sondas → mayor recall y más candidatos por consulta.
+# Más bits → cubetas más pequeñas, consultas más rápidas y menor recall.
+#
+# Los usuarios agregados o modificados después de construir el índice se
+# guardan como pendientes (marcar_pendientes_lsh) y se examinan en todas
+# las consultas hasta que consolidar_indice_lsh recalcula sus firmas.
+
+# Índice LSH construido con construir_indice_lsh.
+#   - planos: np.array float32 (n_tablas, n_bits, n_canciones)
+#   - codigos: np.array int64 (n_tablas, n_indexados) firmas ordenadas por tabla
+#   - orden: np.array (n_tablas, n_indexados) usuario de cada firma ordenada
+#   - pendientes: np.array ordenado de usuarios cuya firma está desactualizada
+IndiceLSH = namedtuple('IndiceLSH', ['planos', 'codigos', 'orden', 'pendientes'])
+
+
+def _firmas_lsh(proyecciones):
+    """
+    Convierte proyecciones (..., n_tablas, n_bits) en firmas enteras
+    (..., n_tablas): el bit b vale 1 si la proyección b es positiva.
+    """
+    pesos = np.left_shift(np.int64(1), np.arange(proyecciones.shape[-1], dtype=np.int64))
+    return (proyecciones > 0).astype(np.int64) @ pesos
+
+
+def construir_indice_lsh(matriz_usuarios, n_tablas=32, n_bits=10, semilla=0):
+    """
+    Construye el índice LSH de los usuarios.
+    
+    PROCESO:
+    1. Generar n_tablas × n_bits hiperplanos gaussianos
+    2. Proyectar los usuarios por bloques de filas y calcular su firma
+       en cada tabla
+    3. Ordenar los usuarios por firma en cada tabla, de modo que cada
+       cubeta es un rango contiguo que se encuentra con búsqueda binaria
+    
+    Args:
+        matriz_usuarios (np.array | MatrizDispersa): Matriz de usuarios
+        n_tablas (int): Tablas hash independientes
+        n_bits (int): Bits por firma (entre 1 y 62)
+        semilla (int): Semilla de los hiperplanos (índice reproducible)
+    
+    Returns:
+        IndiceLSH: (planos, codigos, orden, pendientes)
+    
+    Complejidad:
+        O(n × m × n_tablas × n_bits + n_tablas × n log n) una sola vez
+    """
+    if not 1 <= n_bits <= 62:
+        raise ValueError('n_bits debe estar entre 1 y 62')
+    if n_tablas < 1:
+        raise ValueError('n_tablas debe ser mayor que 0')
+    
+    n_usuarios, n_canciones = matriz_usuarios.shape
+    rng = np.random.default_rng(semilla)
+    planos = rng.standard_normal((n_tablas, n_bits, n_canciones)).astype(np.float32)
+    
+    firmas = _firmas_usuarios(planos, matriz_usuarios, np.arange(n_usuarios))
+    
+    tipo_orden = np.int32 if n_usuarios <= np.iinfo(np.int32).max else np.int64
+    orden = np.argsort(firmas, axis=1, kind='stable').astype(tipo_orden)
+    codigos = np.take_along_axis(firmas, orden, axis=1)
+    
+    return IndiceLSH(planos, codigos, orden, np.zeros(0, dtype=np.intp))
+
+
+def _firmas_usuarios(planos, matriz_usuarios, usuarios):
+    """Firmas (n_tablas, len(usuarios)) de los usuarios indicados, por bloques."""
+    n_tablas, n_bits, n_canciones = planos.shape
+    planos_planos = planos.reshape(n_tablas * n_bits, n_canciones)
+    
+    firmas = np.zeros((n_tablas, len(usuarios)), dtype=np.int64)
+    for inicio in range(0, len(usuarios), FILAS_POR_BLOQUE_COMPACTO):
+        filas = usuarios[inicio:inicio + FILAS_POR_BLOQUE_COMPACTO]
+        bloque = _extraer_filas(matriz_usuarios, filas).astype(np.float32)
+        proyecciones = (bloque @ planos_planos.T).reshape(len(filas), n_tablas, n_bits)
+        firmas[:, inicio:inicio + len(filas)] = _firmas_lsh(proyecciones).T
+    
+    return firmas
+
+
+def marcar_pendientes_lsh(indice, usuarios):
+    """
+    Registra usuarios agregados o modificados sin recalcular el índice.
+    
+    Los pendientes se examinan en todas las consultas (su firma guardada,
+    si existe, puede estar desactualizada), así que el índice sigue
+    encontrándolos. Costo O(p) con p = pendientes.
+    
+    Returns:
+        IndiceLSH: Nuevo índice (el original no se modifica)
+    """
+    pendientes = np.union1d(indice.pendientes, np.asarray(usuarios, dtype=np.intp))
+    
+    return indice._replace(pendientes=pendientes.astype(np.intp))
+
+
+def consolidar_indice_lsh(indice, matriz_usuarios):
+    """
+    Recalcula las firmas de los usuarios pendientes y las inserta en las tablas.
+    
+    Solo se proyectan los pendientes; las tablas se reconstruyen con una
+    mezcla de arreglos ya ordenados, sin reordenar a todos los usuarios.
+    
+    Args:
+        indice (IndiceLSH): Índice con usuarios pendientes
+        matriz_usuarios (np.array | MatrizDispersa): Matriz actual
+    
+    Returns:
+        IndiceLSH: Nuevo índice sin pendientes
+    
+    Complejidad:
+        O(p × m × n_tablas × n_bits + n_tablas × n)
+    """
+    pendientes = indice.pendientes
+    if len(pendientes) == 0:
+        return indice
+    
+    n_tablas = indice.planos.shape[0]
+    firmas_nuevas = _firmas_usuarios(indice.planos, matriz_usuarios, pendientes)
+    
+    n_usuarios = matriz_usuarios.shape[0]
+    tipo_orden = np.int32 if n_usuarios <= np.iinfo(np.int32).max else np.int64
+    codigos = np.zeros((n_tablas, n_usuarios), dtype=np.int64)
+    orden = np.zeros((n_tablas, n_usuarios), dtype=tipo_orden)
+    
+    for tabla in range(n_tablas):
+        # Quitar las firmas desactualizadas de los pendientes
+        vigentes = ~np.isin(indice.orden[tabla], pendientes)
+        codigos_tabla = indice.codigos[tabla][vigentes]
+        orden_tabla = indice.orden[tabla][vigentes]
+        
+        # Insertar las nuevas firmas en su posición ordenada
+        secuencia = np.argsort(firmas_nuevas[tabla], kind='stable')
+        nuevos_codigos = firmas_nuevas[tabla][secuencia]
+        posiciones = np.searchsorted(codigos_tabla, nuevos_codigos, side='right')
+        codigos[tabla] = np.insert(codigos_tabla, posiciones, nuevos_codigos)
+        orden[tabla] = np.insert(orden_tabla, posiciones, pendientes[secuencia])
+    
+    return IndiceLSH(indice.planos, codigos, orden, np.zeros(0, dtype=np.intp))
+
+
+def candidatos_lsh(indice, candidato, sondas=4):
+    """
+    Usuarios que comparten cubeta con el candidato en alguna tabla.
+    
+    Además de la cubeta del candidato, en cada tabla se visitan `sondas`
+    cubetas vecinas: las que resultan de invertir, uno a la vez, los bits
+    cuya proyección está más cerca de 0 (los más dudosos). Los usuarios
+    pendientes del índice siempre se incluyen.
+    
+    Args:
+        indice (IndiceLSH): Índice construido con construir_indice_lsh
+        candidato (np.array): Vector de evaluaciones (n_canciones,)
+        sondas (int): Cubetas adicionales por tabla (0 = solo la propia)
+    
+    Returns:
+        np.array: Índices de usuarios sin repetir, en orden ascendente
+    
+    Complejidad:
+        O(n_tablas × (n_bits × m + sondas × log n) + c log c)
+        donde c = candidatos recuperados
+    """
+    n_tablas, n_bits, _ = indice.planos.shape
+    proyecciones = indice.planos @ candidato.astype(np.float32)
+    firmas = _firmas_lsh(proyecciones)
+    
+    # Sondeo múltiple: firmas con un bit dudoso invertido
+    sondas = max(0, min(int(sondas), n_bits))
+    dudosos = np.argsort(np.abs(proyecciones), axis=1)[:, :sondas]
+    sondeos = np.concatenate(
+        [firmas[:, None], firmas[:, None] ^ np.left_shift(np.int64(1), dudosos)], axis=1
+    )
+    
+    encontrados = [indice.pendientes] if len(indice.pendientes) else []
+    for tabla in range(n_tablas):
+        codigos = indice.codigos[tabla]
+        inicios = np.searchsorted(codigos, sondeos[tabla], side='left')
+        finales = np.searchsorted(codigos, sondeos[tabla], side='right')
+        for inicio, final in zip(inicios, finales):
+            if final > inicio:
+                encontrados.append(indice.orden[tabla, inicio:final])
+    
+    if not encontrados:
+        return np.zeros(0, dtype=np.intp)
+    
+    encontrados = np.concatenate(encontrados)
+    n_usuarios = indice.codigos.shape[1]
+    if len(indice.pendientes):
+        n_usuarios = max(n_usuarios, int(indice.pendientes[-1]) + 1)
+    
+    # Con muchos candidatos, marcar en un arreglo de n_usuarios bytes es
+    # más barato que ordenar para quitar repetidos
+    if len(encontrados) * 16 > n_usuarios:
+        marcados = np.zeros(n_usuarios, dtype=bool)
+        marcados[encontrados] = True
+        return np.flatnonzero(marcados)
+    
+    return np.unique(encontrados).astype(np.intp)
+
+
+def encontrar_k_vecinos_aproximado(candidato, matriz_usuarios, indice, k=10,
+                                   normas=None, sondas=4):
+    """
+    Encuentra (aproximadamente) los K usuarios más similares al candidato.
+    
+    ALGORITMO:
+    1. Recuperar los usuarios de las cubetas del candidato (candidatos_lsh)
+    2. Calcular la similitud del coseno exacta solo con esos usuarios
+    3. Seleccionar los K más similares con _seleccionar_top_k
+    
+    Si el índice recupera menos de K usuarios, o el candidato no evaluó
+    ninguna canción, se usa la búsqueda exacta.
+    
+    Args:
+        candidato (np.array): Vector de evaluaciones (n_canciones,)
+        matriz_usuarios (np.array | MatrizDispersa): Matriz de usuarios
+        indice (IndiceLSH): Índice de los usuarios de la matriz
+        k (int): Número de vecinos a retornar
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
+        sondas (int): Cubetas adicionales por tabla
+    
+    Returns:
+        tuple: (indices_vecinos, similitudes_vecinos), igual que
+               encontrar_k_vecinos
+    
+    Complejidad:
+        O(c × m + c log c) donde c = usuarios recuperados (c ≪ n)
+    """
+    if not np.any(candidato):
+        return encontrar_k_vecinos(candidato, matriz_usuarios, k, normas)
+    
+    usuarios = candidatos_lsh(indice, candidato, sondas)
+    if len(usuarios) < min(k, matriz_usuarios.shape[0]):
+        return encontrar_k_vecinos(candidato, matriz_usuarios, k, normas)
+    
+    if normas is None:
+        normas = calcular_normas(matriz_usuarios)
+    normas_usuarios = normas[usuarios]
+    
+    # Misma fórmula y regla de normas nulas que calcular_similitudes; las
+    # filas recuperadas conservan su tipo (uint8 usa el producto compacto)
+    if isinstance(matriz_usuarios, MatrizDispersa):
+        productos_punto = extraer_filas_dispersas(matriz_usuarios, usuarios) @ candidato
+    else:
+        productos_punto = _productos_punto(matriz_usuarios[usuarios], candidato)
+    norma_candidato = normas.dtype.type(np.sqrt(np.sum(candidato ** 2)))
+    
+    similitudes = np.zeros(len(usuarios))
+    np.divide(productos_punto, norma_candidato * normas_usuarios,
+              out=similitudes, where=normas_usuarios != 0)
+    
+    # usuarios está en orden ascendente: el desempate por índice mayor
+    # coincide con el de la búsqueda exacta
+    top_k = _seleccionar_top_k(similitudes, k)
+    
+    return usuarios[top_k], similitudes[top_k]
+
+
+def calcular_vecindario_aproximado(candidato, matriz_usuarios, indice, k=10,
+                                   normas=None, sondas=4):
+    """
+    Igual que calcular_vecindario, pero buscando los vecinos con el índice LSH.
+    
+    Returns:
+        Vecindario: (indices, similitudes, evaluaciones)
+    """
+    indices_vecinos, similitudes = encontrar_k_vecinos_aproximado(
+        candidato, matriz_usuarios, indice, k, normas, sondas
+    )
+    
+    return Vecindario(indices_vecinos, similitudes,
+                      _extraer_filas(matriz_usuarios, indices_vecinos))
+
+
+# ============================================================================
+# FILTRADO COLABORATIVO ITEM-ITEM
+# ============================================================================
+#
+# El filtrado basado en usuario compara al candidato con todos los usuarios
+# en cada petición. El catálogo es mucho más pequeño que la base de
+# usuarios, así que en el modo item-item la similitud se calcula entre
+# canciones, una sola vez por dataset:
+#
+# - Dos canciones son similares si los mismos usuarios las evaluaron de
+#   forma parecida (coseno entre las columnas de la matriz).
+# - De cada canción se guardan solo sus M vecinas más similares, con
+#   índices uint16 y similitudes float32: m × M entradas en lugar de m².
+# - En la petición solo intervienen las canciones que el candidato evaluó:
+#   cada una aporta su rating, ponderado por la similitud, a sus M vecinas.
+#   El costo es O(evaluadas × M) y no depende del número de usuarios.
+#
+# La tabla refleja la matriz con la que se construyó: los ratings que
+# llegan por ingesta se incorporan al reconstruirla (recarga del dataset).
+
+# Vecinas más similares de cada canción (ver construir_vecinos_canciones).
+#   - indices: np.array (n_canciones, M) canciones vecinas, de mayor a
+#              menor similitud (uint16 si el catálogo cabe, int32 si no)
+#   - similitudes: np.array float32 (n_canciones, M) similitud de cada vecina
+VecinosCanciones = namedtuple('VecinosCanciones', ['indices', 'similitudes'])
+
+# Canciones (columnas) cuya similitud con todo el catálogo se calcula a la
+# vez. Acota la memoria temporal a n_canciones × este número de valores.
+COLUMNAS_POR_BLOQUE_ITEM = 1024
+
+
+def construir_vecinos_canciones(matriz_usuarios, m_vecinos=50):
+    """
+    Precalcula las M canciones más similares a cada canción.
+    
+    ALGORITMO:
+    1. Para cada bloque de columnas, acumular sobre bloques de filas el
+       producto R^T × R[:, bloque] (productos punto entre canciones)
+    2. Dividir por las normas de las columnas → similitud del coseno
+    3. Descartar la similitud de cada canción consigo misma y conservar
+       las M mayores por columna (selección parcial)
+    
+    Args:
+        matriz_usuarios (np.array | MatrizDispersa): Matriz de usuarios
+        m_vecinos (int): Vecinas que se guardan por canción
+    
+    Returns:
+        VecinosCanciones: (indices, similitudes)
+    
+    Complejidad:
+        O(n × m²) una sola vez; memoria O(m × M)
+    """
+    if m_vecinos < 1:
+        raise ValueError('m_vecinos debe ser mayor que 0')
+    
+    n_usuarios, n_canciones = matriz_usuarios.shape
+    m_vecinos = max(min(m_vecinos, n_canciones - 1), 0)
+    tipo_indice = np.uint16 if n_canciones <= np.iinfo(np.uint16).max + 1 else np.int32
+    
+    indices = np.zeros((n_canciones, m_vecinos), dtype=tipo_indice)
+    similitudes = np.zeros((n_canciones, m_vecinos), dtype=np.float32)
+    if m_vecinos == 0:
+        return VecinosCanciones(indices, similitudes)
+    
+    # Normas de las columnas (una pasada por bloques de filas)
+    sumas_cuadrados = np.zeros(n_canciones)
+    for inicio in range(0, n_usuarios, FILAS_POR_BLOQUE_COMPACTO):
+        filas = np.arange(inicio, min(inicio + FILAS_POR_BLOQUE_COMPACTO, n_usuarios))
+        bloque = _extraer_filas(matriz_usuarios, filas)
+        sumas_cuadrados += np.sum(bloque ** 2, axis=0)
+    normas = np.sqrt(sumas_cuadrados)
+    
+    for inicio_columnas in range(0, n_canciones, COLUMNAS_POR_BLOQUE_ITEM):
+        columnas = np.arange(inicio_columnas,
+                             min(inicio_columnas + COLUMNAS_POR_BLOQUE_ITEM, n_canciones))
+        
+        # Productos punto entre todas las canciones y las del bloque (m × b)
+        productos = np.zeros((n_canciones, len(columnas)))
+        for inicio in range(0, n_usuarios, FILAS_POR_BLOQUE_COMPACTO):
+            filas = np.arange(inicio, min(inicio + FILAS_POR_BLOQUE_COMPACTO, n_usuarios))
+            bloque = _extraer_filas(matriz_usuarios, filas)
+            productos += bloque.T @ bloque[:, columnas]
+        
+        denominadores = normas[:, None] * normas[columnas][None, :]
+        similitudes_bloque = np.zeros_like(productos)
+        np.divide(productos, denominadores, out=similitudes_bloque, where=denominadores != 0)
+        
+        # Una canción no es vecina de sí misma
+        similitudes_bloque[columnas, np.arange(len(columnas))] = -np.inf
+        
+        for j, columna in enumerate(columnas):
+            top = _seleccionar_top_k(similitudes_bloque[:, j], m_vecinos)
+            indices[columna] = top
+            similitudes[columna] = similitudes_bloque[top, j]
+    
+    return VecinosCanciones(indices, similitudes)
+
+
+def recomendar_item_item(candidato, vecinos_canciones, nombres_canciones,
+                         n_recomendaciones=10):
+    """
+    Recomienda canciones usando filtrado colaborativo basado en ítems.
+    
+    ALGORITMO:
+    1. Tomar solo las canciones que el candidato evaluó
+    2. Cada una reparte su rating entre sus M vecinas, sobre las
+       canciones evaluadas i que tienen a j entre sus vecinas:
+       evidencia[j] = Σ(rating_i × sim(i, j))
+       score[j] = evidencia[j] / Σ(sim(i, j))
+    3. Descartar las canciones ya evaluadas y seleccionar top N por
+       evidencia (selección parcial)
+    
+    El orden usa la evidencia y no el score: una canción similar a una
+    sola canción evaluada con 5 tendría score 5.0 y desplazaría a otras
+    respaldadas por muchas canciones del candidato.
+    
+    EJEMPLO:
+    Candidato evaluó A=5 y B=3. Vecinas guardadas:
+        A → C (0.9), D (0.4)
+        B → C (0.5)
+    C: evidencia = 5×0.9 + 3×0.5 = 6.0, score = 6.0 / 1.4 = 4.29
+    D: evidencia = 5×0.4 = 2.0,         score = 2.0 / 0.4 = 5.0
+    → se recomienda primero C
+    
+    Args:
+        candidato (np.array | CandidatoDisperso): Vector de evaluaciones
+        vecinos_canciones (VecinosCanciones): Resultado de
+                                              construir_vecinos_canciones
+        nombres_canciones (list): Lista de nombres
+        n_recomendaciones (int): Cantidad a recomendar
+    
+    Returns:
+        list: Lista de diccionarios con recomendaciones, con las mismas
+        claves que recomendar_desde_vecindario. En este modo
+        'vecinos_que_evaluaron' es el número de canciones evaluadas por el
+        candidato que son similares a la recomendada, y
+        'rating_promedio_vecinos' el rating promedio que les dio.
+    
+    Complejidad:
+        O(e × M + m) donde e = canciones evaluadas, M = vecinas por canción
+    """
+    no_evaluadas = mascara_no_evaluadas(candidato)
+    n_canciones = len(no_evaluadas)
+    evaluadas = np.flatnonzero(~no_evaluadas)
+    
+    if len(evaluadas) == 0 or len(evaluadas) == n_canciones:
+        return []
+    
+    # Aportes de cada canción evaluada a sus vecinas (e × M)
+    vecinas = vecinos_canciones.indices[evaluadas].astype(np.intp).ravel()
+    similitudes = vecinos_canciones.similitudes[evaluadas].astype(np.float64)
+    ratings = np.broadcast_to(densificar(candidato)[evaluadas][:, None], similitudes.shape)
+    aporta = (similitudes > 0).ravel()
+    
+    vecinas = vecinas[aporta]
+    similitudes = similitudes.ravel()[aporta]
+    ratings = ratings.ravel()[aporta]
+    
+    suma_ponderada = np.bincount(vecinas, weights=ratings * similitudes, minlength=n_canciones)
+    suma_similitudes = np.bincount(vecinas, weights=similitudes, minlength=n_canciones)
+    evaluadas_similares = np.bincount(vecinas, minlength=n_canciones)
+    suma_ratings = np.bincount(vecinas, weights=ratings, minlength=n_canciones)
+    
+    # Solo canciones no evaluadas con al menos una canción similar evaluada
+    canciones_posibles = np.flatnonzero(no_evaluadas & (suma_similitudes > 0))
+    if len(canciones_posibles) == 0:
+        return []
+    
+    evidencia = suma_ponderada[canciones_posibles]
+    scores = evidencia / suma_similitudes[canciones_posibles]
+    top_n = _seleccionar_top_k(evidencia, n_recomendaciones)
+    
+    recomendaciones = []
+    for idx_score in top_n:
+        idx_cancion = canciones_posibles[idx_score]
+        
+        recomendaciones.append({
+            'cancion': nombres_canciones[idx_cancion],
+            'score_predicho': float(scores[idx_score]),
+            'vecinos_que_evaluaron': int(evaluadas_similares[idx_cancion]),
+            'rating_promedio_vecinos': float(suma_ratings[idx_cancion]
+                                             / evaluadas_similares[idx_cancion])
+        })
+    
+    return recomendaciones
+
+
+# ============================================================================
+# FACTORES LATENTES (SVD TRUNCADA)
+# ============================================================================
+#
+# Con decenas de miles de canciones, comparar al candidato con cada usuario
+# sobre los vectores de ratings completos es caro en memoria y en cómputo.
+# La matriz se factoriza una sola vez en un espacio de pocas dimensiones
+# (rango r) y la búsqueda de vecinos se hace ahí:
+#
+#     R (n × m) ≈ U Σ Vᵀ        V: base ortonormal (m × r) de canciones
+#     coordenadas de los usuarios = R V = U Σ   (n × r)
+#
+# - Un candidato nuevo se proyecta con evaluaciones @ V (fold-in): no hay
+#   que refactorizar para atenderlo.
+# - El coseno entre coordenadas es el coseno entre las proyecciones de los
+#   vectores de ratings sobre las r direcciones principales.
+# - Cada consulta recorre n × r valores en lugar de n × m. Los mejores
+#   candidatos se reordenan con la similitud exacta, así que los vecinos
+#   retornados llevan su similitud real.
+#
+# La factorización es una SVD aleatorizada calculada por bloques de filas:
+# nunca se forma RᵀR ni una copia densa de R. Ver factores_latentes.py para
+# guardar los factores en disco.
+
+# Candidatos por vecino pedido que se reordenan con la similitud exacta.
+# El coseno latente solo preselecciona: con 50 × k candidatos el recall@10
+# con rango 64 es ~0.95 en dataset_ratings.csv, y el reordenamiento
+# (50 × k filas) sigue siendo mucho menor que recorrer los n usuarios.
+AMPLIACION_REORDENAMIENTO = 50
+
+# Factores latentes de la matriz de ratings.
+#   - usuarios: np.array float32 (n_factorizados, r) coordenadas R V
+#   - canciones: np.array float32 (n_canciones, r) base V
+#   - normas: np.array float32 (n_factorizados,) norma de cada coordenada
+#   - valores_singulares: np.array (r,) diagonal de Σ, de mayor a menor
+#   - pendientes: np.array ordenado de usuarios cuyas coordenadas están
+#                 desactualizadas (modificados o agregados después de
+#                 factorizar); se proyectan en cada consulta
+FactoresLatentes = namedtuple('FactoresLatentes', ['usuarios', 'canciones', 'normas',
+                                                   'valores_singulares', 'pendientes'])
+
+
+def _bloques_filas(matriz_usuarios):
+    """Recorre la matriz en bloques densos float64 de filas consecutivas."""
+    n_usuarios = matriz_usuarios.shape[0]
+    for inicio in range(0, n_usuarios, FILAS_POR_BLOQUE_COMPACTO):
+        filas = np.arange(inicio, min(inicio + FILAS_POR_BLOQUE_COMPACTO, n_usuarios))
+        yield filas, _extraer_filas(matriz_usuarios, filas).astype(np.float64, copy=False)
+
+
+def _proyectar_filas(matriz_usuarios, usuarios, canciones):
+    """Coordenadas (len(usuarios), r) float32 de las filas indicadas."""
+    if len(usuarios) == 0:
+        return np.zeros((0, canciones.shape[1]), dtype=np.float32)
+    
+    return _extraer_filas(matriz_usuarios, usuarios).astype(np.float32) @ canciones
+
+
+def factorizar(matriz_usuarios, rango=64, iteraciones=4, sobremuestreo=10, semilla=0):
+    """
+    SVD truncada de la matriz de ratings.
+    
+    ALGORITMO (SVD aleatorizada, Halko et al.):
+    1. Q = base ortonormal de un subespacio aleatorio de rango + sobremuestreo
+    2. Repetir `iteraciones` veces: Q = ortonormalizar(Rᵀ (R Q)), acumulando
+       Rᵀ (R Q) por bloques de filas → Q converge a las direcciones
+       principales de RᵀR
+    3. Rayleigh-Ritz: H = (R Q)ᵀ (R Q); sus vectores propios W rotan Q a
+       V = Q W y sus valores propios son los valores singulares al cuadrado
+    4. Coordenadas de los usuarios: R V, por bloques de filas
+    
+    Args:
+        matriz_usuarios (np.array | MatrizDispersa): Matriz de usuarios
+        rango (int): Dimensiones del espacio latente
+        iteraciones (int): Iteraciones de subespacio (más = más precisión)
+        sobremuestreo (int): Dimensiones extra del subespacio aleatorio
+        semilla (int): Semilla del subespacio inicial (resultado reproducible)
+    
+    Returns:
+        FactoresLatentes: (usuarios, canciones, normas, valores_singulares,
+                           pendientes)
+    
+    Complejidad:
+        O(n × m × r × iteraciones) una sola vez; memoria O((n + m) × r)
+    """
+    n_usuarios, n_canciones = matriz_usuarios.shape
+    if rango < 1:
+        raise ValueError('rango debe ser mayor que 0')
+    rango = min(rango, n_canciones, n_usuarios)
+    dimension = min(rango + sobremuestreo, n_canciones)
+    
+    rng = np.random.default_rng(semilla)
+    base, _ = np.linalg.qr(rng.standard_normal((n_canciones, dimension)))
+    
+    for _ in range(iteraciones):
+        producto = np.zeros((n_canciones, dimension))
+        for _, bloque in _bloques_filas(matriz_usuarios):
+            producto += bloque.T @ (bloque @ base)
+        base, _ = np.linalg.qr(producto)
+    
+    # Rayleigh-Ritz en el subespacio encontrado
+    gram = np.zeros((dimension, dimension))
+    for _, bloque in _bloques_filas(matriz_usuarios):
+        proyeccion = bloque @ base
+        gram += proyeccion.T @ proyeccion
+    valores_propios, vectores = np.linalg.eigh(gram)
+    orden = np.argsort(valores_propios)[::-1][:rango]
+    
+    canciones = (base @ vectores[:, orden]).astype(np.float32)
+    valores_singulares = np.sqrt(np.maximum(valores_propios[orden], 0))
+    
+    usuarios = np.zeros((n_usuarios, rango), dtype=np.float32)
+    for filas, bloque in _bloques_filas(matriz_usuarios):
+        usuarios[filas] = bloque.astype(np.float32) @ canciones
+    
+    return FactoresLatentes(usuarios, canciones, np.linalg.norm(usuarios, axis=1),
+                            valores_singulares, np.zeros(0, dtype=np.intp))
+
+
+def marcar_pendientes_latentes(factores, usuarios):
+    """
+    Registra usuarios agregados o modificados sin recalcular sus coordenadas.
+    
+    Las coordenadas de los pendientes se proyectan desde la matriz en cada
+    consulta hasta que consolidar_factores las guarda.
+    
+    Returns:
+        FactoresLatentes: Factores con los pendientes actualizados
+    """
+    pendientes = np.union1d(factores.pendientes, np.asarray(usuarios, dtype=np.intp))
+    return factores._replace(pendientes=pendientes)
+
+
+def consolidar_factores(factores, matriz_usuarios):
+    """
+    Proyecta los usuarios pendientes y los incorpora a las coordenadas.
+    
+    La base de canciones no cambia: los usuarios nuevos se expresan en el
+    espacio latente original (fold-in). Para incorporar las nuevas
+    direcciones de gusto hay que refactorizar (recarga del dataset).
+    
+    Returns:
+        FactoresLatentes: Factores sin pendientes
+    
+    Complejidad:
+        O(n × r) por la copia de las coordenadas, O(p × m × r) por la
+        proyección de los p pendientes
+    """
+    n_usuarios = matriz_usuarios.shape[0]
+    pendientes = factores.pendientes
+    if len(pendientes) == 0 and len(factores.usuarios) == n_usuarios:
+        return factores
+    
+    rango = factores.canciones.shape[1]
+    usuarios = np.zeros((n_usuarios, rango), dtype=np.float32)
+    usuarios[:len(factores.usuarios)] = factores.usuarios
+    normas = np.zeros(n_usuarios, dtype=np.float32)
+    normas[:len(factores.normas)] = factores.normas
+    
+    coordenadas = _proyectar_filas(matriz_usuarios, pendientes, factores.canciones)
+    usuarios[pendientes] = coordenadas
+    normas[pendientes] = np.linalg.norm(coordenadas, axis=1)
+    
+    return FactoresLatentes(usuarios, factores.canciones, normas,
+                            factores.valores_singulares, np.zeros(0, dtype=np.intp))
+
+
+def encontrar_k_vecinos_latente(candidato, matriz_usuarios, factores, k=10, normas=None,
+                                ampliacion=AMPLIACION_REORDENAMIENTO):
+    """
+    Encuentra los K vecinos del candidato buscando en el espacio latente.
+    
+    PROCESO:
+    1. Proyectar el candidato: q = candidato @ V (fold-in)
+    2. Similitud del coseno entre q y las coordenadas de todos los usuarios
+       (los pendientes se proyectan en el momento)
+    3. Reordenar los k × ampliacion mejores con la similitud exacta sobre
+       sus ratings y retornar los k primeros
+    
+    Si el candidato es nulo en el espacio latente se usa la búsqueda exacta.
+    
+    Args:
+        candidato (np.array): Vector de evaluaciones
+        matriz_usuarios (np.array | MatrizDispersa): Matriz de usuarios
+        factores (FactoresLatentes): Resultado de factorizar
+        k (int): Número de vecinos
+        normas (np.array): Normas precalculadas de los usuarios
+        ampliacion (int): Candidatos por vecino que se reordenan
+    
+    Returns:
+        tuple: (indices_vecinos, similitudes) con similitudes exactas
+    
+    Complejidad:
+        O(n × r + k × ampliacion × m)
+    """
+    candidato = np.asarray(candidato, dtype=float)
+    n_usuarios = matriz_usuarios.shape[0]
+    
+    consulta = candidato.astype(np.float32) @ factores.canciones
+    norma_consulta = float(np.linalg.norm(consulta))
+    if norma_consulta == 0:
+        return encontrar_k_vecinos(candidato, matriz_usuarios, k, normas)
+    
+    # Coordenadas al día: factorizadas + pendientes (incluye usuarios nuevos)
+    productos = np.zeros(n_usuarios, dtype=np.float32)
+    normas_latentes = np.zeros(n_usuarios, dtype=np.float32)
+    n_factorizados = min(len(factores.usuarios), n_usuarios)
+    productos[:n_factorizados] = factores.usuarios[:n_factorizados] @ consulta
+    normas_latentes[:n_factorizados] = factores.normas[:n_factorizados]
+    
+    pendientes = factores.pendientes[factores.pendientes < n_usuarios]
+    if len(pendientes):
+        coordenadas = _proyectar_filas(matriz_usuarios, pendientes, factores.canciones)
+        productos[pendientes] = coordenadas @ consulta
+        normas_latentes[pendientes] = np.linalg.norm(coordenadas, axis=1)
+    
+    similitudes_latentes = np.zeros(n_usuarios, dtype=np.float32)
+    np.divide(productos, normas_latentes * norma_consulta, out=similitudes_latentes,
+              where=normas_latentes != 0)
+    
+    # Lista corta ordenada por índice para que el desempate coincida con la
+    # búsqueda exacta
+    lista_corta = np.sort(_seleccionar_top_k(similitudes_latentes, k * ampliacion))
+    
+    filas = _extraer_filas(matriz_usuarios, lista_corta)
+    if normas is None:
+        normas_filas = np.sqrt(np.sum(filas ** 2, axis=1))
+    else:
+        normas_filas = np.asarray(normas)[lista_corta].astype(float)
+    
+    similitudes = np.zeros(len(lista_corta))
+    np.divide(filas @ candidato, np.sqrt(np.sum(candidato ** 2)) * normas_filas,
+              out=similitudes, where=normas_filas != 0)
+    
+    top_k = _seleccionar_top_k(similitudes, k)
+    
+    return lista_corta[top_k], similitudes[top_k]
+
+
+def calcular_vecindario_latente(candidato, matriz_usuarios, factores, k=10, normas=None,
+                                ampliacion=AMPLIACION_REORDENAMIENTO):
+    """
+    Igual que calcular_vecindario, pero buscando los vecinos en el espacio latente.
+    
+    Returns:
+        Vecindario: (indices, similitudes, evaluaciones)
+    """
+    indices_vecinos, similitudes = encontrar_k_vecinos_latente(
+        candidato, matriz_usuarios, factores, k, normas, ampliacion
+    )
+    
+    return Vecindario(indices_vecinos, similitudes,
+                      _extraer_filas(matriz_usuarios, indices_vecinos))
+
+
+# ============================================================================
+# GRAFO DE VECINOS DE LOS USUARIOS DEL DATASET
+# ============================================================================
+#
+# Para los usuarios que ya están en el dataset, sus vecinos y sus
+# recomendaciones solo cambian cuando cambian los ratings. Un proceso
+# fuera de línea (grafo_vecinos.py) calcula el grafo completo usuario ×
+# usuario por bloques de filas y guarda, por usuario, sus k vecinos y sus
+# N mejores recomendaciones; la API las lee en O(N).
+#
+# RECONSTRUCCIÓN PARCIAL:
+# Cuando cambian los ratings de un conjunto U de usuarios, solo pueden
+# cambiar las filas de:
+#   1. Los usuarios de U (sus ratings y sus similitudes cambiaron)
+#   2. Los usuarios que tenían a alguno de U entre sus vecinos (su
+#      similitud con él cambió y puede salir del top k; además sus
+#      recomendaciones usan los ratings de ese vecino)
+#   3. Los usuarios v para los que algún u de U supera ahora a su k-ésimo
+#      vecino: sim(v, u) ≥ similitud del k-ésimo vecino de v
+# Las similitudes entre dos usuarios fuera de U no cambian, así que el
+# resto de las filas se conservan. Detectar (3) cuesta |U| × n productos
+# punto en lugar de n × n.
+
+# Grafo precalculado. Fila u = usuario u del dataset.
+#   - vecinos: np.array int32 (n_usuarios, k) vecinos de cada usuario (sin él mismo)
+#   - similitudes: np.array float32 (n_usuarios, k) similitud coseno con cada vecino
+#   - canciones: np.array int32 (n_usuarios, N) recomendaciones en orden (-1 = sin canción)
+#   - scores: np.array float32 (n_usuarios, N) score predicho
+#   - evaluaron: np.array uint16 (n_usuarios, N) vecinos que evaluaron la canción
+#   - promedios: np.array float32 (n_usuarios, N) rating promedio de esos vecinos
+#   - revision: operaciones del diario de ingesta incluidas en el grafo
+#   - pendientes: np.array ordenado de usuarios agregados o modificados después
+GrafoVecinos = namedtuple('GrafoVecinos', ['vecinos', 'similitudes', 'canciones', 'scores',
+                                           'evaluaron', 'promedios', 'revision', 'pendientes'])
+
+
+def filas_por_bloque_grafo(n_usuarios, memoria_mb=256):
+    """
+    Usuarios por bloque para que la matriz temporal de similitudes
+    (productos float32 + similitudes float64) no supere memoria_mb.
+    """
+    return max(1, int(memoria_mb * 1024 * 1024 // (12 * max(n_usuarios, 1))))
+
+
+def _similitudes_usuarios(matriz_usuarios, filas, normas):
+    """
+    Similitudes coseno (len(filas), n_usuarios) entre usuarios del dataset,
+    con la misma regla de normas nulas que encontrar_k_vecinos_lote.
+    """
+    productos_punto = _productos_punto(matriz_usuarios, _extraer_filas(matriz_usuarios, filas))
+    normas_filas = normas[filas]
+    
+    similitudes = np.zeros(productos_punto.shape)
+    validos = (normas_filas[:, None] != 0) & (normas[None, :] != 0)
+    np.divide(productos_punto, normas_filas[:, None] * normas[None, :],
+              out=similitudes, where=validos)
+    
+    return similitudes
+
+
+def vecinos_usuarios(matriz_usuarios, usuarios, k=10, normas=None, tamano_bloque=256):
+    """
+    K vecinos de usuarios que ya están en el dataset, sin contarse a sí mismos.
+    
+    Un usuario es siempre su propio vecino más cercano (similitud 1), así
+    que su fila se excluye antes de seleccionar. Por lo demás el resultado
+    es idéntico a encontrar_k_vecinos_lote.
+    
+    Args:
+        matriz_usuarios (np.array): Matriz de usuarios
+        usuarios (np.array): Posiciones de los usuarios
+        k (int): Número de vecinos (como máximo n_usuarios - 1)
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
+        tamano_bloque (int): Usuarios procesados por producto de matrices
+    
+    Returns:
+        tuple: (indices_vecinos, similitudes_vecinos), cada uno (len(usuarios), k)
+    
+    Complejidad:
+        O(u × n × m) en u / tamano_bloque productos de matrices
+    """
+    if normas is None:
+        normas = calcular_normas(matriz_usuarios)
+    
+    usuarios = np.asarray(usuarios, dtype=np.intp)
+    k = max(0, min(k, matriz_usuarios.shape[0] - 1))
+    tamano_bloque = max(1, int(tamano_bloque))
+    
+    indices = np.zeros((len(usuarios), k), dtype=np.intp)
+    similitudes = np.zeros((len(usuarios), k))
+    
+    for inicio in range(0, len(usuarios), tamano_bloque):
+        filas = usuarios[inicio:inicio + tamano_bloque]
+        similitudes_bloque = _similitudes_usuarios(matriz_usuarios, filas, normas)
+        
+        # Un usuario no es vecino de sí mismo
+        similitudes_bloque[np.arange(len(filas)), filas] = -np.inf
+        
+        for fila, similitudes_fila in enumerate(similitudes_bloque):
+            top_k = _seleccionar_top_k(similitudes_fila, k)
+            indices[inicio + fila] = top_k
+            similitudes[inicio + fila] = similitudes_fila[top_k]
+    
+    return indices, similitudes
+
+
+def vecindario_usuario(usuario, matriz_usuarios, k=10, normas=None):
+    """
+    Evaluaciones y vecindario (sin él mismo) de un usuario del dataset.
+    
+    Returns:
+        tuple: (evaluaciones, Vecindario)
+    """
+    indices, similitudes = vecinos_usuarios(matriz_usuarios, [usuario], k, normas)
+    
+    return (_extraer_filas(matriz_usuarios, [usuario])[0],
+            Vecindario(indices[0], similitudes[0], _extraer_filas(matriz_usuarios, indices[0])))
+
+
+def calcular_filas_grafo(matriz_usuarios, usuarios, k, n_recomendaciones, normas, tamano_bloque):
+    """
+    Vecinos (sin él mismo) y N mejores recomendaciones de los usuarios
+    indicados, en los tipos de GrafoVecinos.
+    
+    Los vecinos se buscan de a tamano_bloque usuarios con un producto de
+    matrices (vecinos_usuarios); las recomendaciones son las de
+    recomendar_desde_vecindario con ese vecindario.
+    
+    Returns:
+        tuple: (vecinos, similitudes, canciones, scores, evaluaron, promedios),
+               una fila por usuario
+    """
+    indices, similitudes = vecinos_usuarios(matriz_usuarios, usuarios, k, normas, tamano_bloque)
+    
+    n = len(indices)
+    canciones = np.full((n, n_recomendaciones), -1, dtype=np.int32)
+    scores = np.zeros((n, n_recomendaciones), dtype=np.float32)
+    evaluaron = np.zeros((n, n_recomendaciones), dtype=np.uint16)
+    promedios = np.zeros((n, n_recomendaciones), dtype=np.float32)
+    
+    for i, usuario in enumerate(np.asarray(usuarios, dtype=np.intp)):
+        vecindario = Vecindario(indices[i], similitudes[i],
+                                _extraer_filas(matriz_usuarios, indices[i]))
+        no_evaluadas, scores_usuario, evaluaron_usuario, promedio_usuario = puntuar_canciones(
+            _extraer_filas(matriz_usuarios, [usuario])[0], vecindario
+        )
+        
+        # Mismo orden (y desempate) que recomendar_desde_vecindario
+        top_n = _seleccionar_top_k(scores_usuario, n_recomendaciones)
+        canciones[i, :len(top_n)] = no_evaluadas[top_n]
+        scores[i, :len(top_n)] = scores_usuario[top_n]
+        evaluaron[i, :len(top_n)] = evaluaron_usuario[top_n]
+        promedios[i, :len(top_n)] = promedio_usuario[top_n]
+    
+    return (indices.astype(np.int32), similitudes.astype(np.float32),
+            canciones, scores, evaluaron, promedios)
+
+
+def construir_grafo_vecinos(matriz_usuarios, k=10, n_recomendaciones=20, normas=None,
+                            memoria_mb=256, revision=0):
+    """
+    Calcula el grafo completo de vecinos y las recomendaciones de todos
+    los usuarios del dataset.
+    
+    ALGORITMO:
+    1. Dividir los usuarios en bloques de b filas, con b tal que la matriz
+       de similitudes del bloque (b × n) quepa en memoria_mb
+    2. Por bloque: S = M_b · Mᵀ / (||M_b|| × ||M||) con un producto de
+       matrices, sin la diagonal
+    3. Top k de cada fila y recomendaciones desde ese vecindario
+    
+    Args:
+        matriz_usuarios (np.array): Matriz de usuarios (densa, compacta o dispersa)
+        k (int): Vecinos por usuario
+        n_recomendaciones (int): Recomendaciones guardadas por usuario
+        normas (np.array): Normas precalculadas de los usuarios (opcional)
+        memoria_mb (int): Memoria máxima de la matriz temporal de un bloque
+        revision (int): Operaciones del diario incluidas en la matriz
+    
+    Returns:
+        GrafoVecinos: Grafo sin pendientes
+    
+    Complejidad:
+        O(n² × m) en n / b productos de matrices, memoria O(b × n)
+    """
+    if normas is None:
+        normas = calcular_normas(matriz_usuarios)
+    
+    n_usuarios = matriz_usuarios.shape[0]
+    filas = calcular_filas_grafo(matriz_usuarios, np.arange(n_usuarios), k, n_recomendaciones,
+                                 normas, filas_por_bloque_grafo(n_usuarios, memoria_mb))
+    
+    return GrafoVecinos(*filas, revision, np.zeros(0, dtype=np.intp))
+
+
+def usuarios_afectados_grafo(grafo, matriz_usuarios, modificados, normas=None, memoria_mb=256):
+    """
+    Usuarios cuyas filas del grafo pueden cambiar cuando cambian los
+    ratings de `modificados` (ver RECONSTRUCCIÓN PARCIAL arriba). Los
+    usuarios agregados después del grafo (filas nuevas de la matriz)
+    siempre están incluidos.
+    
+    Args:
+        grafo (GrafoVecinos): Grafo calculado antes de los cambios
+        matriz_usuarios (np.array): Matriz de usuarios con los cambios
+        modificados (np.array): Usuarios agregados o con ratings cambiados
+        normas (np.array): Normas de la matriz con los cambios (opcional)
+        memoria_mb (int): Memoria máxima de la matriz temporal de un bloque
+    
+    Returns:
+        np.array: Posiciones ordenadas de los usuarios a recalcular
+    """
+    if normas is None:
+        normas = calcular_normas(matriz_usuarios)
+    
+    n_grafo = grafo.vecinos.shape[0]
+    n_usuarios = matriz_usuarios.shape[0]
+    modificados = np.union1d(np.asarray(modificados, dtype=np.intp),
+                             np.arange(n_grafo, n_usuarios, dtype=np.intp))
+    
+    if len(modificados) == 0:
+        return modificados
+    
+    afectados = np.zeros(n_usuarios, dtype=bool)
+    afectados[modificados] = True
+    
+    # (2) Tenían a un modificado entre sus vecinos
+    afectados[:n_grafo] |= np.isin(grafo.vecinos, modificados).any(axis=1)
+    
+    # (3) Un modificado supera ahora a su k-ésimo vecino. La similitud es
+    # simétrica, así que basta con las filas de los modificados. El umbral
+    # se guardó en float32: se resta un margen para no perder empates.
+    if grafo.vecinos.shape[1] > 0:
+        umbral = grafo.similitudes[:, -1].astype(np.float64) - 1e-6
+        tamano_bloque = filas_por_bloque_grafo(n_usuarios, memoria_mb)
+        for inicio in range(0, len(modificados), tamano_bloque):
+            filas = modificados[inicio:inicio + tamano_bloque]
+            similitudes = _similitudes_usuarios(matriz_usuarios, filas, normas)[:, :n_grafo]
+            similitudes[np.arange(len(filas))[filas < n_grafo], filas[filas < n_grafo]] = -np.inf
+            afectados[:n_grafo] |= (similitudes >= umbral[None, :]).any(axis=0)
+    else:
+        afectados[:] = True
+    
+    return np.flatnonzero(afectados)
+
+
+def actualizar_grafo_vecinos(grafo, matriz_usuarios, modificados, normas=None,
+                             memoria_mb=256, revision=None):
+    """
+    Recalcula solo las filas del grafo afectadas por cambios de ratings.
+    
+    El resultado es idéntico a construir_grafo_vecinos sobre la matriz con
+    los cambios (mismos k y N).
+    
+    Args:
+        grafo (GrafoVecinos): Grafo calculado antes de los cambios
+        matriz_usuarios (np.array): Matriz de usuarios con los cambios
+        modificados (np.array): Usuarios agregados o con ratings cambiados
+        normas (np.array): Normas de la matriz con los cambios (opcional)
+        memoria_mb (int): Memoria máxima de la matriz temporal de un bloque
+        revision (int): Operaciones del diario incluidas (por defecto la del grafo)
+    
+    Returns:
+        tuple: (GrafoVecinos sin pendientes, np.array de usuarios recalculados)
+    """
+    if normas is None:
+        normas = calcular_normas(matriz_usuarios)
+    
+    afectados = usuarios_afectados_grafo(grafo, matriz_usuarios, modificados, normas, memoria_mb)
+    n_usuarios = matriz_usuarios.shape[0]
+    
+    # Copia en memoria (el grafo puede venir de un np.memmap de solo
+    # lectura), con filas nuevas para los usuarios agregados
+    tablas = []
+    for tabla in grafo[:6]:
+        nueva = np.zeros((n_usuarios, tabla.shape[1]), dtype=tabla.dtype)
+        nueva[:tabla.shape[0]] = tabla
+        tablas.append(nueva)
+    
+    filas = calcular_filas_grafo(matriz_usuarios, afectados, grafo.vecinos.shape[1],
+                                 grafo.canciones.shape[1], normas,
+                                 filas_por_bloque_grafo(n_usuarios, memoria_mb))
+    for tabla, valores in zip(tablas, filas):
+        tabla[afectados] = valores
+    
+    revision = grafo.revision if revision is None else revision
+    return GrafoVecinos(*tablas, revision, np.zeros(0, dtype=np.intp)), afectados
+
+
+def marcar_pendientes_grafo(grafo, usuarios):
+    """
+    Registra usuarios cuyas filas del grafo dejaron de estar al día
+    (resultado de usuarios_afectados_grafo); se calculan en el momento
+    hasta que el grafo se reconstruya.
+    
+    Returns:
+        GrafoVecinos: Grafo con los pendientes actualizados
+    """
+    pendientes = np.union1d(grafo.pendientes, np.asarray(usuarios, dtype=np.intp))
+    return grafo._replace(pendientes=pendientes)
+
+
+def recomendaciones_grafo(grafo, usuario, nombres_canciones, n_recomendaciones=10):
+    """
+    Recomendaciones precalculadas de un usuario, en el formato de
+    recomendar_desde_vecindario.
+    
+    Complejidad:
+        O(N)
+    """
+    n = min(n_recomendaciones, grafo.canciones.shape[1])
+    canciones = grafo.canciones[usuario, :n]
+    
+    return [
+        {
+            'cancion': nombres_canciones[cancion],
+            'score_predicho': float(score),
+            'vecinos_que_evaluaron': int(evaluaron),
+            'rating_promedio_vecinos': float(promedio)
+        }
+        for cancion, score, evaluaron, promedio in zip(
+            canciones, grafo.scores[usuario, :n], grafo.evaluaron[usuario, :n],
+            grafo.promedios[usuario, :n]
+        )
+        if cancion >= 0
+    ]
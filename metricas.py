@@ -0,0 +1,311 @@
+"""
+MÉTRICAS EN FORMATO DE TEXTO DE PROMETHEUS
+
+Histogramas y calibres mínimos para /metrics, sin depender de
+prometheus_client. Están pensados para quedar activos en producción:
+observar un valor cuesta una búsqueda binaria entre los límites y unas
+pocas sumas bajo un candado (alrededor de un microsegundo).
+
+Cada worker de gunicorn lleva sus propias métricas, y el scrape lo
+atiende un worker cualquiera: sin más, cada scrape vería los contadores de
+otro proceso y rate() los tomaría por reinicios. Con un directorio
+compartido (Registro(directorio)), cada worker escribe su estado en un
+archivo propio cada pocos segundos y /metrics combina los de todos:
+    - histogramas y contadores: suma de todos los archivos, incluidos los
+      de workers ya terminados, para que los totales nunca bajen
+    - calibres: suma o máximo de los workers vigentes (los que escribieron
+      en los últimos 3 intervalos)
+Sin directorio, /metrics solo es válido con un único worker.
+
+FORMATO (https://prometheus.io/docs/instrumenting/exposition_formats/):
+    # HELP knn_peticion_segundos Duración de las peticiones
+    # TYPE knn_peticion_segundos histogram
+    knn_peticion_segundos_bucket{endpoint="/recomendar",le="0.005"} 12
+    ...
+    knn_peticion_segundos_bucket{endpoint="/recomendar",le="+Inf"} 15
+    knn_peticion_segundos_sum{endpoint="/recomendar"} 0.0731
+    knn_peticion_segundos_count{endpoint="/recomendar"} 15
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+
+# Límites (segundos) de los histogramas de latencia: de 50 µs a 10 s
+LIMITES_LATENCIA = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra=None):
+    """Texto {a="x",b="y"} de un conjunto de etiquetas ('' si no hay)."""
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra is not None:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Histograma:
+    """
+    Histograma con etiquetas.
+    
+    Guarda, por combinación de etiquetas, las observaciones de cada
+    intervalo (no acumuladas), la suma y el total; los buckets acumulados
+    de Prometheus se calculan al exponer.
+    """
+    
+    tipo = 'histogram'
+    
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}
+        self._candado = threading.Lock()
+    
+    def observar(self, valor, *etiquetas):
+        """Registra un valor para los valores de etiquetas indicados."""
+        posicion = bisect.bisect_left(self.limites, valor)
+        with self._candado:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][posicion] += 1
+            serie[1] += valor
+            serie[2] += 1
+    
+    def estado(self):
+        """Series de este proceso: [(etiquetas, conteos, suma, total)]."""
+        with self._candado:
+            return [(etiquetas, list(conteos), suma, total)
+                    for etiquetas, (conteos, suma, total) in sorted(self._series.items())]
+    
+    def combinar(self, estados):
+        """
+        Suma las series de varios procesos.
+        
+        Args:
+            estados (list): [(estado(), vigente)] de cada proceso
+        """
+        combinadas = {}
+        for series, _ in estados:
+            for etiquetas, conteos, suma, total in series:
+                etiquetas = tuple(etiquetas)
+                serie = combinadas.get(etiquetas)
+                if serie is None:
+                    combinadas[etiquetas] = [list(conteos), suma, total]
+                elif len(serie[0]) == len(conteos):
+                    serie[0] = [a + b for a, b in zip(serie[0], conteos)]
+                    serie[1] += suma
+                    serie[2] += total
+        return [(etiquetas, *serie) for etiquetas, serie in sorted(combinadas.items())]
+    
+    def lineas(self, series=None):
+        if series is None:
+            series = self.estado()
+        
+        lineas = []
+        for etiquetas, conteos, suma, total in series:
+            acumulado = 0
+            for limite, conteo in zip(self.limites + (float('inf'),), conteos):
+                acumulado += conteo
+                texto = _etiquetas(self.etiquetas, etiquetas, ('le', _numero(limite)))
+                lineas.append(f'{self.nombre}_bucket{texto} {acumulado}')
+            texto = _etiquetas(self.etiquetas, etiquetas)
+            lineas.append(f'{self.nombre}_sum{texto} {_numero(suma)}')
+            lineas.append(f'{self.nombre}_count{texto} {total}')
+        return lineas
+
+
+class Calibre:
+    """
+    Valor que se lee al exponer (estadísticas de la caché, tamaño del
+    dataset, ...). funcion() retorna un número o, con etiquetas, un dict
+    tupla de valores de etiquetas → número.
+    
+    Al combinar varios procesos, un contador (tipo='counter') suma los de
+    todos; un calibre suma (agregacion='suma') o toma el máximo
+    (agregacion='max') de los procesos vigentes.
+    """
+    
+    def __init__(self, nombre, ayuda, funcion, etiquetas=(), tipo='gauge', agregacion='suma'):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiquetas = tuple(etiquetas)
+        self.tipo = tipo
+        self.agregacion = agregacion
+    
+    def estado(self):
+        """Valores de este proceso: [(etiquetas, valor)]."""
+        valores = self.funcion()
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        return [(etiquetas, valor) for etiquetas, valor in sorted(valores.items())
+                if valor is not None]
+    
+    def combinar(self, estados):
+        """
+        Combina los valores de varios procesos.
+        
+        Args:
+            estados (list): [(estado(), vigente)] de cada proceso
+        """
+        combinados = {}
+        for valores, vigente in estados:
+            if not vigente and self.tipo != 'counter':
+                continue
+            for etiquetas, valor in valores:
+                etiquetas = tuple(etiquetas)
+                if etiquetas not in combinados:
+                    combinados[etiquetas] = valor
+                elif self.tipo == 'counter' or self.agregacion == 'suma':
+                    combinados[etiquetas] += valor
+                else:
+                    combinados[etiquetas] = max(combinados[etiquetas], valor)
+        return sorted(combinados.items())
+    
+    def lineas(self, valores=None):
+        if valores is None:
+            valores = self.estado()
+        return [f'{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}'
+                for etiquetas, valor in valores]
+
+
+class Cronometro:
+    """
+    Mide etapas consecutivas de una petición.
+    
+    Cada marcar(etapa) registra en el histograma el tiempo transcurrido
+    desde la marca anterior (o desde que se creó el cronómetro), con las
+    etiquetas fijas seguidas del nombre de la etapa.
+    """
+    
+    __slots__ = ('_histograma', '_etiquetas', '_ultimo')
+    
+    def __init__(self, histograma, *etiquetas):
+        self._histograma = histograma
+        self._etiquetas = etiquetas
+        self._ultimo = time.perf_counter()
+    
+    def marcar(self, etapa):
+        ahora = time.perf_counter()
+        self._histograma.observar(ahora - self._ultimo, *self._etiquetas, etapa)
+        self._ultimo = ahora
+
+
+class Registro:
+    """
+    Conjunto de métricas que se exponen juntas en /metrics.
+    
+    Con directorio, las métricas de los procesos que comparten el
+    directorio se exponen combinadas (ver el docstring del módulo). Los
+    archivos de los procesos terminados se conservan; vaciar el directorio
+    reinicia los contadores.
+    """
+    
+    def __init__(self, directorio=None, intervalo=5.0):
+        """
+        Args:
+            directorio (str): Directorio compartido entre los workers, o
+                              None para exponer solo las de este proceso
+            intervalo (float): Segundos entre escrituras del archivo propio
+        """
+        self._metricas = []
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self._archivo = None
+        self._pid = None
+        self._candado = threading.Lock()
+    
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+    
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        return self.registrar(Histograma(nombre, ayuda, etiquetas, limites))
+    
+    def calibre(self, nombre, ayuda, funcion, etiquetas=(), tipo='gauge', agregacion='suma'):
+        return self.registrar(Calibre(nombre, ayuda, funcion, etiquetas, tipo, agregacion))
+    
+    def publicar(self):
+        """Escribe el estado de este proceso en su archivo del directorio."""
+        contenido = json.dumps({metrica.nombre: metrica.estado() for metrica in self._metricas})
+        
+        with self._candado:
+            # El nombre incluye el arranque: un pid reutilizado no pisa el
+            # archivo de un worker terminado
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._archivo = os.path.join(self.directorio, f'{self._pid}-{time.time_ns()}.json')
+            
+            temporal = self._archivo + '.tmp'
+            with open(temporal, 'w') as archivo:
+                archivo.write(contenido)
+            os.replace(temporal, self._archivo)
+    
+    def iniciar_publicacion(self):
+        """Publica el estado cada intervalo segundos en un hilo de fondo."""
+        os.makedirs(self.directorio, exist_ok=True)
+        self.publicar()
+        
+        def publicar_periodicamente():
+            while True:
+                time.sleep(self.intervalo)
+                try:
+                    self.publicar()
+                except OSError:
+                    pass
+        
+        threading.Thread(target=publicar_periodicamente, name='publicar-metricas',
+                         daemon=True).start()
+    
+    def _leer_estados(self):
+        """[(contenido, vigente)] de los archivos de todos los procesos."""
+        self.publicar()
+        limite_vigencia = time.time() - 3 * self.intervalo
+        
+        estados = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith('.json'):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                with open(ruta) as archivo:
+                    contenido = json.load(archivo)
+                vigente = os.path.getmtime(ruta) >= limite_vigencia
+            except (OSError, ValueError):
+                continue
+            estados.append((contenido, vigente))
+        return estados
+    
+    def exponer(self):
+        """Todas las métricas en el formato de texto de Prometheus."""
+        estados = self._leer_estados() if self.directorio is not None else None
+        
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            if estados is None:
+                lineas.extend(metrica.lineas())
+            else:
+                lineas.extend(metrica.lineas(metrica.combinar(
+                    [(contenido[metrica.nombre], vigente)
+                     for contenido, vigente in estados if metrica.nombre in contenido])))
+        return '\n'.join(lineas) + '\n'
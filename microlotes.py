@@ -0,0 +1,195 @@
+"""
+AGRUPACIÓN DE CONSULTAS EN MICROLOTES
+
+Con workers de gunicorn con hilos (--worker-class gthread), varias
+peticiones de /clasificar y /recomendar llegan a la vez al mismo proceso y
+cada una recorrería la matriz completa por su cuenta. El agrupador las
+retiene durante una ventana corta, apila sus vectores en una matriz de
+candidatos y calcula todas las similitudes con un único producto de
+matrices (encontrar_k_vecinos_lote):
+    
+    petición 1 ─┐
+    petición 2 ─┼─▶ cola ──(ventana)──▶ C · Mᵀ ──▶ top-k por fila ─┬─▶ petición 1
+    petición 3 ─┘                                                   ├─▶ petición 2
+                                                                    └─▶ petición 3
+
+- La ventana empieza con la primera consulta de la cola; el lote se
+  atiende al cumplirse o al llegar a max_lote consultas.
+- Solo se agrupan consultas sobre la misma instantánea (clave). Cada
+  petición conserva su candado de lectura mientras espera, así que la
+  matriz no cambia hasta que se le responde.
+- Con distintos k se busca el mayor y cada petición toma un prefijo: el
+  orden de _seleccionar_top_k (similitud y luego índice, descendentes) no
+  depende de k, así que el resultado es el mismo que con su propio k.
+
+Un solo hilo atiende los lotes, de modo que los recorridos de la matriz
+no compiten entre sí por la CPU del worker.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from knn_engine import encontrar_k_vecinos_lote
+
+
+class _Consulta:
+    """Una petición esperando en la cola."""
+    
+    __slots__ = ('clave', 'candidato', 'k', 'matriz', 'normas', 'llegada',
+                 'listo', 'resultado', 'error')
+    
+    def __init__(self, clave, candidato, k, matriz, normas):
+        self.clave = clave
+        self.candidato = candidato
+        self.k = k
+        self.matriz = matriz
+        self.normas = normas
+        self.llegada = time.perf_counter()
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class AgrupadorConsultas:
+    """
+    Cola de búsquedas de vecinos que se atienden en microlotes.
+    
+    - ventana_segundos: espera máxima desde la primera consulta del lote
+    - max_lote: consultas por lote (el lote se atiende al completarse)
+    - historial: lotes y esperas recientes que se guardan para las
+      estadísticas
+    """
+    
+    def __init__(self, ventana_segundos=0.002, max_lote=64, historial=10000):
+        self.ventana_segundos = ventana_segundos
+        self.max_lote = max(1, int(max_lote))
+        
+        self._cola = []
+        self._condicion = threading.Condition(threading.Lock())
+        
+        self._candado_estadisticas = threading.Lock()
+        self.consultas = 0
+        self.lotes = 0
+        self._tamanos = deque(maxlen=historial)
+        self._esperas = deque(maxlen=historial)
+        
+        self._hilo = threading.Thread(target=self._atender, name='microlotes', daemon=True)
+        self._hilo.start()
+    
+    def encontrar_k_vecinos(self, clave, candidato, matriz_usuarios, k=10, normas=None):
+        """
+        Igual que knn_engine.encontrar_k_vecinos, atendida en un microlote.
+        
+        Bloquea hasta que el lote que contiene la consulta se procesa.
+        
+        Args:
+            clave: Identifica la instantánea (p. ej. versión y revisión);
+                   solo se agrupan consultas con la misma clave
+            candidato (np.array): Vector de evaluaciones
+            matriz_usuarios (np.array): Matriz de usuarios
+            k (int): Número de vecinos
+            normas (np.array): Normas precalculadas de los usuarios
+        
+        Returns:
+            tuple: (indices_vecinos, similitudes)
+        """
+        consulta = _Consulta(clave, np.asarray(candidato, dtype=float), k,
+                             matriz_usuarios, normas)
+        
+        with self._condicion:
+            self._cola.append(consulta)
+            self._condicion.notify()
+        
+        consulta.listo.wait()
+        if consulta.error is not None:
+            raise consulta.error
+        return consulta.resultado
+    
+    def _tomar_lote(self):
+        """Espera la ventana y retira de la cola las consultas del lote."""
+        with self._condicion:
+            while not self._cola:
+                self._condicion.wait()
+            
+            limite = self._cola[0].llegada + self.ventana_segundos
+            while len(self._cola) < self.max_lote:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                self._condicion.wait(restante)
+            
+            # Las consultas de otra instantánea quedan para el siguiente lote
+            clave = self._cola[0].clave
+            lote = [c for c in self._cola if c.clave == clave][:self.max_lote]
+            tomadas = set(map(id, lote))
+            self._cola = [c for c in self._cola if id(c) not in tomadas]
+        
+        return lote
+    
+    def _atender(self):
+        while True:
+            lote = self._tomar_lote()
+            inicio = time.perf_counter()
+            
+            try:
+                primera = lote[0]
+                k_maximo = max(c.k for c in lote)
+                indices, similitudes = encontrar_k_vecinos_lote(
+                    np.stack([c.candidato for c in lote]), primera.matriz, k_maximo,
+                    primera.normas, tamano_bloque=len(lote)
+                )
+                for fila, consulta in enumerate(lote):
+                    consulta.resultado = (indices[fila, :consulta.k], similitudes[fila, :consulta.k])
+            except Exception as e:
+                for consulta in lote:
+                    consulta.error = e
+            
+            with self._candado_estadisticas:
+                self.consultas += len(lote)
+                self.lotes += 1
+                self._tamanos.append(len(lote))
+                self._esperas.extend(inicio - c.llegada for c in lote)
+            
+            for consulta in lote:
+                consulta.listo.set()
+    
+    def estadisticas(self):
+        """
+        Distribución del tamaño de los lotes y tiempo de espera en la cola.
+        
+        Returns:
+            dict: Totales, lotes por tamaño (potencias de 2: '1', '2',
+                  '3-4', '5-8', ...) y percentiles de la espera en ms,
+                  calculados sobre los lotes recientes
+        """
+        with self._candado_estadisticas:
+            tamanos = np.array(self._tamanos, dtype=np.int64)
+            esperas = np.array(self._esperas, dtype=np.float64) * 1000
+            consultas, lotes = self.consultas, self.lotes
+        
+        distribucion = {}
+        inferior = 1
+        while inferior <= self.max_lote:
+            superior = min(inferior if inferior <= 2 else 2 * (inferior - 1), self.max_lote)
+            etiqueta = str(inferior) if inferior == superior else f'{inferior}-{superior}'
+            distribucion[etiqueta] = int(np.count_nonzero((tamanos >= inferior) & (tamanos <= superior)))
+            inferior = superior + 1
+        
+        if esperas.size:
+            espera = {f'p{p}': round(float(np.percentile(esperas, p)), 3) for p in (50, 90, 99)}
+            espera['max'] = round(float(esperas.max()), 3)
+        else:
+            espera = {}
+        
+        return {
+            'ventana_ms': self.ventana_segundos * 1000,
+            'max_lote': self.max_lote,
+            'consultas': consultas,
+            'lotes': lotes,
+            'tamano_promedio': round(consultas / lotes, 2) if lotes else 0.0,
+            'distribucion_tamanos': distribucion,
+            'espera_cola_ms': espera
+        }
@@ -0,0 +1,128 @@
+"""
+RESPUESTAS PREPARADAS CON ETAG
+
+/canciones, /stats y /config solo cambian con el dataset (o con k_vecinos
+en /config), pero el frontend los pide en cada carga de página. En lugar
+de volver a calcular y serializar el JSON en cada petición, el cuerpo se
+prepara una vez por instantánea:
+    
+    contenido ──json──▶ bytes ──gzip──▶ bytes comprimidos
+                          └──blake2b──▶ ETag fuerte
+
+- La ETag es el hash del JSON: es la misma en todos los workers que
+  sirven los mismos datos, así que un navegador o nginx puede revalidar
+  contra cualquiera. La variante gzip lleva su propia ETag (sufijo -gz).
+- Con If-None-Match igual a la ETag se responde 304 sin cuerpo y sin leer
+  la matriz.
+- Cache-Control: public, max-age=N permite que nginx (proxy_cache) y el
+  navegador reutilicen la respuesta N segundos y luego la revaliden con
+  If-None-Match.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import namedtuple
+
+from flask import Response, current_app
+
+# Cuerpos menores no se comprimen (mismo umbral que gzip_min_length de nginx.conf)
+GZIP_MIN_BYTES = 1024
+
+# Respuesta serializada una vez.
+#   - json: bytes del cuerpo JSON
+#   - gzip: bytes comprimidos, o None si el cuerpo es pequeño
+#   - etag: ETag fuerte del JSON (sin comillas)
+CuerpoPreparado = namedtuple('CuerpoPreparado', ['json', 'gzip', 'etag'])
+
+
+def preparar(contenido):
+    """
+    Serializa el contenido igual que jsonify y calcula su variante gzip y
+    su ETag.
+    
+    Args:
+        contenido (dict): Cuerpo de la respuesta
+    
+    Returns:
+        CuerpoPreparado
+    """
+    cuerpo = (current_app.json.dumps(contenido) + '\n').encode('utf-8')
+    
+    # mtime=0: mismos bytes comprimidos en todos los workers
+    comprimido = gzip.compress(cuerpo, compresslevel=9, mtime=0) if len(cuerpo) >= GZIP_MIN_BYTES else None
+    
+    return CuerpoPreparado(cuerpo, comprimido, hashlib.blake2b(cuerpo, digest_size=16).hexdigest())
+
+
+def servir(preparado, peticion, max_age):
+    """
+    Respuesta para un cuerpo preparado: 304 si el cliente ya tiene esa
+    versión, gzip si lo acepta y hay variante comprimida.
+    
+    Args:
+        preparado (CuerpoPreparado): Resultado de preparar
+        peticion: flask.request
+        max_age (int): Segundos de Cache-Control, o None para no-cache
+                       (el cliente revalida con la ETag en cada uso)
+    
+    Returns:
+        flask.Response
+    """
+    comprimir = preparado.gzip is not None and peticion.accept_encodings['gzip'] > 0
+    etag = preparado.etag + '-gz' if comprimir else preparado.etag
+    
+    if peticion.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+    else:
+        respuesta = Response(preparado.gzip if comprimir else preparado.json,
+                             content_type='application/json')
+        if comprimir:
+            respuesta.headers['Content-Encoding'] = 'gzip'
+    
+    respuesta.set_etag(etag)
+    if max_age is None:
+        respuesta.headers['Cache-Control'] = 'no-cache'
+    else:
+        respuesta.headers['Cache-Control'] = f'public, max-age={int(max_age)}'
+    respuesta.headers['Vary'] = 'Accept-Encoding'
+    
+    return respuesta
+
+
+class RespuestasPreparadas:
+    """
+    Último cuerpo preparado de cada endpoint, junto con la clave
+    (instantánea, parámetros) con la que se preparó.
+    """
+    
+    def __init__(self):
+        self._cuerpos = {}
+        self._candado = threading.Lock()
+    
+    def obtener(self, nombre, clave, construir):
+        """
+        Cuerpo preparado de `nombre` para `clave`; si la clave cambió, se
+        prepara de nuevo con construir().
+        
+        Args:
+            nombre (str): Endpoint
+            clave: Identifica los datos de la respuesta (p. ej. versión y
+                   revisión de la instantánea)
+            construir (callable): Retorna el contenido (dict) a serializar
+        
+        Returns:
+            CuerpoPreparado
+        """
+        with self._candado:
+            guardado = self._cuerpos.get(nombre)
+        if guardado is not None and guardado[0] == clave:
+            return guardado[1]
+        
+        # Se prepara fuera del candado: dos peticiones simultáneas pueden
+        # serializar lo mismo, pero ninguna espera a la otra
+        preparado = preparar(construir())
+        with self._candado:
+            self._cuerpos[nombre] = (clave, preparado)
+        
+        return preparado
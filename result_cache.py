@@ -0,0 +1,159 @@
+"""
+CACHÉ DE RESULTADOS DE RECOMENDACIÓN
+
+Caché LRU con expiración (TTL) para /clasificar y /recomendar. El
+frontend envía con frecuencia vectores de evaluaciones idénticos
+(reenvíos, las mismas respuestas del cuestionario, pruebas de carga), y
+cada uno dispararía un recorrido completo del dataset.
+
+CLAVE:
+Hash de la representación dispersa del vector (posiciones y valores de
+las canciones evaluadas) junto con los parámetros de la petición (k, n).
+Dos vectores con las mismas evaluaciones producen la misma clave sin
+importar cómo se serializaron en el JSON.
+
+INVALIDACIÓN:
+La caché guarda la versión del dataset con la que se llenó. Cuando la
+versión cambia (recarga o ingesta de ratings) se vacía por completo.
+
+La caché es local a cada proceso: con gunicorn cada worker tiene la suya.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from knn_engine import CandidatoDisperso
+
+
+def clave_evaluaciones(evaluaciones, *parametros):
+    """
+    Clave de caché para un vector de evaluaciones y parámetros adicionales.
+    
+    Un CandidatoDisperso y el vector denso equivalente producen la misma
+    clave, así que comparten las entradas de la caché.
+    
+    Args:
+        evaluaciones (np.array | CandidatoDisperso): Evaluaciones del candidato
+        *parametros: Valores que también determinan el resultado (k, n, ...)
+    
+    Returns:
+        str: Hash hexadecimal
+    """
+    if isinstance(evaluaciones, CandidatoDisperso):
+        n_canciones, posiciones, valores = (evaluaciones.n_canciones, evaluaciones.indices,
+                                            evaluaciones.valores)
+    else:
+        posiciones = np.flatnonzero(evaluaciones)
+        n_canciones, valores = len(evaluaciones), evaluaciones[posiciones]
+    
+    sha = hashlib.blake2b(digest_size=16)
+    sha.update(np.int64(n_canciones).tobytes())
+    sha.update(posiciones.astype(np.int64).tobytes())
+    sha.update(valores.astype(np.float64).tobytes())
+    sha.update(repr(parametros).encode('utf-8'))
+    
+    return sha.hexdigest()
+
+
+class CacheResultados:
+    """
+    Caché LRU acotada con expiración por tiempo.
+    
+    - capacidad: número máximo de entradas (0 desactiva la caché)
+    - ttl_segundos: vida de cada entrada (0 = sin expiración)
+    
+    Los valores guardados no deben modificarse después de insertarlos.
+    """
+    
+    def __init__(self, capacidad=1024, ttl_segundos=300):
+        self.capacidad = capacidad
+        self.ttl_segundos = ttl_segundos
+        self.version = None
+        
+        self._entradas = OrderedDict()
+        self._candado = threading.Lock()
+        
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.expiraciones = 0
+        self.invalidaciones = 0
+    
+    def verificar_version(self, version):
+        """Vacía la caché si el dataset cambió desde que se llenó."""
+        if version != self.version:
+            with self._candado:
+                if version != self.version:
+                    if self._entradas:
+                        self.invalidaciones += 1
+                    self._entradas.clear()
+                    self.version = version
+    
+    def invalidar(self):
+        """Vacía la caché."""
+        with self._candado:
+            if self._entradas:
+                self.invalidaciones += 1
+            self._entradas.clear()
+    
+    def obtener(self, clave):
+        """
+        Retorna el valor guardado para la clave, o None si no existe o expiró.
+        """
+        if self.capacidad <= 0:
+            return None
+        
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            
+            if entrada is None:
+                self.fallos += 1
+                return None
+            
+            valor, expira = entrada
+            if expira is not None and time.monotonic() >= expira:
+                del self._entradas[clave]
+                self.expiraciones += 1
+                self.fallos += 1
+                return None
+            
+            # Más recientemente usada al final
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+    
+    def guardar(self, clave, valor):
+        """Guarda un valor, expulsando la entrada menos usada si está llena."""
+        if self.capacidad <= 0:
+            return
+        
+        expira = time.monotonic() + self.ttl_segundos if self.ttl_segundos > 0 else None
+        
+        with self._candado:
+            self._entradas[clave] = (valor, expira)
+            self._entradas.move_to_end(clave)
+            
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+    
+    def estadisticas(self):
+        """Contadores de uso de la caché."""
+        with self._candado:
+            consultas = self.aciertos + self.fallos
+            return {
+                'capacidad': self.capacidad,
+                'ttl_segundos': self.ttl_segundos,
+                'entradas': len(self._entradas),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'expulsiones': self.expulsiones,
+                'expiraciones': self.expiraciones,
+                'invalidaciones': self.invalidaciones,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+                'version_dataset': self.version
+            }